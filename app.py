@@ -1,22 +1,155 @@
 import streamlit as st
 from llm import *
+from incremental import IncrementalValidator
+from structured import cached_extract_all_fields
+from fields import FIELD_DISPLAY_NAMES
+from heuristics import extraction_stats
+from jobs import get_job_manager, report_progress, DONE, FAILED, CANCELLED
+from metrics import registry, profile_document
+from model_router import model_stats
+from artifacts import get_artifact_store
+from result_store import get_result_store
+from near_duplicates import get_layout_index
+from rule_import import read_rules, import_rules, import_rule_set, export_rule_set, is_rule_set
+from rule_parser import CATEGORIES, CONDITIONS
+from rule_engine import CONDITION_ALIASES
 from io import BytesIO
 from datetime import datetime
+from types import SimpleNamespace
+import time
+import uuid
+
+POLL_SECONDS = 0.5
+EDIT_DEBOUNCE_SECONDS = 1.0
+# Longer texts are shown read-only, an editable widget keeps one more full copy per session
+EDITABLE_TEXT_CHARS = 200000
+HISTORY_DAYS = 14
+# Every session has its own validator, enough cached results to undo a few corrections is plenty
+SESSION_RESULT_CACHE_SIZE = 2000
+SESSION_CATEGORY_CACHE_SIZE = 8
+
+# Jobs run on the shared worker pool, outside the script run, so they must not touch st.*
+def _extract_data(document_text, structured_mode):
+    report_progress(0.5, "Extracting data with LLM...")
+    if not structured_mode:
+        return cached_extract_data_from_text(document_text)
+
+    # Publish each field as soon as the model has produced it, the page shows them while polling
+    def show_field(field, value):
+        report_progress(partial={FIELD_DISPLAY_NAMES[field]: value})
+    return cached_extract_all_fields(document_text, on_field=show_field)
+
+def extract_document_data(text_handle, structured_mode):
+    document_text = get_artifact_store().read_text(text_handle)
+    if document_text is None:
+        raise Exception("The document text has expired, please upload the file again")
+    return {"data": _extract_data(document_text, structured_mode)}
+
+def process_upload(name, mime_type, upload_handle, structured_mode):
+    store = get_artifact_store()
+    # Bytes for small uploads, a memory mapped temp file for large ones
+    source = store.source(upload_handle)
+    if source is None:
+        raise Exception("The upload has expired, please upload the file again")
+    with profile_document(name):
+        report_progress(0.1, "Extracting text...")
+        document_text = cached_extract_text_from_document(SimpleNamespace(type=mime_type), source,
+                                                          digest=upload_handle)
+        # Only the handle goes back to the session, the text stays in the store
+        text_handle = store.put(document_text)
+        data = _extract_data(document_text, structured_mode)
+        get_result_store().save_document(upload_handle, name=name, mime_type=mime_type, data=data)
+        return {"text_handle": text_handle, "data": data}
+
+def current_document_text():
+    handle = st.session_state.document_text_handle
+    if not handle:
+        return ""
+    document_text = get_artifact_store().read_text(handle)
+    if document_text is None:
+        # Evicted after the session sat idle, the extracted data is still in session state
+        st.session_state.document_text_handle = None
+        return ""
+    return document_text
+
+def show_validation_history():
+    # Read from aggregates the store keeps up to date on every insert, not from the results themselves
+    store = get_result_store()
+    totals = store.totals()
+    total = sum(totals.values())
+    if not total:
+        return
+    with st.expander("📈 Validation History"):
+        col1, col2, col3 = st.columns(3)
+        col1.metric("Results Stored", f"{total:,}")
+        col2.metric("Pass Rate", f"{totals['PASS'] / total * 100:.1f}%")
+        col3.metric("Fail Rate", f"{totals['FAIL'] / total * 100:.1f}%")
+
+        rows = [f"| {day} | {counts['PASS']:,} | {counts['FAIL']:,} | {counts['Error']:,} |"
+                for day, counts in sorted(store.daily_totals(days=HISTORY_DAYS).items(), reverse=True)]
+        st.markdown(f"**Last {HISTORY_DAYS} days**\n\n| Day | Passed | Failed | Errors |\n|---|---|---|---|\n"
+                    + "\n".join(rows))
+
+        rows = []
+        for stats in store.rule_totals(limit=10):
+            rule = stats["rule"]
+            label = f"{rule.get('category')} {str(rule.get('condition')).replace('_', ' ')} {rule.get('value')}"
+            rows.append(f"| {label.replace('|', '/')} | {stats['total']:,} | {stats['FAIL'] / stats['total'] * 100:.1f}% |")
+        st.markdown("**Rules failing most often**\n\n| Rule | Checked | Failed |\n|---|---|---|\n" + "\n".join(rows))
+
+def new_validator():
+    return IncrementalValidator(result_cache_size=SESSION_RESULT_CACHE_SIZE,
+                                category_cache_size=SESSION_CATEGORY_CACHE_SIZE)
+
+def poll_document_job():
+    job = get_job_manager().status(st.session_state.document_job)
+    if job is None or job["status"] in (CANCELLED, FAILED):
+        st.session_state.document_job = None
+        # Nothing was extracted, uploading the same file again has to start a new job
+        st.session_state.document_digest = None
+        if job is not None and job["status"] == FAILED:
+            st.error(f"❌ Error: {job['error']}")
+        return
+    if job["status"] == DONE:
+        st.session_state.document_job = None
+        if "text_handle" in job["result"]:
+            get_artifact_store().assign(st.session_state.session_id, "text", job["result"]["text_handle"])
+            st.session_state.document_text_handle = job["result"]["text_handle"]
+        st.session_state.document_data = job["result"]["data"]
+        st.session_state.editable_data = st.session_state.document_data.copy()
+        # Rerun once so every widget renders with the new data
+        st.rerun()
+
+    st.progress(job["progress"], text=job["message"] or "Waiting for a worker...")
+    if job["partial"]:
+        st.json(job["partial"])
 
 def main():
     st.set_page_config(layout="wide", page_title="Advanced Document Validator Pro")
     
     # Initialize session state
-    if 'document_text' not in st.session_state:
-        st.session_state.document_text = ""
+    if 'document_text_handle' not in st.session_state:
+        st.session_state.document_text_handle = None
+    if 'upload_id' not in st.session_state:
+        st.session_state.upload_id = None
     if 'document_data' not in st.session_state:
         st.session_state.document_data = {}
     if 'rules' not in st.session_state:
         st.session_state.rules = []
-    if 'validation_results' not in st.session_state:
-        st.session_state.validation_results = []
+    if 'validation_run' not in st.session_state:
+        st.session_state.validation_run = None
+    if 'validator' not in st.session_state:
+        st.session_state.validator = new_validator()
     if 'editable_data' not in st.session_state:
         st.session_state.editable_data = {}
+    if 'document_digest' not in st.session_state:
+        st.session_state.document_digest = None
+    if 'document_job' not in st.session_state:
+        st.session_state.document_job = None
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+    # Keeps this session's uploads and texts from being evicted as idle
+    get_artifact_store().touch(st.session_state.session_id)
     
     # Custom CSS for better styling
     st.markdown("""
@@ -43,6 +176,46 @@ def main():
     st.sidebar.title("Navigation")
     app_mode = st.sidebar.radio("Go to", 
                                ["📄 Document Processing", "⚙️ Rule Management", "✅ Validation Dashboard"])
+    st.sidebar.checkbox("🧩 Extract all invoice fields", key="structured_mode",
+                        help="Extract every invoice field in one schema-constrained LLM pass")
+    
+    with st.sidebar.expander("🗄️ Cache"):
+        cache_stats = get_cache().stats()
+        st.write(f"**Entries:** {cache_stats['entries']} ({cache_stats['bytes'] / 1024 / 1024:.1f} MB)")
+        for namespace in ("text", "data"):
+            st.write(f"**{namespace.capitalize()}:** {cache_stats['hits'].get(namespace, 0)} hits / "
+                     f"{cache_stats['misses'].get(namespace, 0)} misses")
+        heuristic_stats = extraction_stats()
+        st.write(f"**LLM calls avoided:** {heuristic_stats['llm_calls_avoided']} of {heuristic_stats['documents']}")
+        layout_stats = get_layout_index().stats()
+        st.write(f"**Known layouts:** {layout_stats['layouts']} ({layout_stats['fields_reused']} fields reused)")
+        artifact_stats = get_artifact_store().stats()
+        st.write(f"**Documents held:** {artifact_stats['memory_bytes'] / 1024 / 1024:.1f} MB in memory / "
+                 f"{artifact_stats['disk_bytes'] / 1024 / 1024:.1f} MB on disk for {artifact_stats['sessions']} sessions")
+        job_stats = get_job_manager().stats()
+        st.write(f"**Background jobs:** {job_stats['running']} running / {job_stats['queued']} queued")
+
+    with st.sidebar.expander("⏱️ Performance"):
+        stage_stats = registry.stage_summary()
+        if stage_stats:
+            rows = [f"| {stage} | {stats['count']} | {stats['p50'] * 1000:.1f} | {stats['p95'] * 1000:.1f} | {stats['errors']} |"
+                    for stage, stats in sorted(stage_stats.items())]
+            st.markdown("| Stage | Calls | p50 ms | p95 ms | Errors |\n|---|---|---|---|---|\n" + "\n".join(rows))
+        else:
+            st.write("No timings recorded yet")
+        json_outcomes = {dict(labels)["outcome"]: count for labels, count in registry.counter_values("json_parse_total").items()}
+        if json_outcomes:
+            st.write(f"**JSON parse failures:** {json_outcomes.get('failed', 0)} of {sum(json_outcomes.values())}")
+        prompt_tokens = sum(registry.counter_values("llm_prompt_tokens_total").values())
+        completion_tokens = sum(registry.counter_values("llm_completion_tokens_total").values())
+        st.write(f"**LLM tokens:** {prompt_tokens} prompt / {completion_tokens} completion")
+        models = model_stats()
+        if models:
+            rows = [f"| {model} | {stats['calls']} | {stats['p50'] * 1000:.0f} | {stats['escalation_rate']:.0%} |"
+                    for model, stats in models.items()]
+            st.markdown("| Model | Calls | p50 ms | Escalated |\n|---|---|---|---|\n" + "\n".join(rows))
+        st.download_button("Export Prometheus metrics", registry.export_prometheus(), file_name="metrics.prom")
+        st.download_button("Export JSON metrics", registry.export_json(), file_name="metrics.json")
     
     # Document Processing Section
     if app_mode == "📄 Document Processing":
@@ -58,33 +231,62 @@ def main():
             
             if uploaded_file:
                 try:
-                    file_bytes = uploaded_file.read()
-                    with st.spinner("Extracting text..."):
-                        st.session_state.document_text = extract_text_from_document(uploaded_file, file_bytes)
-                    
-                    with st.spinner("Extracting data with LLM..."):
-                        st.session_state.document_data = extract_data_from_text(st.session_state.document_text)
-                        st.session_state.editable_data = st.session_state.document_data.copy()
-                    
-                    st.success("✅ Document processed successfully!")
+                    # Streamlit reruns the script on every interaction, only store and process new uploads
+                    if uploaded_file.file_id != st.session_state.upload_id:
+                        uploaded_file.seek(0)
+                        # Large files are spilled to a temp file, the job gets a handle instead of the bytes
+                        digest = get_artifact_store().put_stream(uploaded_file, owner=st.session_state.session_id,
+                                                                 slot="upload")
+                        st.session_state.upload_id = uploaded_file.file_id
+                        if digest != st.session_state.document_digest:
+                            # Sessions uploading the same file share one job, a newer upload supersedes this session's last one
+                            st.session_state.document_job = get_job_manager().submit(
+                                ("upload", digest, st.session_state.structured_mode), process_upload,
+                                uploaded_file.name, uploaded_file.type, digest, st.session_state.structured_mode,
+                                owner=(st.session_state.session_id, "document")
+                            )
+                            st.session_state.document_digest = digest
+                            # Results and the saved run belong to the previous document
+                            st.session_state.validator = new_validator()
+                            st.session_state.validation_run = None
                 except Exception as e:
                     st.error(f"❌ Error: {str(e)}")
+
+            # Uploads and text edits both report here while their job runs
+            if st.session_state.document_job:
+                poll_document_job()
+            elif uploaded_file and st.session_state.document_data:
+                st.success("✅ Document processed successfully!")
         
         with col2:
-            if st.session_state.document_text:
+            document_text = current_document_text()
+            if document_text:
                 st.subheader("Extracted Content")
                 
                 with st.expander("🔍 Raw Extracted Text", expanded=True):
-                    edited_text = st.text_area("Edit extracted text", 
-                                             value=st.session_state.document_text, 
-                                             height=300,
-                                             key="edited_text",
-                                             label_visibility="collapsed")
-                    if edited_text != st.session_state.document_text:
-                        st.session_state.document_text = edited_text
-                        with st.spinner("Updating extracted data..."):
-                            st.session_state.document_data = extract_data_from_text(st.session_state.document_text)
-                            st.session_state.editable_data = st.session_state.document_data.copy()
+                    if len(document_text) > EDITABLE_TEXT_CHARS:
+                        st.text_area("Extracted text preview",
+                                     value=document_text[:EDITABLE_TEXT_CHARS],
+                                     height=300,
+                                     disabled=True,
+                                     label_visibility="collapsed")
+                        st.caption(f"Showing the first {EDITABLE_TEXT_CHARS:,} of {len(document_text):,} characters")
+                        edited_text = document_text
+                    else:
+                        edited_text = st.text_area("Edit extracted text", 
+                                                 value=document_text, 
+                                                 height=300,
+                                                 key="edited_text",
+                                                 label_visibility="collapsed")
+                    if edited_text != document_text:
+                        text_handle = get_artifact_store().put(edited_text, owner=st.session_state.session_id, slot="text")
+                        st.session_state.document_text_handle = text_handle
+                        # Debounced, a quick follow-up edit replaces this job before it reaches the model
+                        st.session_state.document_job = get_job_manager().submit(
+                            ("data", text_handle, st.session_state.structured_mode),
+                            extract_document_data, text_handle, st.session_state.structured_mode,
+                            owner=(st.session_state.session_id, "document"), debounce=EDIT_DEBOUNCE_SECONDS
+                        )
                 
                 if st.session_state.document_data:
                     st.subheader("📊 Extracted Data Fields")
@@ -137,7 +339,7 @@ def main():
             
             if st.button("✨ Parse and Add Rule", use_container_width=True):
                 if rule_text:
-                    with st.spinner("Parsing rule with LLM..."):
+                    with st.spinner("Parsing rule..."):
                         try:
                             new_rule = parse_rule(rule_text)
                             if new_rule:
@@ -148,6 +350,37 @@ def main():
                             st.error(f"❌ Error parsing rule: {str(e)}")
                 else:
                     st.warning("⚠ Please enter a rule first")
+
+            with st.expander("📥 Bulk Import"):
+                rules_file = st.file_uploader("CSV, YAML, JSON or text with one rule per line",
+                                              type=["csv", "yaml", "yml", "json", "txt"],
+                                              key="rules_file")
+                if rules_file and st.button("📥 Import Rules", use_container_width=True):
+                    content = rules_file.getvalue().decode("utf-8-sig")
+                    with st.spinner("Importing rules..."):
+                        try:
+                            if is_rule_set(content, rules_file.name):
+                                results = import_rule_set(content)
+                            else:
+                                results = import_rules(read_rules(content, rules_file.name))
+                            imported = [result["rule"] for result in results if result["rule"]]
+                            st.session_state.rules.extend(imported)
+                            st.success(f"✅ Imported {len(imported)} of {len(results)} rules")
+                            errors = [result["error"] for result in results if result["error"]]
+                            for error in errors[:10]:
+                                st.warning(f"⚠ {error}")
+                            if len(errors) > 10:
+                                st.warning(f"⚠ ...and {len(errors) - 10} more")
+                        except Exception as e:
+                            st.error(f"❌ Error importing rules: {str(e)}")
+
+            if st.session_state.rules:
+                try:
+                    st.download_button("📤 Export Rules", export_rule_set(st.session_state.rules),
+                                       file_name="rules.json", mime="application/json",
+                                       use_container_width=True)
+                except RuleCompileError as e:
+                    st.warning(f"⚠ Fix invalid rules before exporting: {str(e)}")
         
         with col2:
             st.subheader("📋 Current Rules")
@@ -189,22 +422,19 @@ def main():
                         edited_rule = {}
                         edited_rule['category'] = st.selectbox(
                             "Category",
-                            options=["money", "date", "time", "text"],
-                            index=["money", "date", "time", "text"].index(rule.get('category', 'money')),
+                            options=CATEGORIES,
+                            index=CATEGORIES.index(rule.get('category')) if rule.get('category') in CATEGORIES else 0,
                             key=f"category_{i}"
                         )
                         
-                        condition_options = {
-                            "money": ["equals", "not_equals", "greater_than", "less_than"],
-                            "date": ["equals", "not_equals", "before_date", "after_date"],
-                            "time": ["equals", "not_equals", "greater_than", "less_than"],
-                            "text": ["equals", "not_equals", "contains", "not_contains"]
-                        }
-                        
+                        # Same conditions the parser and validator use, older greater/less than time rules map onto them
+                        condition_options = CONDITIONS[edited_rule['category']]
+                        condition = CONDITION_ALIASES.get(edited_rule['category'], {}).get(rule.get('condition'),
+                                                                                           rule.get('condition'))
                         edited_rule['condition'] = st.selectbox(
                             "Condition",
-                            options=condition_options[edited_rule['category']],
-                            index=condition_options[edited_rule['category']].index(rule.get('condition')),
+                            options=condition_options,
+                            index=condition_options.index(condition) if condition in condition_options else 0,
                             key=f"condition_{i}"
                         )
                         
@@ -227,38 +457,38 @@ def main():
         elif not st.session_state.rules:
             st.warning("⚠ Please add at least one rule in the Rule Management section")
         else:
+            validator = st.session_state.validator
+            data = st.session_state.editable_data if st.session_state.editable_data else st.session_state.document_data
             if st.button("🔍 Run All Validations", use_container_width=True):
-                st.session_state.validation_results = []
-                progress_bar = st.progress(0)
-                status_text = st.empty()
-                
-                for i, rule in enumerate(st.session_state.rules):
-                    progress = (i + 1) / len(st.session_state.rules)
-                    progress_bar.progress(progress)
-                    status_text.text(f"Validating Rule #{i+1} of {len(st.session_state.rules)}...")
-                    
-                    with st.spinner(f"Validating Rule #{i+1}..."):
-                        try:
-                            result = validate_rule(
-                                rule,
-                                st.session_state.editable_data if st.session_state.editable_data else st.session_state.document_data
-                            )
-                            st.session_state.validation_results.append(result)
-                        except Exception as e:
-                            st.error(f"Validation error for Rule #{i+1}: {str(e)}")
+                with st.spinner(f"Validating {len(st.session_state.rules)} rules..."):
+                    try:
+                        # Only rules whose definition or field value changed since the last run are evaluated
+                        validator.update(st.session_state.rules, data)
+                        # The result store keeps the history, the session only remembers which run is its latest
+                        st.session_state.validation_run = get_result_store().record_run(
+                            validator.results, data, digest=st.session_state.document_digest,
+                            session=st.session_state.session_id
+                        )
+                    except Exception as e:
+                        st.error(f"Validation error: {str(e)}")
                 
-                progress_bar.empty()
-                status_text.empty()
                 st.success("🎉 All validations completed!")
                 st.balloons()
+            elif validator.results:
+                # Corrections made since the last run update just the results they affect
+                changes = validator.update(st.session_state.rules, data)
+                if changes["affected"]:
+                    st.info(f"🔄 {changes['affected']} results updated after your edits, run all validations to save them")
             
-            if st.session_state.validation_results:
+            validation_results = validator.results
+            if validation_results:
                 st.subheader("📊 Validation Summary")
                 
-                total_rules = len(st.session_state.validation_results)
-                passed = sum(1 for r in st.session_state.validation_results if r.get('status') == 'PASS')
-                failed = sum(1 for r in st.session_state.validation_results if r.get('status') == 'FAIL')
-                errors = total_rules - passed - failed
+                summary = validator.summary()
+                total_rules = summary["total"]
+                passed = summary["PASS"]
+                failed = summary["FAIL"]
+                errors = summary["Error"]
                 
                 col1, col2, col3 = st.columns(3)
                 col1.metric("Total Rules", total_rules)
@@ -266,8 +496,8 @@ def main():
                 col3.metric("Failed", failed, f"{failed/total_rules*100:.1f}%", delta_color="inverse")
                 
                 st.subheader("📝 Detailed Results")
-                for i, result in enumerate(st.session_state.validation_results):
-                    rule = st.session_state.rules[i]
+                for i, result in enumerate(validation_results):
+                    rule = result["rule"]
                     actual = result.get('actual_value', 'N/A')
                     expected = result.get('expected_value', 'N/A')
                     condition = rule.get('condition', '').replace('_', ' ')
@@ -306,5 +536,12 @@ def main():
                             
                             st.json(result)
 
+        show_validation_history()
+
+    # Nothing blocks on the job, rerun shortly to pick up its progress
+    if app_mode == "📄 Document Processing" and st.session_state.document_job:
+        time.sleep(POLL_SECONDS)
+        st.rerun()
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
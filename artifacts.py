@@ -0,0 +1,256 @@
+import atexit
+import hashlib
+import mmap
+import os
+import shutil
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from io import BytesIO
+from cache import content_digest
+
+ARTIFACT_DIR = os.environ.get("ARTIFACT_DIR")
+# Anything larger goes to a temp file and is read back through mmap
+ARTIFACT_SPILL_BYTES = int(os.environ.get("ARTIFACT_SPILL_BYTES", 1024 * 1024))
+# In-memory artifacts of all sessions together, the least recently used spill to disk past this
+ARTIFACT_MEMORY_BUDGET = int(os.environ.get("ARTIFACT_MEMORY_BUDGET", 256 * 1024 * 1024))
+ARTIFACT_IDLE_SECONDS = float(os.environ.get("ARTIFACT_IDLE_SECONDS", 1800))
+SWEEP_SECONDS = 30
+CHUNK_BYTES = 1024 * 1024
+
+
+def map_source(source):
+    # Bytes are wrapped without a copy, paths are memory mapped so pages load on demand
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        return BytesIO(source)
+    with open(source, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return BytesIO(b"")
+        return mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+@contextmanager
+def open_source(source):
+    stream = map_source(source)
+    try:
+        yield stream
+    finally:
+        stream.close()
+
+
+class Artifact:
+    __slots__ = ("handle", "data", "path", "size", "owners", "last_access")
+
+    def __init__(self, handle, size, data=None, path=None):
+        self.handle = handle
+        self.data = data
+        self.path = path
+        self.size = size
+        self.owners = set()
+        self.last_access = time.time()
+
+
+class ArtifactStore:
+    def __init__(self, directory=ARTIFACT_DIR, spill_bytes=ARTIFACT_SPILL_BYTES,
+                 memory_budget=ARTIFACT_MEMORY_BUDGET, idle_seconds=ARTIFACT_IDLE_SECONDS):
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.directory = tempfile.mkdtemp(prefix="artifacts-", dir=directory)
+        self.spill_bytes = spill_bytes
+        self.memory_budget = memory_budget
+        self.idle_seconds = idle_seconds
+        self._artifacts = {}
+        # owner -> {slot: handle}, a new handle in a slot releases the previous one
+        self._slots = {}
+        self._seen = {}
+        self._unlinked = []
+        self._memory = 0
+        self._last_sweep = time.time()
+        self._lock = threading.Lock()
+
+    def put(self, data, owner=None, slot=None):
+        if isinstance(data, str):
+            data = data.encode("utf-8")
+        handle = content_digest(data)
+        with self._lock:
+            artifact = self._artifacts.get(handle)
+            if artifact is None:
+                if len(data) > self.spill_bytes:
+                    artifact = Artifact(handle, len(data), path=self._write(handle, [data]))
+                else:
+                    artifact = Artifact(handle, len(data), data=bytes(data))
+                    self._memory += artifact.size
+                self._artifacts[handle] = artifact
+            artifact.last_access = time.time()
+            if owner is not None:
+                self._assign(owner, slot, handle)
+            self._enforce_budget()
+        return handle
+
+    def put_stream(self, stream, owner=None, slot=None):
+        # Hashes while copying, so an upload is never held twice in memory
+        digest = hashlib.sha256()
+        head = bytearray()
+        spill = None
+        for chunk in iter(lambda: stream.read(CHUNK_BYTES), b""):
+            digest.update(chunk)
+            if spill is not None:
+                spill.write(chunk)
+                continue
+            head += chunk
+            if len(head) > self.spill_bytes:
+                spill = tempfile.NamedTemporaryFile(dir=self.directory, delete=False)
+                spill.write(head)
+                head = None
+        if spill is None:
+            return self.put(bytes(head), owner=owner, slot=slot)
+
+        spill.close()
+        handle = digest.hexdigest()
+        with self._lock:
+            artifact = self._artifacts.get(handle)
+            if artifact is None:
+                path = os.path.join(self.directory, handle)
+                os.replace(spill.name, path)
+                artifact = self._artifacts[handle] = Artifact(handle, os.path.getsize(path), path=path)
+            else:
+                os.remove(spill.name)
+            artifact.last_access = time.time()
+            if owner is not None:
+                self._assign(owner, slot, handle)
+        return handle
+
+    def _write(self, handle, chunks):
+        path = os.path.join(self.directory, handle)
+        with open(path, "wb") as target:
+            for chunk in chunks:
+                target.write(chunk)
+        return path
+
+    def assign(self, owner, slot, handle):
+        with self._lock:
+            if handle not in self._artifacts:
+                return False
+            self._assign(owner, slot, handle)
+            return True
+
+    def _assign(self, owner, slot, handle):
+        slots = self._slots.setdefault(owner, {})
+        previous = slots.get(slot)
+        if previous in self._artifacts:
+            self._artifacts[previous].owners.discard((owner, slot))
+        slots[slot] = handle
+        self._artifacts[handle].owners.add((owner, slot))
+        self._seen[owner] = time.time()
+
+    def source(self, handle):
+        # Bytes for small artifacts, a file path for spilled ones, None once evicted
+        with self._lock:
+            artifact = self._artifacts.get(handle)
+            if artifact is None:
+                return None
+            artifact.last_access = time.time()
+            return artifact.data if artifact.data is not None else artifact.path
+
+    def read_text(self, handle):
+        source = self.source(handle)
+        if source is None:
+            return None
+        if isinstance(source, bytes):
+            return source.decode("utf-8")
+        with open(source, encoding="utf-8") as text:
+            return text.read()
+
+    def touch(self, owner):
+        now = time.time()
+        with self._lock:
+            self._seen[owner] = now
+            for handle in self._slots.get(owner, {}).values():
+                if handle in self._artifacts:
+                    self._artifacts[handle].last_access = now
+            if now - self._last_sweep >= SWEEP_SECONDS:
+                self._sweep(now)
+
+    def release(self, owner):
+        with self._lock:
+            self._release(owner)
+
+    def _release(self, owner):
+        for slot, handle in self._slots.pop(owner, {}).items():
+            if handle in self._artifacts:
+                self._artifacts[handle].owners.discard((owner, slot))
+        self._seen.pop(owner, None)
+
+    def sweep(self):
+        with self._lock:
+            self._sweep(time.time())
+
+    def _sweep(self, now):
+        self._last_sweep = now
+        cutoff = now - self.idle_seconds
+        for owner in [owner for owner, seen in self._seen.items() if seen < cutoff]:
+            self._release(owner)
+        # Unowned artifacts get the same grace period, jobs may still be reading them
+        for handle in [handle for handle, artifact in self._artifacts.items()
+                       if not artifact.owners and artifact.last_access < cutoff]:
+            artifact = self._artifacts.pop(handle)
+            if artifact.data is not None:
+                self._memory -= artifact.size
+            else:
+                self._unlinked.append(artifact.path)
+        # A file that is still mapped somewhere can't be removed on Windows, try again next sweep
+        remaining = []
+        for path in self._unlinked:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            except OSError:
+                remaining.append(path)
+        self._unlinked = remaining
+        self._enforce_budget()
+
+    def _enforce_budget(self):
+        if self._memory <= self.memory_budget:
+            return
+        in_memory = sorted((artifact for artifact in self._artifacts.values() if artifact.data is not None),
+                           key=lambda artifact: artifact.last_access)
+        for artifact in in_memory:
+            if self._memory <= self.memory_budget:
+                break
+            artifact.path = self._write(artifact.handle, [artifact.data])
+            artifact.data = None
+            self._memory -= artifact.size
+
+    def stats(self):
+        with self._lock:
+            return {
+                "artifacts": len(self._artifacts),
+                "memory_bytes": self._memory,
+                "disk_bytes": sum(artifact.size for artifact in self._artifacts.values() if artifact.data is None),
+                "memory_budget": self.memory_budget,
+                "sessions": len(self._seen),
+            }
+
+    def close(self):
+        with self._lock:
+            self._artifacts.clear()
+            self._slots.clear()
+            self._seen.clear()
+            self._memory = 0
+            shutil.rmtree(self.directory, ignore_errors=True)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_artifact_store():
+    # One store per server process, shared by every Streamlit session
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = ArtifactStore()
+            atexit.register(_store.close)
+        return _store
@@ -0,0 +1,190 @@
+from datetime import time, timezone
+from itertools import islice
+import numpy as np
+from rule_engine import compile_rule, RuleCompileError, to_decimal, to_datetime, to_time
+
+PASS, FAIL, ERROR = 1, 0, -1
+STATUS_LABELS = {PASS: "PASS", FAIL: "FAIL", ERROR: "Error"}
+
+_EPOCH = np.datetime64("1970-01-01T00:00:00", "us")
+_NAT = np.datetime64("NaT", "us")
+
+
+def _naive(value):
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+# Values go through the same coercers as validate_rule, so both agree on what parses;
+# _typed_column only does it once per distinct value
+def _money_scalar(value):
+    return float(to_decimal(value))
+
+
+def _date_scalar(value):
+    # Aware values are compared in UTC, the flag keeps naive and aware apart the way Python does
+    parsed = to_datetime(value)
+    return np.datetime64(_naive(parsed), "us"), parsed.tzinfo is not None
+
+
+def _time_scalar(value):
+    if not isinstance(value, time):
+        value = to_time(value)
+    micros = ((value.hour * 60 + value.minute) * 60 + value.second) * 1_000_000 + value.microsecond
+    return _EPOCH + np.timedelta64(micros, "us")
+
+
+def _expected_scalar(category, expected):
+    if category == "money":
+        return float(expected)
+    if category == "date":
+        return np.datetime64(_naive(expected), "us")
+    if category == "time":
+        return _time_scalar(expected)
+    return expected
+
+
+_PARSERS = {
+    "money": (_money_scalar, np.float64, np.nan),
+    "date": (_date_scalar, "datetime64[us]", _NAT),
+    "time": (_time_scalar, "datetime64[us]", _NAT),
+}
+
+
+def _typed_column(category, values):
+    parse, dtype, missing = _PARSERS[category]
+    column = np.empty(len(values), dtype=dtype)
+    valid = np.ones(len(values), dtype=bool)
+    aware = np.zeros(len(values), dtype=bool) if category == "date" else None
+    # Documents repeat the same raw values a lot, parse each distinct one once
+    parsed = {}
+    for i, value in enumerate(values):
+        if value is None:
+            column[i] = missing
+            valid[i] = False
+            continue
+        try:
+            key = (type(value), value)
+            result = parsed[key] if key in parsed else parsed.setdefault(key, parse(value))
+        except (ValueError, TypeError, OverflowError):
+            result = None
+        if result is None:
+            column[i] = missing
+            valid[i] = False
+        elif aware is not None:
+            column[i], aware[i] = result
+        else:
+            column[i] = result
+    return ((column, aware) if aware is not None else column), valid
+
+
+def _text_column(values):
+    # Categorical encoding: comparisons run once per distinct value, then fan out by code
+    codes = np.empty(len(values), dtype=np.int32)
+    lookup = {}
+    for i, value in enumerate(values):
+        text = None if value is None else str(value).lower()
+        code = lookup.get(text)
+        if code is None:
+            code = lookup[text] = len(lookup)
+        codes[i] = code
+    categories = np.array([text or "" for text in lookup], dtype=str) if lookup else np.array([], dtype=str)
+    valid = codes != lookup.get(None, -1)
+    return (codes, categories), valid
+
+
+def build_columns(documents, categories=("money", "date", "time", "text")):
+    columns = {}
+    for category in categories:
+        values = [document.get(category) if document else None for document in documents]
+        if category == "text":
+            columns[category] = _text_column(values)
+        else:
+            columns[category] = _typed_column(category, values)
+    return columns
+
+
+def _evaluate(compiled, column):
+    if compiled.category == "text":
+        codes, categories = column
+        expected = compiled.expected
+        if compiled.condition == "equals":
+            per_category = categories == expected
+        elif compiled.condition == "not_equals":
+            per_category = categories != expected
+        else:
+            per_category = np.char.find(categories, expected) >= 0
+            if compiled.condition == "not_contains":
+                per_category = ~per_category
+        return per_category[codes] if len(categories) else np.zeros(len(codes), dtype=bool)
+    expected = _expected_scalar(compiled.category, compiled.expected)
+    if compiled.category == "date":
+        values, _ = column
+        passed = compiled.compare(values, expected)
+        if compiled.condition in ("equals", "not_equals"):
+            # A naive and an aware datetime are never equal
+            passed = np.where(_mixed_timezones(compiled, column), compiled.condition == "not_equals", passed)
+        return passed
+    return compiled.compare(column, expected)
+
+
+def _mixed_timezones(compiled, column):
+    _, aware = column
+    return aware != (compiled.expected.tzinfo is not None)
+
+
+def evaluate_columns(columns, rules, n_documents):
+    status = np.full((n_documents, len(rules)), ERROR, dtype=np.int8)
+    for j, rule in enumerate(rules):
+        try:
+            compiled = compile_rule(rule)
+        except RuleCompileError:
+            continue
+        column, valid = columns[compiled.category]
+        passed = _evaluate(compiled, column)
+        if compiled.category == "date" and compiled.condition not in ("equals", "not_equals"):
+            # Ordering a naive against an aware datetime raises, validate_rule reports an Error
+            valid = valid & ~_mixed_timezones(compiled, column)
+        status[:, j] = np.where(valid, np.where(passed, PASS, FAIL), ERROR)
+    return status
+
+
+def iter_validate_batches(documents, rules, chunk_size=10000):
+    categories = set()
+    for rule in rules:
+        category = rule.get("category") if isinstance(rule, dict) else None
+        if category in ("money", "date", "time", "text"):
+            categories.add(category)
+    documents = iter(documents)
+    while True:
+        chunk = list(islice(documents, chunk_size))
+        if not chunk:
+            break
+        columns = build_columns(chunk, sorted(categories))
+        yield evaluate_columns(columns, rules, len(chunk))
+
+
+def aggregate_results(status, rules):
+    passed = (status == PASS).sum(axis=0)
+    failed = (status == FAIL).sum(axis=0)
+    errors = (status == ERROR).sum(axis=0)
+    return [
+        {
+            "rule": rule,
+            "passed": int(passed[j]),
+            "failed": int(failed[j]),
+            "errors": int(errors[j]),
+            "pass_rate": float(passed[j]) / status.shape[0] if status.shape[0] else 0.0
+        }
+        for j, rule in enumerate(rules)
+    ]
+
+
+def validate_batch(documents, rules, chunk_size=10000):
+    chunks = list(iter_validate_batches(documents, rules, chunk_size))
+    if chunks:
+        status = np.concatenate(chunks)
+    else:
+        status = np.empty((0, len(rules)), dtype=np.int8)
+    return status, aggregate_results(status, rules)
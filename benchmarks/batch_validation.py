@@ -0,0 +1,117 @@
+import argparse
+import json
+import random
+import time
+from datetime import date, timedelta
+from llm import validate_rule
+from batch_validation import validate_batch, STATUS_LABELS
+
+VENDORS = ["Acme Corp", "Globex", "Initech LLC", "Umbrella Ltd", "Stark Industries"]
+
+
+def make_documents(count, seed=0):
+    rng = random.Random(seed)
+    start = date(2024, 1, 1)
+    documents = []
+    for _ in range(count):
+        documents.append({
+            "money": f"{rng.uniform(10, 5000):.2f}",
+            "date": (start + timedelta(days=rng.randint(0, 730))).isoformat(),
+            "time": f"{rng.randint(0, 23):02d}:{rng.randint(0, 59):02d}:00",
+            "text": rng.choice(VENDORS),
+        })
+    return documents
+
+
+def make_rules(count, seed=0):
+    rng = random.Random(seed + 1)
+    makers = [
+        lambda: {"category": "money", "condition": rng.choice(["greater_than", "less_than", "equals"]),
+                 "value": rng.randint(10, 5000)},
+        lambda: {"category": "date", "condition": rng.choice(["before_date", "after_date"]),
+                 "value": (date(2024, 1, 1) + timedelta(days=rng.randint(0, 730))).isoformat()},
+        lambda: {"category": "time", "condition": rng.choice(["before_date", "after_date"]),
+                 "value": f"{rng.randint(0, 23):02d}:00:00"},
+        lambda: {"category": "text", "condition": rng.choice(["equals", "contains", "not_contains"]),
+                 "value": rng.choice(VENDORS).split()[0]},
+    ]
+    return [rng.choice(makers)() for _ in range(count)]
+
+
+# Values the two paths used to disagree on, next to ordinary ones
+EDGE_DOCUMENTS = [
+    {"money": "nan", "date": "now", "time": "now", "text": ""},
+    {"money": True, "date": "2025", "time": "9pm", "text": "Acme Corp"},
+    {"money": "$1,234.50", "date": "NaT", "time": "25:00", "text": None},
+    {"money": "inf", "date": "2025-01-01T10:00:00+02:00", "time": "10:00:00", "text": "Globex"},
+    {"money": 1e400, "date": "2025-01-01", "time": None, "text": "globex"},
+    {"money": "", "date": "January 1, 2025", "time": "", "text": 12},
+    {},
+]
+EDGE_RULES = [
+    {"category": "money", "condition": "greater_than", "value": 100},
+    {"category": "money", "condition": "equals", "value": 1},
+    {"category": "date", "condition": "equals", "value": "2025-01-01"},
+    {"category": "date", "condition": "not_equals", "value": "2025-01-01"},
+    {"category": "date", "condition": "after_date", "value": "2024-12-31"},
+    {"category": "date", "condition": "before_date", "value": "2025-01-01T12:00:00+00:00"},
+    {"category": "date", "condition": "equals", "value": "2025-01-01T08:00:00Z"},
+    {"category": "time", "condition": "after_date", "value": "08:00"},
+    {"category": "text", "condition": "contains", "value": "globex"},
+]
+
+
+def check_parity(documents, rules):
+    # Every status of the batch engine must match validate_rule for the same document and rule
+    status, _ = validate_batch(documents, rules)
+    mismatches = []
+    for i, document in enumerate(documents):
+        for j, rule in enumerate(rules):
+            expected = validate_rule(rule, document)["status"]
+            if STATUS_LABELS[int(status[i, j])] != expected:
+                mismatches.append({"document": document, "rule": rule, "batch": STATUS_LABELS[int(status[i, j])],
+                                   "validate_rule": expected})
+    return mismatches
+
+
+def run(documents, rules, loop_documents):
+    started = time.perf_counter()
+    status, _ = validate_batch(documents, rules)
+    batch_seconds = time.perf_counter() - started
+
+    # The per-call loop is much slower, time it on a sample and extrapolate
+    sample = documents[:loop_documents]
+    started = time.perf_counter()
+    for document in sample:
+        for rule in rules:
+            validate_rule(rule, document)
+    loop_seconds = (time.perf_counter() - started) * len(documents) / max(len(sample), 1)
+
+    return {
+        "documents": len(documents),
+        "rules": len(rules),
+        "batch_seconds": round(batch_seconds, 4),
+        "loop_seconds_estimated": round(loop_seconds, 4),
+        "loop_documents_timed": len(sample),
+        "speedup": round(loop_seconds / batch_seconds, 1) if batch_seconds else None,
+        "evaluations_per_second": round(status.size / batch_seconds) if batch_seconds else None,
+        "parity_mismatches": len(check_parity(documents[:loop_documents] + EDGE_DOCUMENTS, rules + EDGE_RULES)),
+    }
+
+
+def main():
+    arg_parser = argparse.ArgumentParser(description="Batch validation vs per-call validate_rule loop")
+    arg_parser.add_argument("--documents", type=int, default=10000)
+    arg_parser.add_argument("--rules", type=int, default=100)
+    arg_parser.add_argument("--loop-documents", type=int, default=500,
+                            help="documents to time the per-call loop on")
+    arg_parser.add_argument("--seed", type=int, default=0)
+    args = arg_parser.parse_args()
+
+    documents = make_documents(args.documents, args.seed)
+    rules = make_rules(args.rules, args.seed)
+    print(json.dumps(run(documents, rules, args.loop_documents), indent=2))
+
+
+if __name__ == "__main__":
+    main()
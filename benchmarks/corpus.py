@@ -0,0 +1,166 @@
+import io
+import random
+from datetime import date, datetime, timedelta
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+from fields import FIELD_CATEGORIES, FIELD_DISPLAY_NAMES
+
+VENDORS = ["Acme Corp", "Globex", "Initech LLC", "Umbrella Ltd", "Stark Industries"]
+CUSTOMERS = ["Wayne Enterprises", "Hooli", "Soylent Co", "Vandelay Industries", "Pied Piper"]
+ITEMS = ["Consulting hours", "Hosting plan", "Support contract", "Office supplies", "Licence renewal",
+         "Travel expenses", "Hardware", "Training session"]
+FILLER = ("Thank you for your business. Payment is expected within the agreed terms and late payments "
+          "may be subject to a service charge. Please quote the reference on all correspondence.")
+LINES_PER_PAGE = 40
+DATE_FORMATS = ["%Y-%m-%d", "%B %d, %Y", "%d %b %Y", "%m/%d/%Y"]
+
+
+def make_values(rng, seed):
+    issued = datetime(2024, 1, 1, rng.randint(8, 18), rng.randint(0, 59)) + timedelta(days=rng.randint(0, 730))
+    items = [(rng.choice(ITEMS), round(rng.uniform(20, 900), 2)) for _ in range(rng.randint(3, 8))]
+    subtotal = round(sum(amount for _, amount in items), 2)
+    tax = round(subtotal * 0.14, 2)
+    total = round(subtotal + tax, 2)
+    fields = {
+        "total_amount": total,
+        "payment_amount": total if rng.random() < 0.7 else round(total * rng.choice([0.25, 0.5]), 2),
+        "subtotal": subtotal,
+        "tax_amount": tax,
+        "invoice_date": issued.date(),
+        "due_date": issued.date() + timedelta(days=30),
+        "payment_date": issued.date() + timedelta(days=rng.randint(1, 45)),
+        "issue_time": issued.time(),
+        "processing_time": (issued + timedelta(minutes=rng.randint(5, 600))).time(),
+        "invoice_number": f"INV-{seed:06d}",
+        "customer": rng.choice(CUSTOMERS),
+        "vendor": rng.choice(VENDORS),
+    }
+    return fields, items
+
+
+def _format_value(rng, value, noise):
+    # Noisy documents mix the formats a real inbox has, clean ones stay ISO
+    if isinstance(value, float):
+        return f"${value:,.2f}" if rng.random() < noise else f"${value:.2f}"
+    if isinstance(value, date):
+        return value.strftime(rng.choice(DATE_FORMATS) if rng.random() < noise else DATE_FORMATS[0])
+    if hasattr(value, "strftime"):
+        return value.strftime("%I:%M %p" if rng.random() < noise else "%H:%M")
+    return str(value)
+
+
+def category_values(fields):
+    # The first field of each category, what extract_data_from_text should return
+    values = {}
+    for category, category_fields in FIELD_CATEGORIES.items():
+        value = fields[category_fields[0]]
+        if isinstance(value, float):
+            value = f"{value:.2f}"
+        elif hasattr(value, "isoformat"):
+            value = value.isoformat() if isinstance(value, date) else value.strftime("%H:%M:%S")
+        values[category] = value
+    return values
+
+
+def make_invoice(seed, pages=3, labeled=True, noise=0.0):
+    rng = random.Random(seed)
+    fields, items = make_values(rng, seed)
+
+    if labeled:
+        header = [fields["vendor"], ""]
+        header += [f"{FIELD_DISPLAY_NAMES[field]}: {_format_value(rng, fields[field], noise)}"
+                   for field in ("invoice_number", "customer", "invoice_date", "due_date", "issue_time")]
+        footer = [f"{FIELD_DISPLAY_NAMES[field]}: {_format_value(rng, fields[field], noise)}"
+                  for field in ("subtotal", "tax_amount", "total_amount", "payment_amount", "payment_date",
+                                "processing_time")]
+    else:
+        # No labels and several amounts, so the heuristics have to hand the document to the model
+        header = [fields["vendor"], fields["invoice_number"],
+                  f"{fields['invoice_date'].isoformat()} {fields['issue_time'].strftime('%H:%M')}", ""]
+        footer = [f"${fields[field]:.2f}" for field in ("subtotal", "tax_amount", "total_amount")]
+    body = [f"{name:<24} ${amount:>9.2f}" for name, amount in items]
+    if rng.random() < noise:
+        # Decoy numbers that look like amounts but are not
+        body.append(f"Ref {rng.randint(100, 999)}.{rng.randint(10, 99)} / PO {rng.randint(10000, 99999)}")
+
+    lines = header + [""] + body + [""] + footer
+    page_lines = [lines]
+    for _ in range(pages - 1):
+        page_lines.append([FILLER[i:i + 90] for i in range(0, len(FILLER), 90)] * (LINES_PER_PAGE // 3))
+    return page_lines, {**category_values(fields), **{k: str(v) for k, v in fields.items()}}
+
+
+def invoice_text(page_lines):
+    return "\n\n".join("\n".join(lines) for lines in page_lines)
+
+
+def _escape(text):
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+
+def write_pdf(page_lines):
+    # Smallest valid PDF with a text layer per page, enough for pdfplumber
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>", None,
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Courier >>"]
+    kids = []
+    for lines in page_lines:
+        stream = "BT /F1 10 Tf 12 TL 50 780 Td " + " ".join(f"({_escape(line)}) Tj T*" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+        objects.append(f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+                       f"/Resources << /Font << /F1 3 0 R >> >> /Contents {len(objects)} 0 R >>")
+        kids.append(f"{len(objects)} 0 R")
+    objects[1] = f"<< /Type /Pages /Kids [{' '.join(kids)}] /Count {len(kids)} >>"
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1")
+    xref = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1")
+    for offset in offsets:
+        output += f"{offset:010d} 00000 n \n".encode("latin-1")
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1")
+    return bytes(output)
+
+
+def _font(size=16):
+    try:
+        return ImageFont.truetype("DejaVuSansMono.ttf", size)
+    except OSError:
+        return ImageFont.load_default()
+
+
+def write_png(page_lines, noise=0.0, seed=0):
+    # Pages stacked into one tall scan, the image path OCRs a single image
+    rng = random.Random(seed)
+    font = _font()
+    line_height = 22
+    lines = [line for page in page_lines for line in page + [""]]
+    image = Image.new("L", (1000, 60 + line_height * len(lines)), 255)
+    draw = ImageDraw.Draw(image)
+    for index, line in enumerate(lines):
+        draw.text((40, 30 + index * line_height), line, fill=0, font=font)
+    if noise:
+        for _ in range(int(noise * image.width * image.height / 200)):
+            draw.point((rng.randrange(image.width), rng.randrange(image.height)), fill=rng.randint(0, 160))
+        image = image.rotate(rng.uniform(-2, 2) * noise, expand=True, fillcolor=255)
+        image = image.filter(ImageFilter.GaussianBlur(radius=0.6 * noise))
+    output = io.BytesIO()
+    image.save(output, format="PNG")
+    return output.getvalue()
+
+
+def make_corpus(directory, count, pages=3, labeled=True, seed=0, noise=0.0, image=False):
+    paths = []
+    for index in range(count):
+        page_lines, _ = make_invoice(seed + index, pages=pages, labeled=labeled, noise=noise)
+        if image:
+            path = f"{directory}/invoice_{index:05d}.png"
+            content = write_png(page_lines, noise=noise, seed=seed + index)
+        else:
+            path = f"{directory}/invoice_{index:05d}.pdf"
+            content = write_pdf(page_lines)
+        with open(path, "wb") as target:
+            target.write(content)
+        paths.append(path)
+    return paths
@@ -0,0 +1,76 @@
+import argparse
+import json
+import random
+import time
+from incremental import IncrementalValidator
+from rule_index import RuleIndex
+from rule_parser import parse_rule_text
+from benchmarks.suite import make_rule_texts
+
+EDIT_VALUES = {
+    "money": lambda rng: f"{rng.uniform(10, 5000):.2f}",
+    "date": lambda rng: f"2025-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}",
+    "time": lambda rng: f"{rng.randint(8, 18)}:{rng.randint(10, 59)}:00",
+    "text": lambda rng: rng.choice(["Acme Corp", "Globex", "Hooli"]),
+}
+
+
+def make_edits(rules, count, rule_share, seed=0):
+    # A reviewer's corrections, mostly single field fixes with the odd rule tweak
+    rng = random.Random(seed)
+    data = {category: make(rng) for category, make in EDIT_VALUES.items()}
+    rules = list(rules)
+    steps = []
+    for _ in range(count):
+        if rng.random() < rule_share:
+            position = rng.randrange(len(rules))
+            rule = rules[position]
+            value = rule["value"]
+            rules[position] = {**rule, "value": round(float(value) * rng.uniform(0.5, 1.5), 2)
+                               if rule["category"] == "money" else value}
+        else:
+            category = rng.choice(list(EDIT_VALUES))
+            data = {**data, category: EDIT_VALUES[category](rng)}
+        steps.append((list(rules), data))
+    return steps
+
+
+def run(rule_count, edits, rule_share):
+    rules = [rule for rule in map(parse_rule_text, make_rule_texts(rule_count * 2)) if rule][:rule_count]
+    steps = make_edits(rules, edits, rule_share)
+
+    started = time.perf_counter()
+    full = [RuleIndex(step_rules).evaluate(data) for step_rules, data in steps]
+    full_seconds = time.perf_counter() - started
+
+    validator = IncrementalValidator()
+    validator.update(*steps[0])
+    evaluated = 0
+    started = time.perf_counter()
+    for step_rules, data in steps[1:]:
+        evaluated += validator.update(step_rules, data)["affected"]
+    incremental_seconds = time.perf_counter() - started
+    assert [result["status"] for result in validator.results] == [result["status"] for result in full[-1]]
+
+    return {
+        "rules": len(rules),
+        "edits": edits,
+        "rule_share": rule_share,
+        "full_ms_per_edit": round(full_seconds / len(steps) * 1000, 3),
+        "incremental_ms_per_edit": round(incremental_seconds / (len(steps) - 1) * 1000, 3),
+        "results_updated_per_edit": round(evaluated / (len(steps) - 1), 1),
+        "speedup": round(full_seconds / len(steps) / (incremental_seconds / (len(steps) - 1)), 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare full and incremental re-validation over a series of edits")
+    parser.add_argument("--rules", type=int, default=10000)
+    parser.add_argument("--edits", type=int, default=200)
+    parser.add_argument("--rule-share", type=float, default=0.3, help="fraction of edits that change a rule")
+    args = parser.parse_args()
+    print(json.dumps(run(args.rules, args.edits, args.rule_share), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+import argparse
+import json
+import time
+from cache import configure_cache
+from ollama_client import configure_client
+from llm import extract_data_from_text
+from metrics import registry
+from model_router import AUTO_MODEL, MODEL_TIERS, model_stats
+from near_duplicates import configure_layout_index
+from benchmarks.corpus import make_invoice, invoice_text
+from benchmarks.stub_ollama import StubOllamaServer
+
+
+def _accuracy(extracted, truths):
+    correct = sum(data.get(category) == truth[category]
+                  for data, truth in zip(extracted, truths) for category in ("money", "date", "time"))
+    return round(correct / (len(truths) * 3), 4)
+
+
+def run(documents, small_latency, large_latency, small_failure_rate, large_failure_rate):
+    # Unlabelled invoices, so every document is handed to the model
+    invoices = [make_invoice(seed, pages=1, labeled=False) for seed in range(documents)]
+    texts = [invoice_text(page_lines) for page_lines, _ in invoices]
+    truths = [values for _, values in invoices]
+    small, large = MODEL_TIERS[0], MODEL_TIERS[-1]
+    models = {small: (small_latency, small_failure_rate), large: (large_latency, large_failure_rate)}
+
+    results = {"documents": documents, "tiers": list(MODEL_TIERS)}
+    with StubOllamaServer(models=models) as server:
+        configure_client(host=server.host)
+        for name, model in (("pinned", large), ("routed", AUTO_MODEL)):
+            configure_cache(path=":memory:")
+            # Layouts learned in the first pass would answer the second one without the model
+            configure_layout_index(size=0)
+            registry.reset()
+            server.model_calls.clear()
+            started = time.perf_counter()
+            extracted = [extract_data_from_text(text, model=model) for text in texts]
+            results[name] = {
+                "seconds": round(time.perf_counter() - started, 3),
+                "field_accuracy": _accuracy(extracted, truths),
+                "model_calls": dict(server.model_calls),
+                "models": {model: {key: round(value, 4) for key, value in stats.items()}
+                           for model, stats in model_stats().items()},
+            }
+    results["speedup"] = round(results["pinned"]["seconds"] / results["routed"]["seconds"], 2)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare routing between model tiers with always using the largest")
+    parser.add_argument("--documents", type=int, default=200)
+    parser.add_argument("--small-latency", type=float, default=0.05, help="seconds per call to the first tier")
+    parser.add_argument("--large-latency", type=float, default=0.25, help="seconds per call to the last tier")
+    parser.add_argument("--small-failure-rate", type=float, default=0.15)
+    parser.add_argument("--large-failure-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    print(json.dumps(run(args.documents, args.small_latency, args.large_latency,
+                         args.small_failure_rate, args.large_failure_rate), indent=2))
+
+
+if __name__ == "__main__":
+    main()
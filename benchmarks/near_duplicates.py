@@ -0,0 +1,71 @@
+import argparse
+import json
+import time
+from ollama_client import configure_client
+from llm import extract_data_from_text
+from near_duplicates import configure_layout_index
+from benchmarks.corpus import make_invoice, invoice_text
+from benchmarks.stub_ollama import StubOllamaServer
+
+CATEGORIES = ("money", "date", "time")
+
+
+def _matches(category, value, expected):
+    if category == "money":
+        try:
+            return abs(float(value) - float(expected)) < 0.005
+        except (TypeError, ValueError):
+            return False
+    return str(value) == str(expected)
+
+
+def run_extraction(documents, latency, layout_size):
+    # Same stub and documents each time, only the layout index differs
+    configure_layout_index(size=layout_size)
+    with StubOllamaServer(latency=latency) as server:
+        configure_client(host=server.host)
+        started = time.perf_counter()
+        wrong = 0
+        for text, expected in documents:
+            data = extract_data_from_text(text)
+            wrong += sum(1 for category in CATEGORIES if not _matches(category, data.get(category), expected[category]))
+        seconds = time.perf_counter() - started
+    return {"llm_calls": server.calls, "wrong_fields": wrong, "seconds": round(seconds, 3)}
+
+
+def run(documents, pages, labeled_share, noise, latency):
+    # Recurring invoices from a handful of vendors, some with labels the heuristics read on their own
+    corpus = []
+    for seed in range(documents):
+        labeled = seed % 100 < labeled_share * 100
+        page_lines, expected = make_invoice(seed, pages=pages, labeled=labeled, noise=noise)
+        corpus.append((invoice_text(page_lines), expected))
+
+    without = run_extraction(corpus, latency, layout_size=0)
+    with_layouts = run_extraction(corpus, latency, layout_size=5000)
+    configure_layout_index()
+    return {
+        "documents": documents,
+        "pages": pages,
+        "labeled_share": labeled_share,
+        "noise": noise,
+        "without_layouts": without,
+        "with_layouts": with_layouts,
+        "llm_calls_avoided": without["llm_calls"] - with_layouts["llm_calls"],
+        "speedup": round(without["seconds"] / with_layouts["seconds"], 1) if with_layouts["seconds"] else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count LLM calls with and without near-duplicate layout reuse")
+    parser.add_argument("--documents", type=int, default=300)
+    parser.add_argument("--pages", type=int, default=1)
+    parser.add_argument("--labeled-share", type=float, default=0.3, help="fraction of documents with field labels")
+    parser.add_argument("--noise", type=float, default=0.3, help="chance of mixed formats and decoy numbers")
+    parser.add_argument("--latency", type=float, default=0.05, help="stub model latency in seconds")
+    args = parser.parse_args()
+    print(json.dumps(run(args.documents, args.pages, args.labeled_share, args.noise, args.latency), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import argparse
+import json
+import os
+import tempfile
+import time
+from types import SimpleNamespace
+from ollama_client import configure_client
+from llm import extract_text_from_document, extract_data_from_text
+from near_duplicates import configure_layout_index
+from rule_index import RuleIndex
+from pipeline import run_pipeline
+from benchmarks.corpus import make_corpus
+from benchmarks.stub_ollama import StubOllamaServer
+from benchmarks.batch_validation import make_rules
+
+
+def run_sequential(paths, rules):
+    # What the app did per document: text, then model, then rules, one after another
+    rule_index = RuleIndex(rules)
+    for path in paths:
+        with open(path, "rb") as source:
+            text = extract_text_from_document(SimpleNamespace(type="application/pdf"), source.read())
+        rule_index.evaluate(extract_data_from_text(text))
+
+
+def run(documents, pages, rules, latency, ocr_workers, llm_concurrency):
+    rules = make_rules(rules)
+    with tempfile.TemporaryDirectory() as directory, StubOllamaServer(latency=latency) as server:
+        configure_client(host=server.host, pool_size=llm_concurrency)
+        # Layouts learned in the sequential run would spare the pipeline most of its model calls
+        configure_layout_index(size=0)
+        paths = make_corpus(directory, documents, pages=pages, labeled=False)
+
+        started = time.perf_counter()
+        run_sequential(paths, rules)
+        sequential_seconds = time.perf_counter() - started
+
+        started = time.perf_counter()
+        results = run_pipeline(paths, rules, ocr_workers=ocr_workers, llm_concurrency=llm_concurrency,
+                               use_cache=False)
+        pipeline_seconds = time.perf_counter() - started
+
+    return {
+        "documents": documents,
+        "pages_per_document": pages,
+        "rules": len(rules),
+        "llm_latency_seconds": latency,
+        "ocr_workers": ocr_workers,
+        "llm_concurrency": llm_concurrency,
+        "llm_calls": server.calls,
+        "errors": sum(1 for item in results if "error" in item),
+        "sequential_seconds": round(sequential_seconds, 3),
+        "pipeline_seconds": round(pipeline_seconds, 3),
+        "sequential_docs_per_second": round(documents / sequential_seconds, 2),
+        "pipeline_docs_per_second": round(documents / pipeline_seconds, 2),
+        "speedup": round(sequential_seconds / pipeline_seconds, 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare sequential and pipelined document processing")
+    parser.add_argument("--documents", type=int, default=40)
+    parser.add_argument("--pages", type=int, default=4)
+    parser.add_argument("--rules", type=int, default=50)
+    parser.add_argument("--latency", type=float, default=0.25, help="Seconds per stub model call")
+    parser.add_argument("--ocr-workers", type=int, default=os.cpu_count())
+    parser.add_argument("--llm-concurrency", type=int, default=4)
+    args = parser.parse_args()
+    print(json.dumps(run(args.documents, args.pages, args.rules, args.latency, args.ocr_workers,
+                         args.llm_concurrency), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from result_store import ResultStore
+from rule_index import RuleIndex
+from benchmarks.suite import make_rule_texts
+from rule_parser import parse_rule_text
+
+
+def run(documents, rules_per_document, batch_size, seed=0):
+    rng = random.Random(seed)
+    rules = [rule for rule in map(parse_rule_text, make_rule_texts(rules_per_document * 2, seed)) if rule]
+    rule_index = RuleIndex(rules[:rules_per_document])
+    runs = []
+    for index in range(documents):
+        data = {"money": f"{rng.uniform(10, 5000):.2f}", "date": f"2025-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}",
+                "time": f"{rng.randint(8, 18)}:00:00", "text": rng.choice(["Acme Corp", "Globex", "Hooli"])}
+        runs.append({"results": rule_index.evaluate(data), "data": data, "digest": f"document-{index}"})
+
+    with tempfile.TemporaryDirectory() as directory:
+        store = ResultStore(os.path.join(directory, "results.sqlite3"))
+        started = time.perf_counter()
+        for start in range(0, len(runs), batch_size):
+            store.record_runs(runs[start:start + batch_size])
+        insert_seconds = time.perf_counter() - started
+        results = store.stats()["results"]
+
+        def timed(func, repeat=5):
+            started = time.perf_counter()
+            for _ in range(repeat):
+                func()
+            return round((time.perf_counter() - started) / repeat * 1000, 3)
+
+        # What the dashboard used to do, over every stored result instead of one session's list
+        all_results = [result for run in runs for result in run["results"]]
+        timings = {
+            "aggregate_totals_ms": timed(store.totals),
+            "aggregate_rule_totals_ms": timed(store.rule_totals),
+            "aggregate_daily_totals_ms": timed(store.daily_totals),
+            "scan_totals_ms": timed(lambda: store._conn.execute(
+                "SELECT status, COUNT(*) FROM results GROUP BY status").fetchall(), repeat=1),
+            "python_sums_ms": timed(lambda: (sum(1 for r in all_results if r.get("status") == "PASS"),
+                                             sum(1 for r in all_results if r.get("status") == "FAIL")), repeat=1),
+            "indexed_failures_ms": timed(lambda: store.results(status="FAIL", category="money", limit=100)),
+        }
+    return {
+        "documents": documents,
+        "results": results,
+        "batch_size": batch_size,
+        "insert_seconds": round(insert_seconds, 3),
+        "results_per_second": round(results / insert_seconds),
+        **timings,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Bulk insert validation results and time the dashboard queries")
+    parser.add_argument("--documents", type=int, default=20000)
+    parser.add_argument("--rules", type=int, default=50, help="rules checked per document")
+    parser.add_argument("--batch-size", type=int, default=1000, help="documents per transaction")
+    args = parser.parse_args()
+    print(json.dumps(run(args.documents, args.rules, args.batch_size), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+import argparse
+import json
+import random
+import time
+from cache import configure_cache
+from ollama_client import configure_client
+from llm import parse_rule
+from rule_import import parse_rules_bulk, BATCH_SIZE, BATCH_WORKERS
+from benchmarks.stub_ollama import StubOllamaServer
+
+# Phrasings the deterministic parser does not cover, so every rule needs the model
+MODEL_TEMPLATES = [
+    "Flag invoices that go past the {n} budget line",
+    "Anything billed over {n} needs a second approver",
+    "Payments under {n} can skip review",
+    "Reject invoices dated before the {d} cutoff",
+]
+
+
+def make_rule_texts(count, model_share, seed=0):
+    rng = random.Random(seed)
+    texts = []
+    for _ in range(count):
+        if rng.random() < model_share:
+            cutoff = f"2025-0{rng.randint(1, 9)}-1{rng.randint(0, 9)}"
+            texts.append(rng.choice(MODEL_TEMPLATES).format(n=rng.randint(10, 99999), d=cutoff))
+        else:
+            texts.append(f"Total must be greater than {rng.randint(10, 99999)}")
+    return texts
+
+
+def run(count, model_share, latency, tokens_per_second, sequential_sample, batch_size, workers):
+    texts = make_rule_texts(count, model_share)
+    with StubOllamaServer(latency=latency, tokens_per_second=tokens_per_second) as server:
+        configure_client(host=server.host, pool_size=workers)
+
+        # One request per rule is slow, time a sample and extrapolate
+        configure_cache(path=":memory:")
+        sample = texts[:sequential_sample]
+        started = time.perf_counter()
+        for text in sample:
+            parse_rule(text)
+        sequential_seconds = (time.perf_counter() - started) * len(texts) / max(len(sample), 1)
+
+        configure_cache(path=":memory:")
+        calls_before = server.calls
+        started = time.perf_counter()
+        results = parse_rules_bulk(texts, batch_size=batch_size, workers=workers)
+        bulk_seconds = time.perf_counter() - started
+
+    return {
+        "rules": count,
+        "model_share": model_share,
+        "llm_latency_seconds": latency,
+        "tokens_per_second": tokens_per_second,
+        "batch_size": batch_size,
+        "workers": workers,
+        "imported": sum(1 for result in results if result["rule"]),
+        "bulk_llm_calls": server.calls - calls_before,
+        "sequential_seconds_estimated": round(sequential_seconds, 3),
+        "sequential_rules_timed": len(sample),
+        "bulk_seconds": round(bulk_seconds, 3),
+        "speedup": round(sequential_seconds / bulk_seconds, 1) if bulk_seconds else None,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare one-at-a-time and bulk rule parsing")
+    parser.add_argument("--rules", type=int, default=500)
+    parser.add_argument("--model-share", type=float, default=0.8, help="fraction of rules that need the model")
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds per stub model call")
+    parser.add_argument("--tokens-per-second", type=float, default=400)
+    parser.add_argument("--sequential-sample", type=int, default=40)
+    parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=BATCH_WORKERS)
+    args = parser.parse_args()
+    print(json.dumps(run(args.rules, args.model_share, args.latency, args.tokens_per_second,
+                         args.sequential_sample, args.batch_size, args.workers), indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import json
+import random
+import re
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from heuristics import FIELD_CATEGORY, find_candidates, best_candidate
+from rule_parser import parse_rule_text
+
+DEFAULT_RULE = {"category": "money", "condition": "greater_than", "value": 0}
+STREAM_CHUNK_CHARS = 8
+
+
+def _document_text(prompt):
+    _, _, text = prompt.partition("Document Text:")
+    return text
+
+
+def answer(prompt, format=None):
+    # Deterministic stand-in for the model, reads the values the way a well behaved model would
+    rule_match = re.search(r'Rule to convert: "(.*)"', prompt)
+    if rule_match:
+        return json.dumps(parse_rule_text(rule_match.group(1)) or DEFAULT_RULE)
+    if "Rules to convert:" in prompt:
+        numbered = re.findall(r'^\s*(\d+)\. "(.*)"$', prompt.partition("Rules to convert:")[2], re.MULTILINE)
+        return json.dumps([{"index": int(index), **(parse_rule_text(text) or DEFAULT_RULE)} for index, text in numbered])
+
+    candidates = find_candidates(_document_text(prompt))
+    values = {}
+    for category in ("money", "date", "time"):
+        best = best_candidate(candidates, category)
+        if category == "money":
+            # Unlabelled totals are usually the largest amount on the page
+            amounts = [c["value"] for c in candidates if c["category"] == "money"]
+            best = {"value": max(amounts, key=float)} if amounts else best
+        values[category] = best["value"] if best else None
+
+    if format:
+        fields = {field: None for field in FIELD_CATEGORY}
+        for field, category in FIELD_CATEGORY.items():
+            if category in values and all(fields[other] is None for other, c in FIELD_CATEGORY.items()
+                                          if c == category):
+                fields[field] = float(values[category]) if category == "money" and values[category] else values[category]
+        return json.dumps(fields)
+    return json.dumps({category: value or "" for category, value in values.items()})
+
+
+class StubOllamaServer:
+    def __init__(self, latency=0.2, tokens_per_second=None, host="127.0.0.1", port=0, models=None):
+        self.latency = latency
+        self.tokens_per_second = tokens_per_second
+        # {model: (latency, failure_rate)}, a failing model answers with something that is not JSON
+        self.models = models or {}
+        self.calls = 0
+        self.model_calls = {}
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer((host, port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def host(self):
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def _delay(self, response, model=None):
+        seconds = self.models.get(model, (self.latency, 0.0))[0]
+        if self.tokens_per_second:
+            seconds += len(response) / 4 / self.tokens_per_second
+        return seconds
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            # Headers and body go out in separate writes, without this keep-alive calls wait on delayed ACKs
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _send(self, body, content_type="application/json"):
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                self._send(json.dumps({"models": [{"name": "stub"}]}).encode("utf-8"))
+
+            def do_POST(self):
+                payload = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                if self.path != "/api/generate" or not payload.get("prompt"):
+                    # Model pinning and anything else just succeeds
+                    self._send(b'{"done": true}')
+                    return
+                model = payload.get("model")
+                with stub._lock:
+                    stub.calls += 1
+                    stub.model_calls[model] = stub.model_calls.get(model, 0) + 1
+                response = answer(payload["prompt"], payload.get("format"))
+                # Seeded by the prompt so a model fails the same prompts on every run
+                if random.Random(payload["prompt"]).random() < stub.models.get(model, (0, 0.0))[1]:
+                    response = "Sure! Here is the data you asked for."
+                delay = stub._delay(response, model)
+                counts = {"prompt_eval_count": len(payload["prompt"]) // 4, "eval_count": len(response) // 4}
+                if not payload.get("stream"):
+                    time.sleep(delay)
+                    self._send(json.dumps({"response": response, "done": True, **counts}).encode("utf-8"))
+                    return
+
+                chunks = [response[i:i + STREAM_CHUNK_CHARS] for i in range(0, len(response), STREAM_CHUNK_CHARS)]
+                lines = [json.dumps({"response": chunk, "done": False}) for chunk in chunks]
+                lines.append(json.dumps({"response": "", "done": True, **counts}))
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                for line in lines:
+                    time.sleep(delay / len(lines))
+                    data = (line + "\n").encode("utf-8")
+                    self.wfile.write(f"{len(data):x}\r\n".encode("latin-1") + data + b"\r\n")
+                self.wfile.write(b"0\r\n\r\n")
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,206 @@
+import argparse
+import json
+import os
+import platform
+import random
+import subprocess
+import sys
+import time
+from datetime import date, datetime, timedelta, timezone
+from types import SimpleNamespace
+from cache import configure_cache
+from near_duplicates import configure_layout_index
+from ollama_client import configure_client
+from llm import extract_text_from_document, parse_rule, extract_data_from_text, validate_rule
+from batch_validation import validate_batch
+from rule_index import RuleIndex
+from benchmarks.corpus import make_invoice, invoice_text, write_pdf, write_png, VENDORS, CUSTOMERS
+from benchmarks.stub_ollama import StubOllamaServer
+
+SCENARIOS = ["extract_text_pdf", "extract_text_png", "parse_rule", "extract_data", "validate_rule",
+             "validate_batch", "rule_index"]
+
+RULE_TEMPLATES = [
+    lambda rng: f"Total must be greater than {rng.randint(10, 5000)}",
+    lambda rng: f"amount should be less than ${rng.randint(10, 5000):,}",
+    lambda rng: f"Invoice total not equal to {rng.randint(10, 5000)}.00",
+    lambda rng: f"Invoice date must be after {_random_date(rng).isoformat()}",
+    lambda rng: f"date before {_random_date(rng).strftime('%B %d, %Y')}",
+    lambda rng: f"Issue time must be before {rng.randint(8, 18)}:00",
+    lambda rng: f"vendor must contain {rng.choice(VENDORS).split()[0]}",
+    lambda rng: f"customer must not contain {rng.choice(CUSTOMERS).split()[0]}",
+    # Phrasings the deterministic parser leaves to the model
+    lambda rng: f"Flag invoices that go past the {rng.randint(10, 5000)} budget line",
+]
+
+
+def _random_date(rng):
+    return date(2024, 1, 1) + timedelta(days=rng.randint(0, 730))
+
+
+def make_rule_texts(count, seed=0):
+    rng = random.Random(seed + 2)
+    return [rng.choice(RULE_TEMPLATES)(rng) for _ in range(count)]
+
+
+def summarize(timings, **extra):
+    ordered = sorted(timings)
+    total = sum(ordered)
+    if not ordered:
+        return {"count": 0, "seconds": 0.0, **extra}
+    return {
+        "count": len(ordered),
+        "seconds": round(total, 4),
+        "mean_ms": round(total / len(ordered) * 1000, 4),
+        "p50_ms": round(ordered[len(ordered) // 2] * 1000, 4),
+        "p95_ms": round(ordered[min(int(len(ordered) * 0.95), len(ordered) - 1)] * 1000, 4),
+        "max_ms": round(ordered[-1] * 1000, 4),
+        **extra,
+    }
+
+
+def timed(items, func):
+    timings = []
+    results = []
+    for item in items:
+        started = time.perf_counter()
+        results.append(func(item))
+        timings.append(time.perf_counter() - started)
+    return timings, results
+
+
+def _tesseract_available():
+    try:
+        import pytesseract
+        pytesseract.get_tesseract_version()
+        return True
+    except Exception:
+        return False
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(args, server):
+    scenarios = {}
+    selected = set(args.scenarios)
+    invoices = [make_invoice(args.seed + index, pages=args.pages, noise=args.noise) for index in range(args.documents)]
+
+    if "extract_text_pdf" in selected:
+        files = [write_pdf(page_lines) for page_lines, _ in invoices[:args.text_documents]]
+        pdf = SimpleNamespace(type="application/pdf")
+        timings, _ = timed(files, lambda file_bytes: extract_text_from_document(pdf, file_bytes))
+        scenarios["extract_text_pdf"] = summarize(timings, pages=args.pages)
+
+    if "extract_text_png" in selected:
+        if _tesseract_available():
+            files = [write_png(page_lines, noise=args.noise, seed=args.seed + index)
+                     for index, (page_lines, _) in enumerate(invoices[:args.image_documents])]
+            png = SimpleNamespace(type="image/png")
+            timings, _ = timed(files, lambda file_bytes: extract_text_from_document(png, file_bytes))
+            scenarios["extract_text_png"] = summarize(timings, pages=args.pages)
+        else:
+            scenarios["extract_text_png"] = {"skipped": "tesseract not found"}
+
+    rules = []
+    if selected & {"parse_rule", "validate_rule", "validate_batch", "rule_index"}:
+        calls_before = server.calls
+        timings, rules = timed(make_rule_texts(args.rules, args.seed), parse_rule)
+        if "parse_rule" in selected:
+            scenarios["parse_rule"] = summarize(timings, llm_calls=server.calls - calls_before)
+        rules = [rule for rule in rules if rule]
+
+    data = [{key: values[key] for key in ("money", "date", "time", "text")} for _, values in invoices]
+    if selected & {"extract_data", "validate_rule", "validate_batch", "rule_index"}:
+        calls_before = server.calls
+        texts = [invoice_text(page_lines) for page_lines, _ in invoices]
+        timings, extracted = timed(texts, extract_data_from_text)
+        if "extract_data" in selected:
+            correct = sum(extracted[i].get(category) == data[i][category]
+                          for i in range(len(data)) for category in ("money", "date", "time"))
+            scenarios["extract_data"] = summarize(timings, llm_calls=server.calls - calls_before,
+                                                  field_accuracy=round(correct / (len(data) * 3), 4))
+        # Text is not pre-extracted, validate against the known value
+        data = [{**fields, "text": truth["text"]} for fields, truth in zip(extracted, data)]
+
+    if "validate_rule" in selected:
+        documents = data[:args.validate_documents]
+        timings, _ = timed(documents, lambda document: [validate_rule(rule, document) for rule in rules])
+        calls = max(len(documents) * len(rules), 1)
+        scenarios["validate_rule"] = summarize(timings, rules=len(rules), per_call_us=round(sum(timings) / calls * 1e6, 3))
+
+    if "validate_batch" in selected:
+        timings, _ = timed([data], lambda documents: validate_batch(documents, rules))
+        scenarios["validate_batch"] = summarize(timings, documents=len(data), rules=len(rules))
+
+    if "rule_index" in selected:
+        rule_index = RuleIndex(rules)
+        timings, _ = timed(data, rule_index.evaluate)
+        scenarios["rule_index"] = summarize(timings, rules=len(rules))
+    return scenarios
+
+
+def compare(current, baseline):
+    lines = []
+    for name, result in current["scenarios"].items():
+        previous = baseline.get("scenarios", {}).get(name, {})
+        if "seconds" in result and previous.get("seconds"):
+            ratio = result["seconds"] / previous["seconds"]
+            lines.append(f"{name:<18} {previous['seconds']:>10.3f}s -> {result['seconds']:>10.3f}s  x{ratio:.2f}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the benchmark suite against a stub LLM and write JSON results")
+    parser.add_argument("--documents", type=int, default=10000)
+    parser.add_argument("--rules", type=int, default=1000)
+    parser.add_argument("--pages", type=int, default=3)
+    parser.add_argument("--noise", type=float, default=0.3, help="0 for clean documents, 1 for the messiest")
+    parser.add_argument("--text-documents", type=int, default=100, help="PDFs run through text extraction")
+    parser.add_argument("--image-documents", type=int, default=20, help="PNGs run through OCR")
+    parser.add_argument("--validate-documents", type=int, default=None,
+                        help="documents checked with validate_rule, default all")
+    parser.add_argument("--latency", type=float, default=0.0, help="seconds per stub LLM call")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--scenarios", nargs="+", choices=SCENARIOS, default=SCENARIOS)
+    parser.add_argument("--output", default="benchmark-results.json")
+    parser.add_argument("--compare", help="earlier results file to compare against")
+    args = parser.parse_args()
+    if args.validate_documents is None:
+        args.validate_documents = args.documents
+
+    # Fresh in-memory cache so every run does the same work, layout reuse has its own benchmark
+    configure_cache(path=":memory:")
+    configure_layout_index(size=0)
+    with StubOllamaServer(latency=args.latency) as server:
+        configure_client(host=server.host)
+        started = time.perf_counter()
+        scenarios = run(args, server)
+
+    results = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+            "commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "seconds": round(time.perf_counter() - started, 3),
+        },
+        "config": vars(args),
+        "scenarios": scenarios,
+    }
+    with open(args.output, "w", encoding="utf-8") as output:
+        json.dump(results, output, indent=2)
+    print(json.dumps(scenarios, indent=2))
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as baseline:
+            print(compare(results, json.load(baseline)), file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+CACHE_PATH = os.environ.get("DOC_CACHE_PATH", os.path.join(".cache", "documents.sqlite3"))
+CACHE_MAX_BYTES = int(os.environ.get("DOC_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+
+def content_digest(data):
+    if isinstance(data, str):
+        data = data.encode("utf-8")
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_digest(path, chunk_bytes=1024 * 1024):
+    # Same digest as content_digest of the file's bytes, without reading it all at once
+    digest = hashlib.sha256()
+    with open(path, "rb") as source:
+        for chunk in iter(lambda: source.read(chunk_bytes), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class DocumentCache:
+    def __init__(self, path=CACHE_PATH, max_bytes=CACHE_MAX_BYTES):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.max_bytes = max_bytes
+        self.hits = {}
+        self.misses = {}
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS entries (
+                namespace TEXT NOT NULL,
+                key TEXT NOT NULL,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                last_access REAL NOT NULL,
+                PRIMARY KEY (namespace, key)
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_entries_access ON entries(last_access)")
+        self._total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+
+    def get(self, namespace, key):
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT value FROM entries WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+            if row is None:
+                self.misses[namespace] = self.misses.get(namespace, 0) + 1
+                return None
+            self._conn.execute(
+                "UPDATE entries SET last_access = ? WHERE namespace = ? AND key = ?",
+                (time.time(), namespace, key)
+            )
+            self.hits[namespace] = self.hits.get(namespace, 0) + 1
+            return row[0]
+
+    def put(self, namespace, key, value):
+        size = len(value.encode("utf-8"))
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            old = self._conn.execute(
+                "SELECT size FROM entries WHERE namespace = ? AND key = ?", (namespace, key)
+            ).fetchone()
+            self._conn.execute(
+                "INSERT OR REPLACE INTO entries (namespace, key, value, size, last_access) VALUES (?, ?, ?, ?, ?)",
+                (namespace, key, value, size, time.time())
+            )
+            self._total += size - (old[0] if old else 0)
+            if self._total > self.max_bytes:
+                self._evict()
+
+    def get_json(self, namespace, key):
+        value = self.get(namespace, key)
+        return json.loads(value) if value is not None else None
+
+    def put_json(self, namespace, key, value):
+        self.put(namespace, key, json.dumps(value))
+
+    def _evict(self):
+        # Drop least recently used entries until we are back under the budget
+        rows = self._conn.execute(
+            "SELECT namespace, key, size FROM entries ORDER BY last_access ASC"
+        )
+        doomed = []
+        for namespace, key, size in rows:
+            if self._total <= self.max_bytes:
+                break
+            doomed.append((namespace, key))
+            self._total -= size
+        self._conn.executemany("DELETE FROM entries WHERE namespace = ? AND key = ?", doomed)
+
+    def stats(self):
+        with self._lock:
+            entries = self._conn.execute("SELECT COUNT(*) FROM entries").fetchone()[0]
+            return {
+                "entries": entries,
+                "bytes": self._total,
+                "max_bytes": self.max_bytes,
+                "hits": dict(self.hits),
+                "misses": dict(self.misses),
+            }
+
+    def clear(self):
+        with self._lock:
+            self._conn.execute("DELETE FROM entries")
+            self._total = 0
+
+
+_cache = None
+_cache_pid = None
+_cache_options = {}
+_cache_lock = threading.Lock()
+
+
+def get_cache():
+    global _cache, _cache_pid
+    with _cache_lock:
+        # SQLite connections must not cross a fork, worker processes open their own
+        if _cache is None or _cache_pid != os.getpid():
+            _cache = DocumentCache(**_cache_options)
+            _cache_pid = os.getpid()
+        return _cache
+
+
+def configure_cache(**options):
+    global _cache, _cache_pid, _cache_options
+    with _cache_lock:
+        _cache_options = options
+        _cache = DocumentCache(**options)
+        _cache_pid = os.getpid()
+        return _cache
@@ -0,0 +1,73 @@
+from heuristics import LABEL_PATTERNS, FIELD_CATEGORY, MONEY_IN_TEXT, DATE_IN_TEXT, TIME_IN_TEXT
+
+WINDOW_CHARS = 600
+PROMPT_TOKEN_BUDGET = 800
+LABEL_WEIGHT = 3.0
+VALUE_WEIGHT = 1.0
+CHUNK_SEPARATOR = "\n[...]\n"
+
+VALUE_PATTERNS = {
+    "money": MONEY_IN_TEXT,
+    "date": DATE_IN_TEXT,
+    "time": TIME_IN_TEXT,
+}
+
+
+def estimate_tokens(text):
+    # Roughly four characters per token for English text with numbers
+    return len(text) // 4 + 1
+
+
+def split_windows(text, window_chars=WINDOW_CHARS):
+    windows = []
+    current = []
+    size = 0
+    for line in text.splitlines():
+        if current and size + len(line) > window_chars:
+            windows.append("\n".join(current))
+            current, size = [], 0
+        # Very long lines (no line breaks from OCR) are cut into window sized pieces
+        while len(line) > window_chars:
+            windows.append(line[:window_chars])
+            line = line[window_chars:]
+        current.append(line)
+        size += len(line) + 1
+    if current:
+        windows.append("\n".join(current))
+    return [window for window in windows if window.strip()]
+
+
+def score_window(window, categories=("money", "date", "time", "text")):
+    score = 0.0
+    for field, pattern in LABEL_PATTERNS:
+        if FIELD_CATEGORY[field] in categories:
+            score += LABEL_WEIGHT * len(pattern.findall(window))
+    for category, pattern in VALUE_PATTERNS.items():
+        if category in categories:
+            score += VALUE_WEIGHT * len(pattern.findall(window))
+    # Density, so a window padded with boilerplate ranks below a compact totals block
+    return score / (1 + len(window) / WINDOW_CHARS)
+
+
+def select_relevant_text(text, token_budget=PROMPT_TOKEN_BUDGET, categories=("money", "date", "time", "text"),
+                         window_chars=WINDOW_CHARS):
+    if estimate_tokens(text) <= token_budget:
+        return text
+    windows = split_windows(text, window_chars)
+    ranked = sorted(
+        ((score_window(window, categories), index) for index, window in enumerate(windows)),
+        key=lambda item: (-item[0], item[1])
+    )
+
+    chosen = []
+    used = 0
+    for score, index in ranked:
+        if score <= 0 and chosen:
+            break
+        cost = estimate_tokens(windows[index] + CHUNK_SEPARATOR)
+        if used + cost > token_budget:
+            continue
+        chosen.append(index)
+        used += cost
+    # Keep the original order so the model reads the document top to bottom
+    return CHUNK_SEPARATOR.join(windows[index] for index in sorted(chosen))
@@ -0,0 +1,227 @@
+import argparse
+import json
+import mimetypes
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from types import SimpleNamespace
+from llm import (
+    DEFAULT_MODEL,
+    cached_extract_text_from_document,
+    cached_extract_data_from_text,
+    validate_rule,
+)
+from structured import cached_extract_all_fields
+from heuristics import extraction_stats
+from rule_import import read_rules, import_rules, import_rule_set, is_rule_set
+from metrics import registry, observe, span, profile_document
+from cache import file_digest
+from result_store import ResultStore
+
+SUPPORTED_EXTENSIONS = {".pdf", ".png", ".jpg", ".jpeg"}
+# Documents per result store transaction
+RESULT_BATCH = 200
+
+
+def iter_directory(root):
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        for filename in sorted(filenames):
+            if os.path.splitext(filename)[1].lower() in SUPPORTED_EXTENSIONS:
+                yield os.path.join(dirpath, filename)
+
+
+def iter_manifest(manifest_path):
+    base = os.path.dirname(os.path.abspath(manifest_path))
+    with open(manifest_path, encoding="utf-8") as manifest:
+        for line in manifest:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            path = json.loads(line)["path"] if line.startswith("{") else line
+            yield path if os.path.isabs(path) else os.path.join(base, path)
+
+
+def load_rules(rules_path):
+    with open(rules_path, encoding="utf-8-sig") as rules_file:
+        content = rules_file.read()
+    if is_rule_set(content, rules_path):
+        results = import_rule_set(content)
+    else:
+        # Rules that need the model are parsed in batches instead of one request each
+        results = import_rules(read_rules(content, rules_path))
+    errors = [result["error"] for result in results if result["error"]]
+    if errors:
+        raise Exception(f"{len(errors)} rules could not be loaded: " + "; ".join(errors[:5]))
+    return [result["rule"] for result in results]
+
+
+def load_completed(output_path):
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+    with open(output_path, encoding="utf-8") as output:
+        for line in output:
+            try:
+                record = json.loads(line)
+            except ValueError:
+                # Partial last line from an interrupted run
+                continue
+            if not record.get("error"):
+                completed.add(record["path"])
+    return completed
+
+
+def extract_text(path, stop_labels=None):
+    # Runs in a worker process, pdfplumber and tesseract are CPU bound.
+    # Metrics recorded here stay in the worker, so the timing goes back with the result
+    started = time.perf_counter()
+    try:
+        mime_type = mimetypes.guess_type(path)[0] or "application/octet-stream"
+        with profile_document(path):
+            # Hashed here rather than when the result is written, so the file is read once off the main thread
+            digest = file_digest(path)
+            # The path is memory mapped, large scans are not read into the worker at once
+            text = cached_extract_text_from_document(SimpleNamespace(type=mime_type), path, digest=digest,
+                                                     stop_labels=stop_labels)
+        return path, text, digest, None, time.perf_counter() - started
+    except Exception as e:
+        return path, None, None, str(e), time.perf_counter() - started
+
+
+def extract_and_validate(path, text, rules, model, all_fields=False, digest=None):
+    try:
+        with profile_document(path):
+            if all_fields:
+                data = cached_extract_all_fields(text, model=model)
+            else:
+                data = cached_extract_data_from_text(text, model=model)
+            with span("validate_rules"):
+                results = [validate_rule(rule, data) for rule in rules]
+        return {"path": path, "digest": digest, "data": data, "results": results}
+    except Exception as e:
+        return {"path": path, "error": str(e)}
+
+
+def run_batch(paths, rules, output_path, workers=None, llm_concurrency=2, model=DEFAULT_MODEL, resume=True,
+              all_fields=False, result_store=None, stop_labels=None):
+    completed = load_completed(output_path) if resume else set()
+    if not resume and os.path.exists(output_path):
+        os.remove(output_path)
+    if os.path.exists(output_path) and os.path.getsize(output_path):
+        with open(output_path, "rb") as output:
+            output.seek(-1, os.SEEK_END)
+            needs_newline = output.read(1) != b"\n"
+    else:
+        needs_newline = False
+
+    stats = {"processed": 0, "failed": 0, "skipped": 0}
+    started = time.perf_counter()
+    max_in_flight = llm_concurrency * 2
+    stored = []
+
+    with open(output_path, "a", encoding="utf-8") as output, \
+            ProcessPoolExecutor(max_workers=workers) as text_pool, \
+            ThreadPoolExecutor(max_workers=llm_concurrency) as llm_pool:
+        if needs_newline:
+            output.write("\n")
+
+        def write(record):
+            output.write(json.dumps(record, default=str) + "\n")
+            output.flush()
+            stats["failed" if record.get("error") else "processed"] += 1
+            if result_store is not None and not record.get("error"):
+                stored.append({"results": record["results"], "data": record["data"], "name": record["path"],
+                               "digest": record["digest"], "mime_type": mimetypes.guess_type(record["path"])[0]})
+                if len(stored) >= RESULT_BATCH:
+                    result_store.record_runs(stored)
+                    stored.clear()
+
+        def drain(pending, limit):
+            while len(pending) > limit:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.discard(future)
+                    write(future.result())
+
+        def todo():
+            for path in paths:
+                if path in completed:
+                    stats["skipped"] += 1
+                    continue
+                yield path
+
+        # Keep a bounded number of documents in flight so memory stays flat
+        text_pending = set()
+        llm_pending = set()
+        queued = todo()
+        exhausted = False
+        while not exhausted or text_pending:
+            while not exhausted and len(text_pending) < (workers or os.cpu_count() or 1) * 2:
+                path = next(queued, None)
+                if path is None:
+                    exhausted = True
+                    break
+                text_pending.add(text_pool.submit(extract_text, path, stop_labels))
+            if not text_pending:
+                break
+            done, text_pending = wait(text_pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                path, text, digest, error, seconds = future.result()
+                observe("stage_seconds", seconds, stage="extract_text")
+                if error:
+                    write({"path": path, "error": error})
+                    continue
+                llm_pending.add(llm_pool.submit(extract_and_validate, path, text, rules, model, all_fields, digest))
+                drain(llm_pending, max_in_flight)
+        drain(llm_pending, 0)
+        if stored:
+            result_store.record_runs(stored)
+
+    elapsed = time.perf_counter() - started
+    heuristic_stats = extraction_stats()
+    stats["llm_calls"] = heuristic_stats["llm_calls"]
+    stats["llm_calls_avoided"] = heuristic_stats["llm_calls_avoided"]
+    stats["seconds"] = round(elapsed, 3)
+    stats["documents_per_second"] = round(stats["processed"] / elapsed, 3) if elapsed else 0.0
+    return stats
+
+
+def main(argv=None):
+    arg_parser = argparse.ArgumentParser(description="Validate a batch of documents without the Streamlit UI")
+    source = arg_parser.add_mutually_exclusive_group(required=True)
+    source.add_argument("directory", nargs="?", help="directory to scan for PDFs and images")
+    source.add_argument("--manifest", help="file listing document paths, one per line or JSONL with a 'path' key")
+    arg_parser.add_argument("--rules", help="rules file: CSV, YAML, JSON (rule dicts or an exported rule set), "
+                                            "or one natural-language rule per line")
+    arg_parser.add_argument("--output", default="results.jsonl", help="JSONL file results are appended to")
+    arg_parser.add_argument("--workers", type=int, default=None, help="text extraction processes")
+    arg_parser.add_argument("--llm-concurrency", type=int, default=2, help="concurrent LLM requests")
+    arg_parser.add_argument("--model", default=DEFAULT_MODEL, help="a model name, or 'auto' to route between OLLAMA_MODEL_TIERS")
+    arg_parser.add_argument("--no-resume", action="store_true", help="start over instead of skipping finished documents")
+    arg_parser.add_argument("--all-fields", action="store_true", help="extract every invoice field in one LLM pass")
+    arg_parser.add_argument("--metrics", help="write stage timings and counters here, JSON for .json, else Prometheus text")
+    arg_parser.add_argument("--results-db", help="also record results in this SQLite result store, e.g. the app's")
+    arg_parser.add_argument("--stop-at-labels", nargs="+", metavar="LABEL",
+                            help="stop reading a PDF once every label has appeared, e.g. 'Total Amount' 'Invoice Date'")
+    args = arg_parser.parse_args(argv)
+
+    paths = iter_manifest(args.manifest) if args.manifest else iter_directory(args.directory)
+    rules = load_rules(args.rules) if args.rules else []
+    stats = run_batch(paths, rules, args.output, workers=args.workers,
+                      llm_concurrency=args.llm_concurrency, model=args.model, resume=not args.no_resume,
+                      all_fields=args.all_fields, result_store=ResultStore(args.results_db) if args.results_db else None,
+                      stop_labels=args.stop_at_labels)
+    print(f"Processed {stats['processed']} documents ({stats['failed']} failed, {stats['skipped']} skipped) "
+          f"in {stats['seconds']}s: {stats['documents_per_second']} documents/s", file=sys.stderr)
+    print(f"LLM calls avoided: {stats['llm_calls_avoided']} of {stats['llm_calls_avoided'] + stats['llm_calls']}",
+          file=sys.stderr)
+    if args.metrics:
+        with open(args.metrics, "w", encoding="utf-8") as metrics_file:
+            metrics_file.write(registry.export_json() if args.metrics.endswith(".json") else registry.export_prometheus())
+    return 1 if stats["failed"] else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,21 @@
+FIELD_CATEGORIES = {
+    "money": ["total_amount", "payment_amount", "subtotal", "tax_amount"],
+    "date": ["invoice_date", "due_date", "payment_date"],
+    "time": ["issue_time", "processing_time"],
+    "text": ["invoice_number", "customer", "vendor"]
+}
+
+FIELD_DISPLAY_NAMES = {
+    "total_amount": "Total Amount",
+    "payment_amount": "Payment Amount",
+    "subtotal": "Subtotal",
+    "tax_amount": "Tax Amount",
+    "invoice_date": "Invoice Date",
+    "due_date": "Due Date",
+    "payment_date": "Payment Date",
+    "issue_time": "Issue Time",
+    "processing_time": "Processing Time",
+    "invoice_number": "Invoice Number",
+    "customer": "Customer",
+    "vendor": "Vendor"
+}
@@ -0,0 +1,209 @@
+import re
+import threading
+from fields import FIELD_CATEGORIES, FIELD_DISPLAY_NAMES
+from rule_parser import parse_date_value, parse_time_value
+
+CONFIDENCE_THRESHOLD = 0.75
+LABELED_CONFIDENCE = 0.95
+UNIQUE_CONFIDENCE = 0.8
+# Times are distinctive enough that no HH:MM anywhere means the document has none,
+# asking the model would only invite a made-up value
+ABSENT_WITHOUT_CANDIDATES = ("time",)
+
+# Common wordings on real invoices, on top of FIELD_DISPLAY_NAMES
+EXTRA_LABELS = {
+    "total_amount": ["Grand Total", "Total Due", "Amount Due", "Balance Due", "Total"],
+    "payment_amount": ["Amount Paid", "Payment"],
+    "subtotal": ["Sub-total", "Sub Total"],
+    "tax_amount": ["Sales Tax", "VAT", "Tax"],
+    "invoice_date": ["Date of Issue", "Issue Date", "Date"],
+    "due_date": ["Payment Due"],
+    "payment_date": ["Date Paid", "Paid On"],
+    "issue_time": ["Time of Issue", "Time"],
+    "invoice_number": ["Invoice No.", "Invoice No", "Invoice #"],
+    "customer": ["Billed To", "Bill To", "Client"],
+    "vendor": ["Supplier", "Seller"],
+}
+
+FIELD_CATEGORY = {field: category for category, fields in FIELD_CATEGORIES.items() for field in fields}
+
+_CURRENCY = r"(?:[$€£]|usd|eur|gbp|egp)"
+MONEY_AFTER_LABEL = re.compile(rf"{_CURRENCY}?\s*(-?\d[\d,]*(?:\.\d+)?)(?![\d/:-])", re.IGNORECASE)
+MONEY_IN_TEXT = re.compile(
+    rf"{_CURRENCY}\s*(-?\d{{1,3}}(?:,\d{{3}})*(?:\.\d{{1,2}})?|-?\d+(?:\.\d{{1,2}})?)(?![\d.,]*\d)"
+    rf"|(?<![\d.,/-])(\d{{1,3}}(?:,\d{{3}})*\.\d{{2}}|\d+\.\d{{2}})(?![\d.])(?:\s*{_CURRENCY})?",
+    re.IGNORECASE
+)
+_MONTH = r"(?:jan|feb|mar|apr|may|jun|jul|aug|sep|sept|oct|nov|dec)[a-z]*\.?"
+DATE_IN_TEXT = re.compile(
+    r"(?P<iso>\b\d{4}[-/.]\d{1,2}[-/.]\d{1,2}\b)"
+    rf"|(?P<named>\b(?:\d{{1,2}}(?:st|nd|rd|th)?\s+{_MONTH},?\s+\d{{4}}|{_MONTH}\s+\d{{1,2}}(?:st|nd|rd|th)?,?\s+\d{{4}})\b)"
+    r"|(?P<numeric>\b(?P<first>\d{1,2})[/.-](?P<second>\d{1,2})[/.-](?P<year>\d{4})\b)",
+    re.IGNORECASE
+)
+TIME_IN_TEXT = re.compile(r"\b(\d{1,2}:\d{2}(?::\d{2})?(?:\s*[ap]m)?)(?![\d:])", re.IGNORECASE)
+
+
+def _label_patterns():
+    labels = []
+    for field, display_name in FIELD_DISPLAY_NAMES.items():
+        for label in [display_name] + EXTRA_LABELS.get(field, []):
+            labels.append((label, field))
+    # Longest first so "Due Date" claims its text before the bare "Date" alias can
+    labels.sort(key=lambda item: -len(item[0]))
+    return [
+        (field, re.compile(r"(?<!\w)" + r"\s+".join(map(re.escape, label.split())) + r"(?!\w)\s*[:#\-]?\s*",
+                           re.IGNORECASE))
+        for label, field in labels
+    ]
+
+
+LABEL_PATTERNS = _label_patterns()
+
+
+def _parse_date_match(match):
+    if match.group("numeric"):
+        first, second, year = (int(match.group(name)) for name in ("first", "second", "year"))
+        if first > 12 and second <= 12:
+            day, month, ambiguous = first, second, False
+        elif second > 12 and first <= 12:
+            day, month, ambiguous = second, first, False
+        else:
+            # 03/04/2025 could be March or April, read it month first but don't trust it
+            day, month, ambiguous = second, first, first != second
+        return parse_date_value(f"{year}-{month}-{day}"), ambiguous
+    return parse_date_value(match.group(0).lower()), False
+
+
+def _money_value(raw):
+    number = raw.replace(",", "")
+    try:
+        float(number)
+    except ValueError:
+        return None
+    return number
+
+
+def _value_at(category, text, position):
+    end = text.find("\n", position)
+    line = text[position:] if end == -1 else text[position:end]
+    if category == "money":
+        match = MONEY_AFTER_LABEL.match(line)
+        return (_money_value(match.group(1)), False) if match else (None, False)
+    if category == "date":
+        match = DATE_IN_TEXT.match(line)
+        return _parse_date_match(match) if match else (None, False)
+    if category == "time":
+        match = TIME_IN_TEXT.match(line)
+        return (parse_time_value(match.group(1).lower()), False) if match else (None, False)
+    value = re.split(r"\s{2,}|\t", line.strip(), maxsplit=1)[0]
+    return (value or None), False
+
+
+def values_in_line(category, line):
+    # Every value of the category in reading order, None where one doesn't parse so positions stay stable
+    if category == "money":
+        return [_money_value(match.group(1) or match.group(2)) for match in MONEY_IN_TEXT.finditer(line)]
+    if category == "date":
+        return [_parse_date_match(match)[0] for match in DATE_IN_TEXT.finditer(line)]
+    if category == "time":
+        return [parse_time_value(match.group(1).lower()) for match in TIME_IN_TEXT.finditer(line)]
+    return []
+
+
+def find_candidates(text):
+    candidates = []
+    claimed = []
+    for field, pattern in LABEL_PATTERNS:
+        for match in pattern.finditer(text):
+            if any(start <= match.start() < end for start, end in claimed):
+                continue
+            claimed.append((match.start(), match.end()))
+            value, ambiguous = _value_at(FIELD_CATEGORY[field], text, match.end())
+            if value is None:
+                continue
+            candidates.append({
+                "field": field,
+                "category": FIELD_CATEGORY[field],
+                "value": value,
+                "confidence": LABELED_CONFIDENCE / (2 if ambiguous else 1),
+                "start": match.end(),
+            })
+
+    unlabeled = []
+    for match in MONEY_IN_TEXT.finditer(text):
+        value = _money_value(match.group(1) or match.group(2))
+        if value is not None:
+            unlabeled.append(("money", value, False, match.start()))
+    for match in DATE_IN_TEXT.finditer(text):
+        value, ambiguous = _parse_date_match(match)
+        if value is not None:
+            unlabeled.append(("date", value, ambiguous, match.start()))
+    for match in TIME_IN_TEXT.finditer(text):
+        value = parse_time_value(match.group(1).lower())
+        if value is not None:
+            unlabeled.append(("time", value, False, match.start()))
+
+    for category in ("money", "date", "time"):
+        found = [item for item in unlabeled if item[0] == category]
+        distinct = {value for _, value, _, _ in found}
+        for _, value, ambiguous, start in found:
+            candidates.append({
+                "field": None,
+                "category": category,
+                "value": value,
+                "confidence": UNIQUE_CONFIDENCE / len(distinct) / (2 if ambiguous else 1),
+                "start": start,
+            })
+    return candidates
+
+
+def best_candidate(candidates, category):
+    labeled = [c for c in candidates if c["category"] == category and c["field"]]
+    if labeled:
+        # Prefer fields in FIELD_CATEGORIES order, e.g. the total over the tax amount
+        priority = FIELD_CATEGORIES[category]
+        field = min(labeled, key=lambda c: (priority.index(c["field"]), c["start"]))["field"]
+        same_field = [c for c in labeled if c["field"] == field]
+        best = min(same_field, key=lambda c: c["start"])
+        if len({c["value"] for c in same_field}) > 1:
+            # The same label with different values, let the model decide
+            return dict(best, confidence=best["confidence"] / 2)
+        return best
+    unlabeled = [c for c in candidates if c["category"] == category]
+    if not unlabeled:
+        return None
+    return max(unlabeled, key=lambda c: (c["confidence"], -c["start"]))
+
+
+def pre_extract(text, categories=("money", "date", "time")):
+    candidates = find_candidates(text)
+    data = {}
+    unresolved = []
+    for category in categories:
+        best = best_candidate(candidates, category)
+        if best and best["confidence"] >= CONFIDENCE_THRESHOLD:
+            data[category] = best["value"]
+        elif best is None and category in ABSENT_WITHOUT_CANDIDATES:
+            continue
+        else:
+            unresolved.append(category)
+    return data, unresolved
+
+
+_stats = {"documents": 0, "llm_calls": 0, "llm_calls_avoided": 0, "fields_from_heuristics": 0,
+          "fields_from_layouts": 0}
+_stats_lock = threading.Lock()
+
+
+def record_extraction(used_llm, heuristic_fields, layout_fields=0):
+    with _stats_lock:
+        _stats["documents"] += 1
+        _stats["llm_calls" if used_llm else "llm_calls_avoided"] += 1
+        _stats["fields_from_heuristics"] += heuristic_fields
+        _stats["fields_from_layouts"] += layout_fields
+
+
+def extraction_stats():
+    with _stats_lock:
+        return dict(_stats)
@@ -0,0 +1,145 @@
+from collections import Counter, OrderedDict
+from rule_index import RuleIndex
+from llm import validate_rule
+from metrics import increment, traced
+
+RESULT_CACHE_SIZE = 50000
+CATEGORY_CACHE_SIZE = 64
+# Rules edited since the index was built are checked one by one, past this share the index is rebuilt
+REBUILD_RATIO = 0.05
+REBUILD_MIN = 64
+
+
+def rule_version(rule):
+    # Cheaper than hashing the JSON, and any edit to the rule changes it
+    if not isinstance(rule, dict):
+        return (None, None, repr(rule))
+    return (rule.get("category"), rule.get("condition"), repr(rule.get("value")))
+
+
+def _value_key(value):
+    return repr(value)
+
+
+def _cache_put(cache, key, value, size):
+    cache[key] = value
+    if len(cache) > size:
+        cache.popitem(last=False)
+
+
+class IncrementalValidator:
+    def __init__(self, result_cache_size=RESULT_CACHE_SIZE, category_cache_size=CATEGORY_CACHE_SIZE):
+        self.result_cache_size = result_cache_size
+        self.category_cache_size = category_cache_size
+        self.results = []
+        self.totals = Counter()
+        self._versions = []
+        # category -> positions of the rules that read it
+        self._dependents = {}
+        self._values = {}
+        self._has_data = None
+        self._index = None
+        self._indexed = []
+        self._generation = 0
+        # (rule version, has data, field value) -> result, and per category for whole index lookups
+        self._results = OrderedDict()
+        self._categories = OrderedDict()
+
+    @traced("revalidate")
+    def update(self, rules, data):
+        rules = list(rules)
+        data = data or {}
+        versions = [rule_version(rule) for rule in rules]
+        edited = {position for position, version in enumerate(versions)
+                  if position >= len(self._versions) or self._versions[position] != version}
+        if edited or len(versions) != len(self._versions):
+            self._dependents = {}
+            for position, version in enumerate(versions):
+                self._dependents.setdefault(version[0], set()).add(position)
+        self._refresh_index(rules, versions)
+
+        has_data = bool(data)
+        values = {category: _value_key(data.get(category)) for category in self._dependents
+                  if isinstance(category, str)}
+        changed_categories = {category for category in self._dependents
+                              if has_data != self._has_data or values.get(category) != self._values.get(category)}
+        affected = set(edited)
+        for category in changed_categories:
+            affected.update(self._dependents[category])
+
+        # Rules removed from the end drop out of the totals
+        for result in self.results[len(rules):]:
+            self.totals[result["status"]] -= 1
+        del self.results[len(rules):]
+
+        stats = {"evaluated": 0, "cached": 0, "indexed": 0}
+        if self._index is not None and affected and len(affected) == len(rules) and self._indexed == versions:
+            # Everything changed, e.g. a new document, one full index pass is cheapest
+            self.results = self._index.evaluate(data)
+            self.totals = Counter(result["status"] for result in self.results)
+            stats["indexed"] = len(rules)
+            affected = ()
+        fresh = {}
+        for category in changed_categories if affected else ():
+            fresh.update(self._evaluate_category(category, data, values.get(category), versions, affected, stats))
+        for position in sorted(affected):
+            result = fresh.get(position)
+            if result is None:
+                result = self._evaluate_rule(rules[position], versions[position], data, has_data, stats)
+            if position < len(self.results):
+                self.totals[self.results[position]["status"]] -= 1
+                self.results[position] = result
+            else:
+                self.results.append(result)
+            self.totals[result["status"]] += 1
+
+        self._versions = versions
+        self._values = values
+        self._has_data = has_data
+        for source in ("evaluated", "cached", "indexed"):
+            if stats[source]:
+                increment("revalidated_rules_total", stats[source], source=source)
+        return {"affected": sum(stats.values()), **stats}
+
+    def _refresh_index(self, rules, versions):
+        stale = sum(1 for position, version in enumerate(versions)
+                    if position >= len(self._indexed) or self._indexed[position] != version)
+        if stale > max(REBUILD_MIN, len(rules) * REBUILD_RATIO):
+            self._index = RuleIndex(rules)
+            self._indexed = versions
+            self._generation += 1
+            self._categories.clear()
+
+    def _evaluate_category(self, category, data, value_key, versions, affected, stats):
+        # One index lookup answers every rule of the category not edited since the index was built
+        if self._index is None or not isinstance(category, str):
+            return {}
+        key = (self._generation, category, bool(data), value_key)
+        results = self._categories.get(key)
+        if results is None:
+            results = self._index.evaluate_category(category, data)
+            _cache_put(self._categories, key, results, self.category_cache_size)
+        else:
+            self._categories.move_to_end(key)
+        fresh = {position: result for position, result in results.items()
+                 if position in affected and position < len(versions) and self._indexed[position] == versions[position]}
+        stats["indexed"] += len(fresh)
+        return fresh
+
+    def _evaluate_rule(self, rule, version, data, has_data, stats):
+        category = version[0]
+        key = (version, has_data, _value_key(data.get(category)) if isinstance(category, str) else None)
+        result = self._results.get(key)
+        if result is None:
+            result = validate_rule(rule, data)
+            _cache_put(self._results, key, result, self.result_cache_size)
+            stats["evaluated"] += 1
+        else:
+            self._results.move_to_end(key)
+            stats["cached"] += 1
+        return result
+
+    def summary(self):
+        total = len(self.results)
+        return {"total": total, "PASS": self.totals["PASS"], "FAIL": self.totals["FAIL"],
+                "Error": self.totals["Error"]}
@@ -0,0 +1,203 @@
+import os
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+JOB_WORKERS = int(os.environ.get("JOB_WORKERS", 4))
+JOB_RETENTION_SECONDS = float(os.environ.get("JOB_RETENTION_SECONDS", 600))
+
+QUEUED, RUNNING, DONE, FAILED, CANCELLED = "queued", "running", "done", "failed", "cancelled"
+FINISHED = (DONE, FAILED, CANCELLED)
+
+
+class JobCancelled(Exception):
+    pass
+
+
+class Job:
+    def __init__(self, key, func, args, kwargs):
+        self.id = uuid.uuid4().hex[:12]
+        self.key = key
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.status = QUEUED
+        self.progress = 0.0
+        self.message = ""
+        self.partial = {}
+        self.result = None
+        self.error = None
+        self.owners = set()
+        self.created = time.time()
+        self.started = None
+        self.finished = None
+        self.cancel_event = threading.Event()
+        self.future = None
+        self.timer = None
+
+    def snapshot(self):
+        return {
+            "id": self.id,
+            "status": self.status,
+            "progress": self.progress,
+            "message": self.message,
+            "partial": dict(self.partial),
+            "result": self.result,
+            "error": self.error,
+            "seconds": round((self.finished or time.time()) - (self.started or self.created), 3),
+        }
+
+
+_current = threading.local()
+
+
+def report_progress(progress=None, message=None, partial=None):
+    # Called from inside a job, doubles as the checkpoint where stale jobs stop
+    job = getattr(_current, "job", None)
+    if job is None:
+        return
+    if job.cancel_event.is_set():
+        raise JobCancelled()
+    if progress is not None:
+        job.progress = min(max(float(progress), 0.0), 1.0)
+    if message is not None:
+        job.message = message
+    if partial:
+        job.partial.update(partial)
+
+
+class JobManager:
+    def __init__(self, workers=JOB_WORKERS, retention=JOB_RETENTION_SECONDS):
+        self.retention = retention
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self._lock = threading.Lock()
+        self._jobs = {}
+        self._inflight = {}
+        self._owned = {}
+
+    def submit(self, key, func, *args, owner=None, debounce=0, **kwargs):
+        with self._lock:
+            self._prune()
+            # Identical work already queued or running, share it instead of starting another
+            job = self._inflight.get(key)
+            if job is None:
+                job = Job(key, func, args, kwargs)
+                self._jobs[job.id] = job
+                self._inflight[key] = job
+                if debounce:
+                    job.timer = threading.Timer(debounce, self._start, (job,))
+                    job.timer.daemon = True
+                    job.timer.start()
+                else:
+                    job.future = self._executor.submit(self._run, job)
+            if owner is not None:
+                previous = self._owned.get(owner)
+                if previous is not None and previous is not job:
+                    self._release(previous, owner)
+                job.owners.add(owner)
+                self._owned[owner] = job
+        return job.id
+
+    def _start(self, job):
+        with self._lock:
+            if not job.cancel_event.is_set():
+                job.future = self._executor.submit(self._run, job)
+
+    def _run(self, job):
+        with self._lock:
+            if job.cancel_event.is_set():
+                return
+            job.status = RUNNING
+            job.started = time.time()
+        _current.job = job
+        result = error = None
+        try:
+            result = job.func(*job.args, **job.kwargs)
+            status = DONE
+        except JobCancelled:
+            status = CANCELLED
+        except Exception as e:
+            status, error = FAILED, str(e)
+        finally:
+            _current.job = None
+        with self._lock:
+            if job.cancel_event.is_set():
+                # Finished after it went stale, nobody wants the result
+                status, result = CANCELLED, None
+            self._finish(job, status, result, error)
+
+    def _finish(self, job, status, result=None, error=None):
+        job.status = status
+        job.result = result
+        job.error = error
+        job.finished = time.time()
+        if status == DONE:
+            job.progress = 1.0
+        if self._inflight.get(job.key) is job:
+            del self._inflight[job.key]
+
+    def _release(self, job, owner):
+        job.owners.discard(owner)
+        # Only cancel shared work once every session that asked for it has moved on
+        if not job.owners:
+            self._cancel(job)
+
+    def _cancel(self, job):
+        if job.status in FINISHED:
+            return
+        job.cancel_event.set()
+        # A running job only stops at its next checkpoint, new submissions must not attach to it meanwhile
+        if self._inflight.get(job.key) is job:
+            del self._inflight[job.key]
+        if job.timer:
+            job.timer.cancel()
+        if job.status == QUEUED and (job.future is None or job.future.cancel()):
+            self._finish(job, CANCELLED)
+        # A running job stops at its next report_progress call
+
+    def cancel(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            if job is not None:
+                self._cancel(job)
+
+    def status(self, job_id):
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return job.snapshot() if job else None
+
+    def _prune(self):
+        cutoff = time.time() - self.retention
+        for job_id, job in list(self._jobs.items()):
+            if job.finished and job.finished < cutoff:
+                del self._jobs[job_id]
+                for owner in job.owners:
+                    if self._owned.get(owner) is job:
+                        del self._owned[owner]
+
+    def stats(self):
+        with self._lock:
+            counts = dict.fromkeys((QUEUED, RUNNING, DONE, FAILED, CANCELLED), 0)
+            for job in self._jobs.values():
+                counts[job.status] += 1
+            return counts
+
+    def shutdown(self):
+        with self._lock:
+            for job in self._jobs.values():
+                self._cancel(job)
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+_manager = None
+_manager_lock = threading.Lock()
+
+
+def get_job_manager():
+    # One manager per server process, shared by every Streamlit session
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = JobManager()
+        return _manager
@@ -0,0 +1,96 @@
+import json
+
+
+class StreamingJSONParser:
+    def __init__(self):
+        self.result = {}
+        self.done = False
+        self._depth = 0
+        self._in_string = False
+        self._escape = False
+        self._member = []
+        self._members_found = 0
+
+    def feed(self, chunk):
+        completed = []
+        for char in chunk:
+            if self.done:
+                break
+            if self._depth == 0:
+                # Skip prose and code fences until the object starts
+                if char == "{":
+                    self._depth = 1
+                    self._member = []
+                continue
+            if self._in_string:
+                self._member.append(char)
+                if self._escape:
+                    self._escape = False
+                elif char == "\\":
+                    self._escape = True
+                elif char == '"':
+                    self._in_string = False
+                continue
+            if char == '"':
+                self._in_string = True
+            elif char in "{[":
+                self._depth += 1
+            elif char in "}]":
+                self._depth -= 1
+            if self._depth == 1 and char == ",":
+                completed.extend(self._finish_member())
+            elif self._depth == 0:
+                completed.extend(self._finish_member())
+                if self._members_found:
+                    self.done = True
+                # Otherwise those braces were not the JSON object, keep looking
+            else:
+                self._member.append(char)
+        return completed
+
+    def _finish_member(self):
+        text = "".join(self._member).strip()
+        self._member = []
+        if not text:
+            return []
+        try:
+            member = json.loads("{" + text + "}", strict=False)
+        except ValueError:
+            return []
+        self.result.update(member)
+        self._members_found += len(member)
+        return list(member.items())
+
+
+def parse_json_array(text):
+    # Objects of the first JSON array in text, malformed or truncated members are skipped
+    start = text.find("[")
+    if start == -1:
+        single = parse_json_object(text)
+        return [single] if single else []
+    decoder = json.JSONDecoder(strict=False)
+    items = []
+    position = start + 1
+    while True:
+        brace = text.find("{", position)
+        close = text.find("]", position)
+        if brace == -1 or (close != -1 and close < brace):
+            break
+        try:
+            item, position = decoder.raw_decode(text, brace)
+        except ValueError:
+            end = text.find("}", brace)
+            position = len(text) if end == -1 else end + 1
+            item = parse_json_object(text[brace:position])
+        if isinstance(item, dict) and item:
+            items.append(item)
+    return items
+
+
+def parse_json_object(text):
+    parser = StreamingJSONParser()
+    parser.feed(text)
+    if not parser.done:
+        # Truncated response, keep whatever members were complete
+        parser.feed("}")
+    return parser.result
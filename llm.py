@@ -1,55 +1,83 @@
 import json
 import re
 import subprocess
+import time
 from datetime import datetime
-from dateutil import parser
 import pytesseract
-import pdfplumber
 from PIL import Image
-from io import BytesIO
-
-FIELD_CATEGORIES = {
-    "money": ["total_amount", "payment_amount", "subtotal", "tax_amount"],
-    "date": ["invoice_date", "due_date", "payment_date"],
-    "time": ["issue_time", "processing_time"],
-    "text": ["invoice_number", "customer", "vendor"]
-}
-
-FIELD_DISPLAY_NAMES = {
-    "total_amount": "Total Amount",
-    "payment_amount": "Payment Amount",
-    "subtotal": "Subtotal",
-    "tax_amount": "Tax Amount",
-    "invoice_date": "Invoice Date",
-    "due_date": "Due Date",
-    "payment_date": "Payment Date",
-    "issue_time": "Issue Time",
-    "processing_time": "Processing Time",
-    "invoice_number": "Invoice Number",
-    "customer": "Customer",
-    "vendor": "Vendor"
-}
-
-def extract_text_from_document(uploaded_file, file_bytes):
+from ollama_client import get_client, OllamaUnavailable
+from model_router import AUTO_MODEL, get_router, resolve_model
+from cache import get_cache, content_digest, file_digest
+from artifacts import open_source
+from rule_parser import parse_rule_text, normalize_rule_text
+from rule_engine import compile_rule, RuleCompileError, COERCERS
+from pdf_pages import iter_pdf_pages, labels_found
+from heuristics import pre_extract, record_extraction
+from near_duplicates import get_layout_index
+from chunking import select_relevant_text
+from json_stream import parse_json_object
+from metrics import span, traced, increment, observe
+
+# "auto" routes each call through the OLLAMA_MODEL_TIERS models, any other name pins that model
+DEFAULT_MODEL = AUTO_MODEL
+
+# Bump whenever a prompt changes so cached results are not reused
+EXTRACTION_PROMPT_VERSION = 3
+RULE_PROMPT_VERSION = 1
+
+@traced("extract_text")
+def extract_text_from_document(uploaded_file, source, stop_when=None, max_pages=None):
+    # source is the file's bytes or a path to it, large uploads are passed as a path and memory mapped
     if uploaded_file.type == "application/pdf":
         try:
             text = []
-            with pdfplumber.open(BytesIO(file_bytes)) as pdf:
-                for page in pdf.pages[:10]:  
-                    page_text = page.extract_text()
-                    if page_text:
-                        text.append(page_text.strip())
+            for _, page_text in iter_pdf_pages(source, max_pages=max_pages):
+                increment("pages_extracted_total", empty=not page_text)
+                if page_text:
+                    text.append(page_text)
+                    # Callers can stop once the fields they need have shown up, each page is checked once
+                    if stop_when and stop_when(page_text):
+                        break
             return "\n\n".join(text)
         except Exception as e:
             raise Exception(f"PDF Error: {str(e)}")
     else:
         try:
-            image = Image.open(BytesIO(file_bytes))
-            return pytesseract.image_to_string(image)
+            with open_source(source) as stream:
+                return pytesseract.image_to_string(Image.open(stream))
         except Exception as e:
             raise Exception(f"Image Error: {str(e)}")
 
-def run_ollama_command(prompt, model="llama3:8b"):
+def run_ollama_command(prompt, model=DEFAULT_MODEL, format=None):
+    model = resolve_model(model)
+    started = time.perf_counter()
+    try:
+        # Span inside the try so errors are counted under their original type
+        with span("llm"):
+            return get_client().generate(prompt, model=model, format=format).strip()
+    except OllamaUnavailable:
+        # Ollama server not reachable over HTTP, fall back to the CLI
+        with span("llm_cli"):
+            return _run_ollama_cli(prompt, model)
+    except Exception as e:
+        raise Exception(f"Ollama error: {str(e)}")
+    finally:
+        observe("model_seconds", time.perf_counter() - started, model=model)
+
+def stream_ollama_command(prompt, model=DEFAULT_MODEL, format=None):
+    # Holds a client slot and its connection until the generator finishes, callers that may
+    # stop reading early must close it, e.g. with contextlib.closing, rather than drop it
+    model = resolve_model(model)
+    try:
+        with span("llm_stream"):
+            yield from get_client().stream(prompt, model=model, format=format)
+    except OllamaUnavailable:
+        with span("llm_cli"):
+            yield _run_ollama_cli(prompt, model)
+    except Exception as e:
+        raise Exception(f"Ollama error: {str(e)}")
+
+def _run_ollama_cli(prompt, model=DEFAULT_MODEL):
     try:
         process = subprocess.Popen(
             ["ollama", "run", model, prompt],
@@ -63,14 +91,33 @@ def run_ollama_command(prompt, model="llama3:8b"):
     except Exception as e:
         raise Exception(f"Ollama error: {str(e)}")
 
+@traced("parse_json")
 def extract_json_from_response(response):
-    try:
-        start = response.find('{')
-        end = response.rfind('}') + 1
-        return json.loads(response[start:end])
-    except:
-        return {}
-def parse_rule(rule_text):
+    # Tolerates prose around the object, trailing commas and truncated output
+    data = parse_json_object(response)
+    increment("json_parse_total", outcome="ok" if data else "failed")
+    return data
+
+def rule_cache_key(rule_text, model=DEFAULT_MODEL):
+    return f"{normalize_rule_text(rule_text)}:{model}:v{RULE_PROMPT_VERSION}"
+
+@traced("parse_rule")
+def parse_rule(rule_text, model=DEFAULT_MODEL):
+    # Common rule shapes are parsed deterministically, the LLM only sees the rest
+    rule = parse_rule_text(rule_text)
+    if rule:
+        return rule
+
+    cache = get_cache()
+    key = rule_cache_key(rule_text, model)
+    rule = cache.get_json("rules", key)
+    if rule is None:
+        rule = _parse_rule_with_llm(rule_text, model=model)
+        if rule:
+            cache.put_json("rules", key, rule)
+    return rule
+
+def _parse_rule_with_llm(rule_text, model=DEFAULT_MODEL):
 
     rule_prompt = f"""
     unerstand and Convert this rule to JSON with EXACTLY these fields: category, condition, value.
@@ -109,16 +156,51 @@ def parse_rule(rule_text):
     """
 
     try:
-        response = run_ollama_command(rule_prompt)
+        if model == AUTO_MODEL:
+            return get_router().run(rule_prompt, check_rule_response, run_ollama_command)
+        response = run_ollama_command(rule_prompt, model=model)
         return extract_json_from_response(response)
     except Exception as e:
-        st.error(f"Rule parsing error: {str(e)}")
-        return None
+        raise Exception(f"Rule parsing error: {str(e)}")
+
+def check_rule_response(response):
+    rule = extract_json_from_response(response)
+    try:
+        compile_rule(rule)
+    except RuleCompileError:
+        return rule, False, "invalid_rule" if rule else "malformed_json"
+    return rule, True, None
     
     
-def extract_data_from_text(document_text):
-    max_chars = 5000
-    truncated_text = document_text[:max_chars]
+def extract_data_from_text(document_text, model=DEFAULT_MODEL):
+    return _extract_data_and_sources(document_text, model)[0]
+
+@traced("extract_data")
+def _extract_data_and_sources(document_text, model=DEFAULT_MODEL):
+    # Returns the data and the categories read off a remembered layout, which nothing else has checked
+    # Clearly labelled or unique values don't need the model
+    data, unresolved = pre_extract(document_text)
+    if not unresolved:
+        record_extraction(used_llm=False, heuristic_fields=len(data))
+        return data, []
+
+    # A near-duplicate of an earlier document has the rest on the same lines, only new layouts need the model
+    layouts = get_layout_index()
+    reused = layouts.extract(document_text, unresolved)
+    unresolved = [category for category in unresolved if category not in reused]
+    if not unresolved:
+        record_extraction(used_llm=False, heuristic_fields=len(data), layout_fields=len(reused))
+        return {**reused, **data}, list(reused)
+
+    record_extraction(used_llm=True, heuristic_fields=len(data), layout_fields=len(reused))
+    llm_data = _extract_data_with_llm(document_text, model=model, categories=unresolved)
+    # Learned from what the model and the heuristics found, never from earlier layout reads
+    layouts.learn(document_text, {**llm_data, **data})
+    return {**llm_data, **reused, **data}, list(reused)
+
+def _extract_data_with_llm(document_text, model=DEFAULT_MODEL, categories=("money", "date", "time")):
+    # Send the windows most likely to hold the fields instead of the first N characters
+    relevant_text = select_relevant_text(document_text, categories=categories)
         
     data_prompt = f"""
     Extract structured data from this document and return ONLY a JSON object. Follow these rules exactly:
@@ -140,18 +222,68 @@ def extract_data_from_text(document_text):
 
 
     Document Text:
-    {truncated_text}
+    {relevant_text}
     """
     try:
-        response = run_ollama_command(data_prompt)
+        if model == AUTO_MODEL:
+            check = lambda response: check_extraction_response(response, categories)
+            return get_router().run(data_prompt, check, run_ollama_command)
+        response = run_ollama_command(data_prompt, model=model)
         return extract_json_from_response(response)
     except Exception as e:
-        st.error(f"Data extraction error: {str(e)}")
-        return {}
+        raise Exception(f"Data extraction error: {str(e)}")
+
+def check_extraction_response(response, categories):
+    data = extract_json_from_response(response)
+    if not data:
+        return data, False, "malformed_json"
+    found = 0
+    for category in categories:
+        value = data.get(category)
+        if value is None or value == "":
+            continue
+        # A value the validator cannot read is as bad as no value
+        try:
+            COERCERS[category](value)
+        except (ValueError, OverflowError, TypeError):
+            return data, False, f"invalid_{category}"
+        found += 1
+    if categories and not found:
+        # The heuristics already failed on these fields, an all-empty answer is not trusted
+        return data, False, "low_confidence"
+    return data, True, None
+
+
+def cached_extract_text_from_document(uploaded_file, source, digest=None, stop_labels=None):
+    cache = get_cache()
+    key = digest or (content_digest(source) if isinstance(source, bytes) else file_digest(source))
+    if stop_labels:
+        # A shortened text is only the same text for the same labels
+        key = f"{key}:until:" + "|".join(sorted(label.lower() for label in stop_labels))
+    text = cache.get("text", key)
+    if text is None:
+        text = extract_text_from_document(uploaded_file, source,
+                                          stop_when=labels_found(stop_labels) if stop_labels else None)
+        cache.put("text", key, text)
+    return text
+
+def cached_extract_data_from_text(document_text, model=DEFAULT_MODEL):
+    cache = get_cache()
+    key = f"{content_digest(document_text)}:{model}:v{EXTRACTION_PROMPT_VERSION}"
+    data = cache.get_json("data", key)
+    if data is None:
+        data, from_layout = _extract_data_and_sources(document_text, model=model)
+        # Failed extractions come back empty and should be retried next time. Layout reads are
+        # cheap to redo and stay out of the cache, so a wrong one goes away once the layout does
+        if data and not from_layout:
+            cache.put_json("data", key, data)
+    return data or {}
     
 
+# Called per rule, so only counted here, callers time the whole set (a span costs about half a call)
 def validate_rule(rule, data):
     if not rule or not data:
+        increment("validation_results_total", status="Error", cause="missing_input")
         return {
             "rule": rule,
             "status": "Error",
@@ -160,71 +292,21 @@ def validate_rule(rule, data):
             "actual_value": None
         }
 
-    category = rule.get("category")
-    condition = rule.get("condition")
-    expected = rule.get("value")
-    actual = data.get(category)
-
-    if actual is None:
-        return {
-            "rule": rule,
-            "status": "Error",
-            "message": f"No {category} in document",
-            "expected_value": expected,
-            "actual_value": None
-        }
-
     try:
-        if category == "money":
-            result = _compare_numbers(condition, float(actual), float(expected))
-        elif category in ["date", "time"]:
-            result = _compare_dates(condition, actual, expected)
-        else:
-            result = _compare_text(condition, str(actual), str(expected))
-
-        return {
-            "rule": rule,
-            "status": "PASS" if result else "FAIL",
-            "expected_value": expected,
-            "actual_value": actual
-        }
-    except Exception as e:
+        compiled = compile_rule(rule)
+    except RuleCompileError as e:
+        increment("validation_results_total", status="Error", cause="invalid_rule")
         return {
             "rule": rule,
             "status": "Error",
             "message": str(e),
-            "expected_value": expected,
-            "actual_value": actual
+            "expected_value": rule.get("value"),
+            "actual_value": data.get(rule.get("category"))
         }
-
-def _compare_numbers(condition, actual, expected):
-    if condition == "equals": return actual == expected
-    if condition == "not_equals": return actual != expected
-    if condition == "greater_than": return actual > expected
-    if condition == "less_than": return actual < expected
-    return False
-
-def _compare_dates(condition, actual, expected):
-    try:
-        a = parser.parse(actual)
-        e = parser.parse(expected)
-        
-        if condition == "equals": return a == e
-        if condition == "not_equals": return a != e
-        if condition == "before_date": return a < e
-        if condition == "after_date": return a > e
-        
-        return False
-    except Exception as e:
-        print(f"Date comparison error: {str(e)}")
-        return False
-    
-    
-def _compare_text(condition, actual, expected):
-    actual = actual.lower()
-    expected = expected.lower()
-    if condition == "equals": return actual == expected
-    if condition == "not_equals": return actual != expected
-    if condition == "contains": return expected in actual
-    if condition == "not_contains": return expected not in actual
-    return False
\ No newline at end of file
+    result = compiled.validate(data)
+    if result["status"] == "Error":
+        cause = "missing_field" if result["actual_value"] is None else "unparseable_value"
+        increment("validation_results_total", status="Error", cause=cause)
+    else:
+        increment("validation_results_total", status=result["status"])
+    return result
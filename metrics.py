@@ -0,0 +1,186 @@
+import cProfile
+import functools
+import json
+import os
+import re
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+
+PROFILE_DIR = os.environ.get("METRICS_PROFILE_DIR")
+# Upper bounds in seconds, LLM calls sit in the top buckets and rule checks in the bottom ones
+LATENCY_BUCKETS = (0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+RECENT_SAMPLES = 2048
+
+
+class Histogram:
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.total = 0.0
+        # Percentiles come from the most recent samples, bucket counts keep the full history
+        self.recent = deque(maxlen=RECENT_SAMPLES)
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.total += value
+        self.recent.append(value)
+
+    def percentile(self, q):
+        if not self.recent:
+            return None
+        ordered = sorted(self.recent)
+        return ordered[min(int(q / 100 * len(ordered)), len(ordered) - 1)]
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+
+    def increment(self, name, amount=1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, **labels):
+        self._observe((name, tuple(sorted(labels.items()))), value)
+
+    def _observe(self, key, value):
+        with self._lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = Histogram()
+            histogram.observe(value)
+
+    def span(self, stage):
+        return Span(self, stage)
+
+    def summary(self, name, label):
+        # Histograms of one metric keyed by one of their labels
+        summary = {}
+        with self._lock:
+            for (histogram_name, labels), histogram in self.histograms.items():
+                if histogram_name != name:
+                    continue
+                summary[dict(labels)[label]] = {
+                    "count": histogram.count,
+                    "p50": histogram.percentile(50),
+                    "p95": histogram.percentile(95),
+                    "total_seconds": round(histogram.total, 4),
+                }
+        return summary
+
+    def stage_summary(self):
+        summary = self.summary("stage_seconds", "stage")
+        for stats in summary.values():
+            stats["errors"] = 0
+        for labels, value in self.counter_values("stage_errors_total").items():
+            stage = dict(labels).get("stage")
+            if stage in summary:
+                summary[stage]["errors"] += value
+        return summary
+
+    def counter_values(self, name):
+        with self._lock:
+            return {labels: value for (counter, labels), value in self.counters.items() if counter == name}
+
+    def export_json(self):
+        with self._lock:
+            counters = [{"name": name, "labels": dict(labels), "value": value}
+                        for (name, labels), value in self.counters.items()]
+            histograms = [{"name": name, "labels": dict(labels), "count": h.count, "sum": h.total,
+                           "p50": h.percentile(50), "p95": h.percentile(95), "p99": h.percentile(99)}
+                          for (name, labels), h in self.histograms.items()]
+        return json.dumps({"counters": counters, "histograms": histograms}, indent=2)
+
+    def export_prometheus(self):
+        lines = []
+        with self._lock:
+            for name in sorted({name for name, _ in self.counters}):
+                lines.append(f"# TYPE {name} counter")
+                for (counter, labels), value in self.counters.items():
+                    if counter == name:
+                        lines.append(f"{name}{_format_labels(labels)} {value}")
+            for name in sorted({name for name, _ in self.histograms}):
+                lines.append(f"# TYPE {name} histogram")
+                for (histogram_name, labels), histogram in self.histograms.items():
+                    if histogram_name != name:
+                        continue
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + ("+Inf",), histogram.counts):
+                        cumulative += count
+                        lines.append(f"{name}_bucket{_format_labels(labels + (('le', bound),))} {cumulative}")
+                    lines.append(f"{name}_sum{_format_labels(labels)} {histogram.total}")
+                    lines.append(f"{name}_count{_format_labels(labels)} {histogram.count}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        with self._lock:
+            self.counters.clear()
+            self.histograms.clear()
+
+
+class Span:
+    # A plain class rather than @contextmanager, spans wrap every document's stages
+    __slots__ = ("registry", "key", "stage", "started")
+
+    def __init__(self, registry, stage):
+        self.registry = registry
+        self.stage = stage
+        self.key = ("stage_seconds", (("stage", stage),))
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, traceback):
+        self.registry._observe(self.key, time.perf_counter() - self.started)
+        if exc_type is not None and issubclass(exc_type, Exception):
+            self.registry.increment("stage_errors_total", stage=self.stage, error=exc_type.__name__)
+        return False
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+registry = MetricsRegistry()
+increment = registry.increment
+observe = registry.observe
+span = registry.span
+
+
+def traced(stage):
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with Span(registry, stage):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+@contextmanager
+def profile_document(name, directory=PROFILE_DIR):
+    # Off unless METRICS_PROFILE_DIR is set, one .prof file per document for snakeviz/pstats
+    if not directory:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        os.makedirs(directory, exist_ok=True)
+        safe_name = re.sub(r"[^\w.-]+", "_", os.path.basename(str(name)))[:80]
+        profiler.dump_stats(os.path.join(directory, f"{safe_name}-{time.time_ns()}.prof"))
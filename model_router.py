@@ -0,0 +1,87 @@
+import os
+import threading
+from metrics import registry, increment
+
+AUTO_MODEL = "auto"
+# Smallest first, every response is checked and only failures move up a tier
+MODEL_TIERS = tuple(
+    model.strip() for model in os.environ.get("OLLAMA_MODEL_TIERS", "llama3.2:3b,llama3:8b").split(",") if model.strip()
+)
+
+
+class ModelRouter:
+    def __init__(self, tiers=MODEL_TIERS):
+        if not tiers:
+            raise ValueError("At least one model tier is required")
+        self.tiers = tuple(tiers)
+        self._missing = set()
+        self._lock = threading.Lock()
+
+    def available_tiers(self):
+        with self._lock:
+            # Never skip the last tier, its errors should reach the caller
+            return [model for model in self.tiers[:-1] if model not in self._missing] + [self.tiers[-1]]
+
+    @property
+    def top_model(self):
+        return self.tiers[-1]
+
+    def run(self, prompt, check, generate):
+        # check(response) -> (value, ok, reason), generate(prompt, model) -> response text
+        # Latency per model is recorded by generate, the router only counts outcomes
+        tiers = self.available_tiers()
+        value = None
+        for position, model in enumerate(tiers):
+            last = position == len(tiers) - 1
+            try:
+                response = generate(prompt, model)
+            except Exception as e:
+                if last:
+                    raise
+                if "not found" in str(e).lower():
+                    # Model not pulled on this server, stop trying it
+                    with self._lock:
+                        self._missing.add(model)
+                increment("model_escalations_total", model=model, reason="error")
+                continue
+            value, ok, reason = check(response)
+            if ok or last:
+                increment("model_served_total", model=model, outcome="ok" if ok else "failed")
+                return value
+            increment("model_escalations_total", model=model, reason=reason)
+        return value
+
+
+def model_stats():
+    latency = registry.summary("model_seconds", "model")
+    escalated = {}
+    for labels, count in registry.counter_values("model_escalations_total").items():
+        model = dict(labels)["model"]
+        escalated[model] = escalated.get(model, 0) + count
+
+    stats = {}
+    for model, timings in latency.items():
+        stats[model] = {
+            "calls": timings["count"],
+            "p50": timings["p50"],
+            "p95": timings["p95"],
+            "escalation_rate": escalated.get(model, 0) / timings["count"] if timings["count"] else 0.0,
+        }
+    return stats
+
+
+_router = None
+_router_lock = threading.Lock()
+
+
+def get_router():
+    global _router
+    with _router_lock:
+        if _router is None:
+            _router = ModelRouter()
+        return _router
+
+
+def resolve_model(model):
+    # Calls with nothing to validate against go straight to the most capable tier
+    return get_router().top_model if model == AUTO_MODEL else model
@@ -0,0 +1,237 @@
+import os
+import re
+import threading
+import zlib
+from collections import OrderedDict
+import numpy as np
+from heuristics import values_in_line
+from metrics import increment
+from rule_parser import parse_date_value, parse_time_value
+
+# Layouts remembered per process, the least recently matched are forgotten first, 0 turns reuse off
+LAYOUT_INDEX_SIZE = int(os.environ.get("LAYOUT_INDEX_SIZE", 5000))
+# Estimated Jaccard similarity of the masked shingles, below this a document counts as a new layout
+LAYOUT_SIMILARITY = float(os.environ.get("LAYOUT_SIMILARITY", 0.6))
+LAYOUT_CATEGORIES = ("money", "date", "time")
+NUM_PERMUTATIONS = 64
+# 16 bands of 4 rows put the LSH threshold near 0.5, just under LAYOUT_SIMILARITY
+BANDS = 16
+SHINGLE_TOKENS = 3
+MAX_CANDIDATES = 3
+HASH_CHUNK = 4096
+
+# Amounts, dates and invoice numbers change between invoices of one layout, their shape doesn't
+_NUMBER = re.compile(r"\d(?:[\d,.]*\d)?")
+# Largest prime under 2**32, a * x + b stays inside uint64 for 32-bit hashes and still wraps
+_PRIME = np.uint64(4294967291)
+_permutations = np.random.RandomState(61)
+_A = _permutations.randint(1, int(_PRIME), NUM_PERMUTATIONS, dtype=np.uint64)
+_B = _permutations.randint(0, int(_PRIME), NUM_PERMUTATIONS, dtype=np.uint64)
+
+
+def mask_line(line):
+    return _NUMBER.sub("#", " ".join(line.split()).lower())
+
+
+def layout_signature(masked_lines):
+    # MinHash over token shingles, crc32 rather than hash() so signatures don't change between processes
+    tokens = []
+    for line in masked_lines:
+        tokens.extend(line.split())
+        tokens.append("\n")
+    if not any(token != "\n" for token in tokens):
+        return None
+    shingles = {zlib.crc32(" ".join(tokens[start:start + SHINGLE_TOKENS]).encode("utf-8"))
+                for start in range(max(len(tokens) - SHINGLE_TOKENS + 1, 1))}
+    hashes = np.fromiter(shingles, dtype=np.uint64, count=len(shingles))
+    signature = np.full(NUM_PERMUTATIONS, _PRIME, dtype=np.uint64)
+    for start in range(0, len(hashes), HASH_CHUNK):
+        chunk = hashes[start:start + HASH_CHUNK]
+        np.minimum(signature, ((np.outer(_A, chunk) + _B[:, None]) % _PRIME).min(axis=1), out=signature)
+    return signature.astype(np.uint32)
+
+
+def _band_keys(signature):
+    rows = NUM_PERMUTATIONS // BANDS
+    return [(band, signature[band * rows:(band + 1) * rows].tobytes()) for band in range(BANDS)]
+
+
+def _normalize(category, value):
+    if value is None or value == "":
+        return None
+    text = str(value).strip().lower()
+    if category == "money":
+        try:
+            return round(float(text.lstrip("$€£").replace(",", "")), 2)
+        except ValueError:
+            return None
+    if category == "date":
+        return parse_date_value(text)
+    if category == "time":
+        return parse_time_value(text)
+    return None
+
+
+class LayoutDocument:
+    __slots__ = ("lines", "masked", "signature")
+
+    def __init__(self, text):
+        self.lines = text.split("\n")
+        self.masked = [mask_line(line) for line in self.lines]
+        self.signature = layout_signature(self.masked)
+
+    def context(self, index):
+        return (self.masked[index - 1] if index > 0 else None,
+                self.masked[index + 1] if index + 1 < len(self.masked) else None)
+
+    def locate(self, category, value):
+        # Where a value sits: its masked line, the lines around it and which of the line's values it is
+        expected = _normalize(category, value)
+        if expected is None:
+            return None
+        field = None
+        for index, line in enumerate(self.lines):
+            found = values_in_line(category, line)
+            for ordinal, candidate in enumerate(found):
+                if _normalize(category, candidate) != expected:
+                    continue
+                if field is not None:
+                    # The value shows up twice, e.g. a due date equal to the invoice date,
+                    # guessing the line would teach the index to read the wrong one
+                    return None
+                before, after = self.context(index)
+                field = {"line": self.masked[index], "before": before, "after": after, "ordinal": ordinal,
+                         "count": len(found), "position": index, "from_end": len(self.lines) - index}
+        return field
+
+    def read(self, category, field):
+        # Only a line with the same shape and the same neighbours counts, its value must parse as well
+        best = None
+        for index, masked in enumerate(self.masked):
+            if masked != field["line"] or self.context(index) != (field["before"], field["after"]):
+                continue
+            distance = min(abs(index - field["position"]), abs(len(self.lines) - index - field["from_end"]))
+            if best is None or distance < best[0]:
+                best = (distance, index)
+        if best is None:
+            return None
+        found = values_in_line(category, self.lines[best[1]])
+        if len(found) != field["count"]:
+            return None
+        return found[field["ordinal"]]
+
+
+class LayoutIndex:
+    def __init__(self, size=LAYOUT_INDEX_SIZE, similarity=LAYOUT_SIMILARITY):
+        self.size = size
+        self.similarity = similarity
+        # id -> {"signature", "fields": {category: position}}
+        self._layouts = OrderedDict()
+        # (band, rows) -> ids of the layouts sharing that band
+        self._buckets = {}
+        self._next_id = 0
+        self._stats = {"lookups": 0, "matched": 0, "fields_reused": 0}
+        self._lock = threading.Lock()
+
+    def _similar(self, signature):
+        candidates = set()
+        for key in _band_keys(signature):
+            candidates.update(self._buckets.get(key, ()))
+        scored = []
+        for layout_id in candidates:
+            similarity = float(np.mean(self._layouts[layout_id]["signature"] == signature))
+            if similarity >= self.similarity:
+                scored.append((similarity, layout_id))
+        scored.sort(reverse=True)
+        return [layout_id for _, layout_id in scored[:MAX_CANDIDATES]]
+
+    def extract(self, text, categories=LAYOUT_CATEGORIES):
+        # Values of a near-duplicate layout, read from the lines where the earlier document had them
+        categories = [category for category in categories if category in LAYOUT_CATEGORIES]
+        if self.size <= 0 or not categories:
+            return {}
+        document = LayoutDocument(text)
+        if document.signature is None:
+            return {}
+        with self._lock:
+            self._stats["lookups"] += 1
+            layouts = []
+            for layout_id in self._similar(document.signature):
+                self._layouts.move_to_end(layout_id)
+                layouts.append(self._layouts[layout_id])
+        if not layouts:
+            increment("layout_reuse_total", outcome="new")
+            return {}
+
+        data = {}
+        for category in categories:
+            for layout in layouts:
+                field = layout["fields"].get(category)
+                value = document.read(category, field) if field else None
+                if value is not None:
+                    data[category] = value
+                    break
+        with self._lock:
+            self._stats["matched"] += 1
+            self._stats["fields_reused"] += len(data)
+        increment("layout_reuse_total", outcome="hit" if len(data) == len(categories) else "partial" if data else "miss")
+        return data
+
+    def learn(self, text, data):
+        # Remembers where this document's values are, for the next one that looks like it
+        if self.size <= 0:
+            return False
+        document = LayoutDocument(text)
+        if document.signature is None:
+            return False
+        fields = {}
+        for category in LAYOUT_CATEGORIES:
+            field = document.locate(category, data.get(category))
+            if field:
+                fields[category] = field
+        if not fields:
+            return False
+        with self._lock:
+            layout_id = self._next_id
+            self._next_id += 1
+            self._layouts[layout_id] = {"signature": document.signature, "fields": fields}
+            for key in _band_keys(document.signature):
+                self._buckets.setdefault(key, set()).add(layout_id)
+            while len(self._layouts) > self.size:
+                evicted_id, evicted = self._layouts.popitem(last=False)
+                for key in _band_keys(evicted["signature"]):
+                    bucket = self._buckets.get(key)
+                    bucket.discard(evicted_id)
+                    if not bucket:
+                        del self._buckets[key]
+        return True
+
+    def stats(self):
+        with self._lock:
+            return {"layouts": len(self._layouts), **self._stats}
+
+    def clear(self):
+        with self._lock:
+            self._layouts.clear()
+            self._buckets.clear()
+
+
+_index = None
+_index_options = {}
+_index_lock = threading.Lock()
+
+
+def get_layout_index():
+    global _index
+    with _index_lock:
+        if _index is None:
+            _index = LayoutIndex(**_index_options)
+        return _index
+
+
+def configure_layout_index(**options):
+    global _index, _index_options
+    with _index_lock:
+        _index_options = options
+        _index = LayoutIndex(**options)
+        return _index
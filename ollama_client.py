@@ -0,0 +1,213 @@
+import errno
+import json
+import os
+import socket
+import threading
+import http.client
+from queue import LifoQueue, Empty, Full
+from urllib.parse import urlparse
+from metrics import increment
+
+DEFAULT_HOST = os.environ.get("OLLAMA_HOST", "http://127.0.0.1:11434")
+DEFAULT_MODEL = "llama3:8b"
+
+
+class OllamaError(Exception):
+    pass
+
+
+class OllamaUnavailable(OllamaError):
+    pass
+
+
+class OllamaTimeout(OllamaError):
+    pass
+
+
+# Nothing listening or no route to it, the only failures where trying the CLI makes sense
+_UNREACHABLE = (errno.ECONNREFUSED, errno.ENETUNREACH, errno.EHOSTUNREACH, errno.EADDRNOTAVAIL)
+
+
+class OllamaClient:
+    def __init__(self, host=DEFAULT_HOST, pool_size=4, max_concurrency=None,
+                 timeout=120.0, keep_alive="30m"):
+        parsed = urlparse(host if "://" in host else f"http://{host}")
+        self.scheme = parsed.scheme or "http"
+        self.hostname = parsed.hostname or "127.0.0.1"
+        self.port = parsed.port or 11434
+        self.timeout = timeout
+        self.keep_alive = keep_alive
+        self._pool = LifoQueue(maxsize=pool_size)
+        self._slots = threading.BoundedSemaphore(max_concurrency or pool_size)
+
+    # Connection pool
+    def _new_connection(self):
+        conn_cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        return conn_cls(self.hostname, self.port, timeout=self.timeout)
+
+    def _checkout(self):
+        try:
+            return self._pool.get_nowait(), True
+        except Empty:
+            return self._new_connection(), False
+
+    def _checkin(self, conn, response):
+        if response is not None and response.will_close:
+            conn.close()
+            return
+        try:
+            self._pool.put_nowait(conn)
+        except Full:
+            conn.close()
+
+    def _connection_error(self, error):
+        # A slow server is still there, sending the prompt again elsewhere would only double the work
+        if isinstance(error, TimeoutError):
+            return OllamaTimeout(f"No response from {self.hostname}:{self.port} within {self.timeout}s")
+        if isinstance(error, socket.gaierror) or error.errno in _UNREACHABLE:
+            return OllamaUnavailable(str(error))
+        return OllamaError(f"Connection to {self.hostname}:{self.port} failed: {error}")
+
+    def _request(self, method, path, payload=None):
+        body = json.dumps(payload).encode("utf-8") if payload is not None else None
+        headers = {"Content-Type": "application/json", "Connection": "keep-alive"}
+        conn, reused = self._checkout()
+        try:
+            conn.request(method, path, body=body, headers=headers)
+            response = conn.getresponse()
+        except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError) as e:
+            conn.close()
+            if not reused:
+                raise self._connection_error(e)
+            # Pooled connection went stale while idle, retry once on a fresh socket
+            conn = self._new_connection()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+            except OSError as e:
+                conn.close()
+                raise self._connection_error(e)
+        except OSError as e:
+            conn.close()
+            raise self._connection_error(e)
+
+        if response.status != 200:
+            detail = response.read().decode("utf-8", errors="replace")
+            self._checkin(conn, response)
+            raise OllamaError(f"HTTP {response.status}: {detail}")
+        return conn, response
+
+    def _generate_payload(self, prompt, model, stream, options, format):
+        payload = {
+            "model": model,
+            "prompt": prompt,
+            "stream": stream,
+            "keep_alive": self.keep_alive,
+        }
+        if options:
+            payload["options"] = options
+        if format is not None:
+            payload["format"] = format
+        return payload
+
+    def generate(self, prompt, model=DEFAULT_MODEL, options=None, format=None):
+        with self._slots:
+            conn, response = self._request(
+                "POST", "/api/generate", self._generate_payload(prompt, model, False, options, format)
+            )
+            try:
+                data = json.loads(response.read().decode("utf-8"))
+            except TimeoutError as e:
+                conn.close()
+                raise self._connection_error(e)
+            except (ValueError, OSError) as e:
+                conn.close()
+                raise OllamaError(f"Invalid response: {str(e)}")
+            self._checkin(conn, response)
+        if "error" in data:
+            raise OllamaError(data["error"])
+        _record_tokens(model, data)
+        return data.get("response", "")
+
+    def stream(self, prompt, model=DEFAULT_MODEL, options=None, format=None):
+        # The slot and connection are held until the generator is exhausted or closed
+        with self._slots:
+            conn, response = self._request(
+                "POST", "/api/generate", self._generate_payload(prompt, model, True, options, format)
+            )
+            finished = False
+            try:
+                for line in iter(response.readline, b""):
+                    line = line.strip()
+                    if not line:
+                        continue
+                    chunk = json.loads(line.decode("utf-8"))
+                    if "error" in chunk:
+                        raise OllamaError(chunk["error"])
+                    if chunk.get("response"):
+                        yield chunk["response"]
+                    if chunk.get("done"):
+                        _record_tokens(model, chunk)
+                        finished = True
+                        break
+            except TimeoutError as e:
+                raise self._connection_error(e)
+            finally:
+                # Only a fully drained response can be reused for keep-alive
+                if finished and not response.read():
+                    self._checkin(conn, response)
+                else:
+                    conn.close()
+
+    def pin_model(self, model=DEFAULT_MODEL):
+        # An empty prompt loads the model and holds it in memory for keep_alive
+        return self.generate("", model=model)
+
+    def is_available(self):
+        try:
+            with self._slots:
+                conn, response = self._request("GET", "/api/tags")
+                response.read()
+                self._checkin(conn, response)
+            return True
+        except OllamaError:
+            return False
+
+    def close(self):
+        while True:
+            try:
+                self._pool.get_nowait().close()
+            except Empty:
+                break
+
+
+def _record_tokens(model, data):
+    # Ollama reports token counts on the final response of every generation
+    increment("llm_prompt_tokens_total", data.get("prompt_eval_count", 0), model=model)
+    increment("llm_completion_tokens_total", data.get("eval_count", 0), model=model)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = OllamaClient(
+                host=os.environ.get("OLLAMA_HOST", DEFAULT_HOST),
+                pool_size=int(os.environ.get("OLLAMA_POOL_SIZE", 4)),
+                timeout=float(os.environ.get("OLLAMA_TIMEOUT", 120)),
+                keep_alive=os.environ.get("OLLAMA_KEEP_ALIVE", "30m"),
+            )
+        return _client
+
+
+def configure_client(**options):
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = OllamaClient(**options)
+        return _client
@@ -0,0 +1,127 @@
+import atexit
+import multiprocessing
+import os
+import threading
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+import pdfplumber
+import pytesseract
+from artifacts import map_source, open_source
+
+OCR_RESOLUTION = 300
+# Below this many pages a process pool costs more than it saves
+MIN_PAGES_FOR_POOL = 3
+PDF_WORKERS = int(os.environ.get("PDF_WORKERS", os.cpu_count() or 1))
+
+# (path, mtime) of the PDF this worker has open, the next page is most likely from the same one
+_worker_key = None
+_worker_pdf = None
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def _get_pool():
+    # One pool for the process, started lazily. Pages are extracted from job threads of the
+    # Streamlit server and forking a threaded process can deadlock, so workers are spawned
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(max_workers=PDF_WORKERS, mp_context=multiprocessing.get_context("spawn"))
+            atexit.register(_pool.shutdown, wait=False, cancel_futures=True)
+        return _pool
+
+
+def _discard_pool(pool):
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+def _page_text(page, ocr):
+    text = page.extract_text() or ""
+    if not text.strip() and ocr:
+        # No text layer, most likely a scanned page
+        image = page.to_image(resolution=OCR_RESOLUTION).original
+        text = pytesseract.image_to_string(image)
+    return text.strip()
+
+
+def _extract_page(path, page_number, ocr):
+    global _worker_key, _worker_pdf
+    key = (path, os.stat(path).st_mtime_ns)
+    if key != _worker_key:
+        if _worker_pdf is not None:
+            _worker_pdf.close()
+            _worker_pdf.stream.close()
+        # Kept open between pages, a mapped file is shared with the other workers
+        _worker_pdf = pdfplumber.open(map_source(path))
+        _worker_key = key
+    page = _worker_pdf.pages[page_number]
+    try:
+        return _page_text(page, ocr)
+    finally:
+        page.flush_cache()
+
+
+def count_pages(source):
+    with open_source(source) as stream, pdfplumber.open(stream) as pdf:
+        return len(pdf.pages)
+
+
+def _iter_inline(source, page_count, ocr):
+    with open_source(source) as stream, pdfplumber.open(stream) as pdf:
+        for page_number in range(page_count):
+            page = pdf.pages[page_number]
+            yield page_number, _page_text(page, ocr)
+            page.flush_cache()
+
+
+def iter_pdf_pages(source, workers=None, ocr=True, max_pages=None):
+    # source is the PDF bytes or a file path. Only paths go to the pool, bytes are small uploads
+    # (artifacts spills large ones to disk) and would be pickled to every worker
+    page_count = count_pages(source)
+    if max_pages is not None:
+        page_count = min(page_count, max_pages)
+    workers = min(workers or PDF_WORKERS, PDF_WORKERS, page_count)
+    # Already inside a worker process (e.g. the batch CLI), don't nest another pool
+    if (workers <= 1 or page_count < MIN_PAGES_FOR_POOL or not isinstance(source, (str, os.PathLike))
+            or multiprocessing.parent_process() is not None):
+        yield from _iter_inline(source, page_count, ocr)
+        return
+
+    path = os.fspath(source)
+    pool = _get_pool()
+    pending = deque()
+    try:
+        # Only a small window of pages is queued ahead, so stopping early leaves little wasted work
+        next_page = 0
+        while pending or next_page < page_count:
+            while next_page < page_count and len(pending) < workers * 2:
+                pending.append((next_page, pool.submit(_extract_page, path, next_page, ocr)))
+                next_page += 1
+            page_number, future = pending.popleft()
+            yield page_number, future.result()
+    except BrokenProcessPool:
+        # A crashed worker takes the pool with it, the next document starts a fresh one
+        _discard_pool(pool)
+        raise
+    finally:
+        # The pool is shared, only this document's queued pages are dropped
+        for _, future in pending:
+            future.cancel()
+
+
+def labels_found(labels):
+    # Fed one page at a time and remembers what it has seen, so make one per document
+    remaining = {label.lower() for label in labels}
+
+    def stop_when(page_text):
+        lowered = page_text.lower()
+        remaining.difference_update([label for label in remaining if label in lowered])
+        return not remaining
+
+    return stop_when
@@ -0,0 +1,138 @@
+import asyncio
+import mimetypes
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from types import SimpleNamespace
+from llm import (
+    DEFAULT_MODEL,
+    extract_text_from_document,
+    extract_data_from_text,
+    cached_extract_text_from_document,
+    cached_extract_data_from_text,
+)
+from rule_index import RuleIndex
+from metrics import span
+
+_DONE = object()
+
+
+def _load_document(document):
+    if isinstance(document, str):
+        # Paths are memory mapped by the extractors rather than read here
+        mime_type = mimetypes.guess_type(document)[0] or "application/octet-stream"
+        return document, mime_type, document
+    return document["name"], document["type"], document["bytes"]
+
+
+def extract_document_text(document, use_cache=True):
+    # Runs in a worker process, reads the file there so bytes don't go through the queues
+    name, mime_type, source = _load_document(document)
+    extract = cached_extract_text_from_document if use_cache else extract_text_from_document
+    return extract(SimpleNamespace(type=mime_type), source)
+
+
+def _document_name(document):
+    return document if isinstance(document, str) else document["name"]
+
+
+async def _run_stage(handler, inbox, outbox, workers, downstream_workers):
+    async def worker():
+        while True:
+            item = await inbox.get()
+            if item is _DONE:
+                return
+            # Waiting on a full outbox is the backpressure that throttles upstream stages
+            await outbox.put(await handler(item))
+
+    await asyncio.gather(*(worker() for _ in range(workers)))
+    # One end marker per worker of the next stage
+    for _ in range(downstream_workers):
+        await outbox.put(_DONE)
+
+
+async def process_documents(documents, rules, model=DEFAULT_MODEL, ocr_workers=None, llm_concurrency=2,
+                            validate_workers=1, queue_size=8, use_cache=True, executor=None):
+    loop = asyncio.get_running_loop()
+    ocr_workers = ocr_workers or os.cpu_count() or 1
+    own_executor = executor is None
+    if own_executor:
+        executor = ProcessPoolExecutor(max_workers=ocr_workers)
+    extract_data = cached_extract_data_from_text if use_cache else extract_data_from_text
+    rule_index = RuleIndex(rules)
+
+    text_queue = asyncio.Queue(maxsize=queue_size)
+    llm_queue = asyncio.Queue(maxsize=queue_size)
+    validate_queue = asyncio.Queue(maxsize=queue_size)
+    results = asyncio.Queue(maxsize=queue_size)
+
+    async def feed():
+        for document in documents:
+            await text_queue.put({"name": _document_name(document), "document": document,
+                                  "started": time.perf_counter()})
+        for _ in range(ocr_workers):
+            await text_queue.put(_DONE)
+
+    async def extract_text(item):
+        try:
+            # Timed here, spans recorded inside the worker processes never reach this registry
+            with span("extract_text"):
+                item["text"] = await loop.run_in_executor(executor, extract_document_text, item.pop("document"),
+                                                          use_cache)
+        except Exception as e:
+            item["error"] = str(e)
+        return item
+
+    async def extract_fields(item):
+        if "error" not in item:
+            try:
+                item["data"] = await asyncio.to_thread(extract_data, item.pop("text"), model)
+            except Exception as e:
+                item["error"] = str(e)
+        return item
+
+    async def validate(item):
+        if "error" not in item:
+            item["results"] = rule_index.evaluate(item["data"])
+        item.pop("text", None)
+        item["seconds"] = round(time.perf_counter() - item.pop("started"), 4)
+        return item
+
+    tasks = [
+        asyncio.create_task(feed()),
+        asyncio.create_task(_run_stage(extract_text, text_queue, llm_queue, ocr_workers, llm_concurrency)),
+        asyncio.create_task(_run_stage(extract_fields, llm_queue, validate_queue, llm_concurrency, validate_workers)),
+        asyncio.create_task(_run_stage(validate, validate_queue, results, validate_workers, 1)),
+    ]
+    watched = set(tasks)
+    getter = None
+    try:
+        while True:
+            getter = asyncio.ensure_future(results.get())
+            while not getter.done():
+                # A stage that dies never sends its end marker, wait on the stages too and raise its error
+                done, _ = await asyncio.wait({getter, *watched}, return_when=asyncio.FIRST_COMPLETED)
+                for task in done - {getter}:
+                    watched.discard(task)
+                    if task.exception() is not None:
+                        raise task.exception()
+            item = getter.result()
+            if item is _DONE:
+                break
+            yield item
+        await asyncio.gather(*tasks)
+    finally:
+        # Consumer stopped early or was cancelled, or a stage failed, tear every stage down
+        if getter is not None:
+            getter.cancel()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        if own_executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+
+def run_pipeline(documents, rules, **options):
+    async def collect():
+        return [item async for item in process_documents(documents, rules, **options)]
+    return asyncio.run(collect())
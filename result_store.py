@@ -0,0 +1,351 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import Counter
+from datetime import date, timedelta
+
+RESULTS_PATH = os.environ.get("RESULTS_DB_PATH", os.path.join(".cache", "results.sqlite3"))
+STATUSES = ("PASS", "FAIL", "Error")
+# Stays under SQLite's limit on bound parameters per statement
+LOOKUP_CHUNK = 500
+
+SCHEMA = """
+    CREATE TABLE IF NOT EXISTS documents (
+        id INTEGER PRIMARY KEY,
+        digest TEXT NOT NULL UNIQUE,
+        name TEXT,
+        mime_type TEXT,
+        data TEXT,
+        created REAL NOT NULL,
+        updated REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS rules (
+        id INTEGER PRIMARY KEY,
+        key TEXT NOT NULL UNIQUE,
+        category TEXT,
+        condition TEXT,
+        created REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS runs (
+        id INTEGER PRIMARY KEY,
+        document_id INTEGER REFERENCES documents(id),
+        session TEXT,
+        data TEXT NOT NULL,
+        created REAL NOT NULL
+    );
+    CREATE TABLE IF NOT EXISTS results (
+        id INTEGER PRIMARY KEY,
+        run_id INTEGER NOT NULL REFERENCES runs(id),
+        position INTEGER NOT NULL,
+        rule_id INTEGER NOT NULL REFERENCES rules(id),
+        category TEXT,
+        status TEXT NOT NULL,
+        actual,
+        expected,
+        message TEXT,
+        created REAL NOT NULL
+    );
+    CREATE INDEX IF NOT EXISTS idx_runs_document ON runs(document_id, created);
+    CREATE INDEX IF NOT EXISTS idx_runs_session ON runs(session, created);
+    CREATE INDEX IF NOT EXISTS idx_results_run ON results(run_id, position);
+    CREATE INDEX IF NOT EXISTS idx_results_rule ON results(rule_id, created);
+    CREATE INDEX IF NOT EXISTS idx_results_status ON results(status, created);
+    CREATE INDEX IF NOT EXISTS idx_results_category ON results(category, created);
+    CREATE INDEX IF NOT EXISTS idx_results_created ON results(created);
+    CREATE TABLE IF NOT EXISTS daily_totals (
+        day TEXT NOT NULL,
+        category TEXT NOT NULL,
+        status TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (day, category, status)
+    ) WITHOUT ROWID;
+    CREATE TABLE IF NOT EXISTS rule_totals (
+        rule_id INTEGER NOT NULL,
+        status TEXT NOT NULL,
+        count INTEGER NOT NULL,
+        PRIMARY KEY (rule_id, status)
+    ) WITHOUT ROWID;
+"""
+
+
+def rule_key(rule):
+    # Same rule, same row, however the dict was built
+    if not isinstance(rule, dict):
+        rule = {}
+    return json.dumps({field: rule.get(field) for field in ("category", "condition", "value")},
+                      sort_keys=True, default=str)
+
+
+def _value(value):
+    # Untyped columns keep str, int and float as they are, anything else is stored as text
+    return value if value is None or isinstance(value, (str, int, float)) else str(value)
+
+
+class ResultStore:
+    def __init__(self, path=RESULTS_PATH):
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def _transaction(self, work):
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                value = work(self._conn)
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+            return value
+
+    def save_document(self, digest, name=None, mime_type=None, data=None):
+        return self._transaction(lambda conn: self._document_id(conn, digest, name, mime_type, data, time.time()))
+
+    def _document_id(self, conn, digest, name, mime_type, data, now):
+        if digest is None:
+            return None
+        conn.execute("""
+            INSERT INTO documents (digest, name, mime_type, data, created, updated) VALUES (?, ?, ?, ?, ?, ?)
+            ON CONFLICT(digest) DO UPDATE SET
+                name = COALESCE(excluded.name, name),
+                mime_type = COALESCE(excluded.mime_type, mime_type),
+                data = COALESCE(excluded.data, data),
+                updated = excluded.updated
+        """, (digest, name, mime_type, None if data is None else json.dumps(data, default=str), now, now))
+        return conn.execute("SELECT id FROM documents WHERE digest = ?", (digest,)).fetchone()[0]
+
+    def _rule_ids(self, conn, rules, now):
+        # Results of one rule share its dict, so each distinct rule is serialized once
+        key_of = {}
+        keys = {}
+        for rule in rules:
+            if id(rule) not in key_of:
+                key_of[id(rule)] = rule_key(rule)
+                keys.setdefault(key_of[id(rule)], rule)
+        conn.executemany(
+            "INSERT OR IGNORE INTO rules (key, category, condition, created) VALUES (?, ?, ?, ?)",
+            [(key, rule.get("category") if isinstance(rule, dict) else None,
+              rule.get("condition") if isinstance(rule, dict) else None, now) for key, rule in keys.items()]
+        )
+        ids = {}
+        ordered = list(keys)
+        for start in range(0, len(ordered), LOOKUP_CHUNK):
+            chunk = ordered[start:start + LOOKUP_CHUNK]
+            rows = conn.execute(f"SELECT key, id FROM rules WHERE key IN ({','.join('?' * len(chunk))})", chunk)
+            ids.update(rows)
+        return {rule: ids[key] for rule, key in key_of.items()}
+
+    def record_run(self, results, data, digest=None, name=None, mime_type=None, session=None):
+        return self.record_runs([{"results": results, "data": data, "digest": digest, "name": name,
+                                  "mime_type": mime_type, "session": session}])[0]
+
+    def record_runs(self, runs):
+        # One transaction and a few executemany calls for a whole batch of documents
+        def work(conn):
+            now = time.time()
+            day = date.fromtimestamp(now).isoformat()
+            rules = [result.get("rule") for run in runs for result in run["results"]]
+            rule_ids = self._rule_ids(conn, rules, now)
+            run_ids = []
+            rows = []
+            daily = Counter()
+            per_rule = Counter()
+            for run in runs:
+                document_id = self._document_id(conn, run.get("digest"), run.get("name"), run.get("mime_type"),
+                                                None, now)
+                run_id = conn.execute(
+                    "INSERT INTO runs (document_id, session, data, created) VALUES (?, ?, ?, ?)",
+                    (document_id, run.get("session"), json.dumps(run.get("data") or {}, default=str), now)
+                ).lastrowid
+                run_ids.append(run_id)
+                for position, result in enumerate(run["results"]):
+                    rule = result.get("rule")
+                    rule_id = rule_ids[id(rule)]
+                    category = (rule.get("category") if isinstance(rule, dict) else None) or ""
+                    status = result.get("status", "Error")
+                    rows.append((run_id, position, rule_id, category, status, _value(result.get("actual_value")),
+                                 _value(result.get("expected_value")), result.get("message"), now))
+                    daily[(day, category, status)] += 1
+                    per_rule[(rule_id, status)] += 1
+            conn.executemany("""
+                INSERT INTO results (run_id, position, rule_id, category, status, actual, expected, message, created)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, rows)
+            # Aggregates move with the rows in the same transaction, so they never drift
+            conn.executemany("""
+                INSERT INTO daily_totals (day, category, status, count) VALUES (?, ?, ?, ?)
+                ON CONFLICT(day, category, status) DO UPDATE SET count = count + excluded.count
+            """, [(*key, count) for key, count in daily.items()])
+            conn.executemany("""
+                INSERT INTO rule_totals (rule_id, status, count) VALUES (?, ?, ?)
+                ON CONFLICT(rule_id, status) DO UPDATE SET count = count + excluded.count
+            """, [(*key, count) for key, count in per_rule.items()])
+            return run_ids
+
+        return self._transaction(work)
+
+    def run_results(self, run_id):
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT rules.key, results.status, results.actual, results.expected, results.message
+                FROM results JOIN rules ON rules.id = results.rule_id
+                WHERE results.run_id = ? ORDER BY results.position
+            """, (run_id,)).fetchall()
+        results = []
+        for key, status, actual, expected, message in rows:
+            result = {"rule": json.loads(key), "status": status, "expected_value": expected, "actual_value": actual}
+            if message is not None:
+                result["message"] = message
+            results.append(result)
+        return results
+
+    def run_totals(self, run_id):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT status, COUNT(*) FROM results WHERE run_id = ? GROUP BY status", (run_id,)
+            ).fetchall()
+        return {status: 0 for status in STATUSES} | dict(rows)
+
+    def latest_run(self, session=None, digest=None):
+        query = "SELECT runs.id FROM runs"
+        clauses = []
+        params = []
+        if digest is not None:
+            query += " JOIN documents ON documents.id = runs.document_id"
+            clauses.append("documents.digest = ?")
+            params.append(digest)
+        if session is not None:
+            clauses.append("runs.session = ?")
+            params.append(session)
+        if clauses:
+            query += " WHERE " + " AND ".join(clauses)
+        with self._lock:
+            row = self._conn.execute(query + " ORDER BY runs.created DESC, runs.id DESC LIMIT 1", params).fetchone()
+        return row[0] if row else None
+
+    def totals(self, days=None, category=None):
+        # Read from the aggregate tables, a handful of rows per day however many results are stored
+        clauses = []
+        params = []
+        if days is not None:
+            clauses.append("day >= ?")
+            params.append((date.today() - timedelta(days=days - 1)).isoformat())
+        if category is not None:
+            clauses.append("category = ?")
+            params.append(category)
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        with self._lock:
+            rows = self._conn.execute(f"SELECT status, SUM(count) FROM daily_totals{where} GROUP BY status",
+                                      params).fetchall()
+        return {status: 0 for status in STATUSES} | dict(rows)
+
+    def daily_totals(self, days=30):
+        since = (date.today() - timedelta(days=days - 1)).isoformat()
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT day, status, SUM(count) FROM daily_totals WHERE day >= ? GROUP BY day, status ORDER BY day",
+                (since,)
+            ).fetchall()
+        by_day = {}
+        for day, status, count in rows:
+            by_day.setdefault(day, {status: 0 for status in STATUSES})[status] = count
+        return by_day
+
+    def category_totals(self):
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT category, status, SUM(count) FROM daily_totals GROUP BY category, status"
+            ).fetchall()
+        by_category = {}
+        for category, status, count in rows:
+            by_category.setdefault(category, {s: 0 for s in STATUSES})[status] = count
+        return by_category
+
+    def rule_totals(self, limit=20):
+        # Rules that fail most often first
+        with self._lock:
+            rows = self._conn.execute("""
+                SELECT rules.key,
+                       SUM(CASE WHEN status = 'PASS' THEN count ELSE 0 END),
+                       SUM(CASE WHEN status = 'FAIL' THEN count ELSE 0 END),
+                       SUM(CASE WHEN status = 'Error' THEN count ELSE 0 END),
+                       SUM(count) AS total
+                FROM rule_totals JOIN rules ON rules.id = rule_totals.rule_id
+                GROUP BY rule_totals.rule_id
+                ORDER BY CAST(SUM(CASE WHEN status = 'FAIL' THEN count ELSE 0 END) AS REAL) / SUM(count) DESC, total DESC
+                LIMIT ?
+            """, (limit,)).fetchall()
+        return [{"rule": json.loads(key), "PASS": passed, "FAIL": failed, "Error": errors, "total": total}
+                for key, passed, failed, errors, total in rows]
+
+    def results(self, status=None, category=None, rule=None, since=None, limit=100):
+        # Each filter has an index that starts with its column and ends with created
+        clauses = []
+        params = []
+        if status is not None:
+            clauses.append("results.status = ?")
+            params.append(status)
+        if category is not None:
+            clauses.append("results.category = ?")
+            params.append(category)
+        if rule is not None:
+            clauses.append("results.rule_id = (SELECT id FROM rules WHERE key = ?)")
+            params.append(rule_key(rule))
+        if since is not None:
+            clauses.append("results.created >= ?")
+            params.append(since)
+        where = " WHERE " + " AND ".join(clauses) if clauses else ""
+        with self._lock:
+            rows = self._conn.execute(f"""
+                SELECT results.run_id, rules.key, results.status, results.actual, results.expected, results.message,
+                       results.created
+                FROM results JOIN rules ON rules.id = results.rule_id{where}
+                ORDER BY results.created DESC LIMIT ?
+            """, params + [limit]).fetchall()
+        return [{"run_id": run_id, "rule": json.loads(key), "status": status, "actual_value": actual,
+                 "expected_value": expected, "message": message, "created": created}
+                for run_id, key, status, actual, expected, message, created in rows]
+
+    def stats(self):
+        with self._lock:
+            counts = {table: self._conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                      for table in ("documents", "rules", "runs")}
+            counts["results"] = self._conn.execute("SELECT COALESCE(SUM(count), 0) FROM rule_totals").fetchone()[0]
+        return counts
+
+    def clear(self):
+        with self._lock:
+            for table in ("results", "runs", "rules", "documents", "daily_totals", "rule_totals"):
+                self._conn.execute(f"DELETE FROM {table}")
+
+
+_store = None
+_store_pid = None
+_store_options = {}
+_store_lock = threading.Lock()
+
+
+def get_result_store():
+    global _store, _store_pid
+    with _store_lock:
+        # SQLite connections must not cross a fork, worker processes open their own
+        if _store is None or _store_pid != os.getpid():
+            _store = ResultStore(**_store_options)
+            _store_pid = os.getpid()
+        return _store
+
+
+def configure_result_store(**options):
+    global _store, _store_pid, _store_options
+    with _store_lock:
+        _store_options = options
+        _store = ResultStore(**options)
+        _store_pid = os.getpid()
+        return _store
@@ -0,0 +1,159 @@
+import operator
+import re
+from datetime import time
+from decimal import Decimal, InvalidOperation
+from functools import lru_cache
+from dateutil import parser
+from rule_parser import CONDITIONS
+
+
+class RuleCompileError(ValueError):
+    pass
+
+
+# The edit form offers greater/less than for times, the validator speaks in before/after
+CONDITION_ALIASES = {
+    "date": {"greater_than": "after_date", "less_than": "before_date"},
+    "time": {"greater_than": "after_date", "less_than": "before_date"},
+}
+
+COMPARATORS = {
+    "equals": operator.eq,
+    "not_equals": operator.ne,
+    "greater_than": operator.gt,
+    "less_than": operator.lt,
+    "before_date": operator.lt,
+    "after_date": operator.gt,
+    "contains": lambda actual, expected: expected in actual,
+    "not_contains": lambda actual, expected: expected not in actual,
+}
+
+_MONEY_NOISE = re.compile(r"[\s,$€£]")
+
+
+def to_decimal(value):
+    if isinstance(value, bool):
+        raise ValueError(f"Unknown number format: {value}")
+    try:
+        number = Decimal(str(value))
+    except InvalidOperation:
+        try:
+            number = Decimal(_MONEY_NOISE.sub("", str(value)))
+        except InvalidOperation:
+            raise ValueError(f"Unknown number format: {value}")
+    if not number.is_finite():
+        raise ValueError(f"Unknown number format: {value}")
+    return number
+
+
+def to_datetime(value):
+    return parser.parse(str(value))
+
+
+def to_time(value):
+    return parser.parse(str(value)).time()
+
+
+def to_text(value):
+    return str(value).lower()
+
+
+COERCERS = {
+    "money": to_decimal,
+    "date": to_datetime,
+    "time": to_time,
+    "text": to_text,
+}
+
+
+class CompiledRule:
+    __slots__ = ("rule", "category", "condition", "expected", "coerce", "compare")
+
+    def __init__(self, rule, category, condition, expected):
+        self.rule = rule
+        self.category = category
+        self.condition = condition
+        self.expected = expected
+        self.coerce = COERCERS[category]
+        self.compare = COMPARATORS[condition]
+
+    def __repr__(self):
+        return f"CompiledRule({self.category} {self.condition} {self.expected!r})"
+
+    def matches(self, actual):
+        return self.compare(self.coerce(actual), self.expected)
+
+    def to_dict(self):
+        # Canonical form for export, aliases resolved and the value as it was parsed
+        if self.category == "money":
+            integral = self.expected == self.expected.to_integral_value()
+            value = int(self.expected) if integral else float(self.expected)
+        elif self.category == "date":
+            value = self.expected.date().isoformat() if self.expected.time() == time() else self.expected.isoformat()
+        elif self.category == "time":
+            value = self.expected.isoformat()
+        else:
+            value = str(self.rule.get("value"))
+        return {"category": self.category, "condition": self.condition, "value": value}
+
+    def validate(self, data):
+        expected = self.rule.get("value")
+        actual = data.get(self.category) if data else None
+        if actual is None:
+            return {
+                "rule": self.rule,
+                "status": "Error",
+                "message": f"No {self.category} in document",
+                "expected_value": expected,
+                "actual_value": None
+            }
+        try:
+            status = "PASS" if self.matches(actual) else "FAIL"
+        except Exception as e:
+            return {
+                "rule": self.rule,
+                "status": "Error",
+                "message": str(e),
+                "expected_value": expected,
+                "actual_value": actual
+            }
+        return {
+            "rule": self.rule,
+            "status": status,
+            "expected_value": expected,
+            "actual_value": actual
+        }
+
+
+@lru_cache(maxsize=4096)
+def _compile_operands(category, condition, value):
+    if category not in CONDITIONS:
+        raise RuleCompileError(f"Unknown category: {category!r}")
+    condition = CONDITION_ALIASES.get(category, {}).get(condition, condition)
+    if condition not in CONDITIONS[category]:
+        raise RuleCompileError(f"Condition {condition!r} is not valid for {category}")
+    if value is None or value == "":
+        raise RuleCompileError("Rule has no value")
+    try:
+        expected = COERCERS[category](value)
+    except (ValueError, OverflowError) as e:
+        raise RuleCompileError(f"Invalid {category} value {value!r}: {str(e)}")
+    return condition, expected
+
+
+def compile_rule(rule):
+    if not isinstance(rule, dict):
+        raise RuleCompileError("Rule must be a dict")
+    category = rule.get("category")
+    condition = rule.get("condition")
+    value = rule.get("value")
+    try:
+        condition, expected = _compile_operands(category, condition, value)
+    except TypeError:
+        # Unhashable values cannot be memoized, and are rejected by the coercers anyway
+        raise RuleCompileError(f"Invalid {category} value {value!r}")
+    return CompiledRule(rule, category, condition, expected)
+
+
+def compile_rules(rules):
+    return [compile_rule(rule) for rule in rules]
@@ -0,0 +1,232 @@
+import csv
+import io
+import json
+from concurrent.futures import ThreadPoolExecutor
+from rule_parser import parse_rule_text, normalize_rule_text
+from rule_engine import compile_rule, RuleCompileError
+from json_stream import parse_json_array
+from cache import get_cache
+from llm import run_ollama_command, parse_rule, rule_cache_key, DEFAULT_MODEL
+from model_router import AUTO_MODEL, get_router
+from metrics import traced, increment
+
+BATCH_SIZE = 25
+BATCH_WORKERS = 4
+RULE_SET_FORMAT = "document-validator-rules"
+RULE_SET_VERSION = 1
+RULE_FIELDS = ("category", "condition", "value")
+
+
+def read_rules(content, filename=""):
+    # Natural-language rules come back as strings, structured ones as dicts
+    if isinstance(content, bytes):
+        content = content.decode("utf-8-sig")
+    name = filename.lower()
+    if name.endswith(".csv"):
+        return _read_csv(content)
+    if name.endswith((".yaml", ".yml")):
+        return _read_items(_load_yaml(content))
+    if name.endswith(".json"):
+        return _read_items(json.loads(content))
+    return [line.strip() for line in content.splitlines() if line.strip() and not line.strip().startswith("#")]
+
+
+def _read_csv(content):
+    rows = [row for row in csv.reader(io.StringIO(content)) if any(cell.strip() for cell in row)]
+    if not rows:
+        return []
+    header = [cell.strip().lower() for cell in rows[0]]
+    if all(field in header for field in RULE_FIELDS):
+        columns = {field: header.index(field) for field in RULE_FIELDS}
+        return [{field: row[column].strip() for field, column in columns.items() if column < len(row)}
+                for row in rows[1:]]
+    if "rule" in header:
+        column = header.index("rule")
+        return [row[column].strip() for row in rows[1:] if column < len(row) and row[column].strip()]
+    # No header, one rule per row in the first column
+    return [row[0].strip() for row in rows if row[0].strip()]
+
+
+def _load_yaml(content):
+    try:
+        import yaml
+    except ImportError:
+        raise Exception("YAML rule files need PyYAML: pip install pyyaml")
+    return yaml.safe_load(content)
+
+
+def _read_items(loaded):
+    if isinstance(loaded, dict):
+        loaded = loaded.get("rules", [])
+    if not isinstance(loaded, list):
+        raise Exception("Expected a list of rules")
+    items = []
+    for item in loaded:
+        if isinstance(item, dict) and "rule" in item and "category" not in item:
+            item = item["rule"]
+        if isinstance(item, (str, dict)) and item:
+            items.append(item.strip() if isinstance(item, str) else item)
+    return items
+
+
+def _validated(rule):
+    try:
+        return compile_rule(rule).to_dict()
+    except RuleCompileError:
+        return None
+
+
+def build_batch_prompt(rule_texts):
+    numbered = "\n".join(f'    {index}. "{text}"' for index, text in enumerate(rule_texts, start=1))
+    return f"""
+    Convert each numbered rule to JSON with EXACTLY these fields: index, category, condition, value.
+    Follow these specifications precisely:
+
+    CATEGORIES (use exactly one):
+    - "money" (for amounts)
+    - "date" (format: YYYY-MM-DD)
+    - "time" (format: HH:MM:SS)
+    - "text" (for names, numbers and references)
+
+    CONDITIONS (use exactly one):
+    - "equals", "not_equals"
+    - "greater_than", "less_than" (for money)
+    - "before_date", "after_date" (for dates and times)
+    - "contains", "not_contains" (for text)
+
+    STRICT REQUIREMENTS:
+    1. index is the number of the rule
+    2. Money values must be numbers (no symbols)
+    3. Dates must be YYYY-MM-DD format
+    4. Times must be HH:MM:SS format
+    5. Return ONLY a JSON array with one object per rule, in the same order, with NO other text
+
+    Rules to convert:
+{numbered}
+    """
+
+
+def _read_batch(response, count):
+    parsed = [None] * count
+    for position, item in enumerate(parse_json_array(response)):
+        index = item.get("index")
+        # Trust the index the model echoed back, fall back to the position in the array
+        slot = index - 1 if isinstance(index, int) and 1 <= index <= count else position
+        if slot < count and parsed[slot] is None:
+            parsed[slot] = _validated({field: item.get(field) for field in RULE_FIELDS})
+    return parsed
+
+
+def _check_batch(response, count):
+    # Only an unusable answer escalates the batch, single bad items are retried one by one
+    parsed = _read_batch(response, count)
+    return parsed, any(parsed), "malformed_json"
+
+
+@traced("parse_rule_batch")
+def _parse_batch(rule_texts, model=DEFAULT_MODEL):
+    prompt = build_batch_prompt(rule_texts)
+    try:
+        if model == AUTO_MODEL:
+            return get_router().run(prompt, lambda response: _check_batch(response, len(rule_texts)),
+                                    run_ollama_command)
+        return _read_batch(run_ollama_command(prompt, model=model), len(rule_texts))
+    except Exception:
+        # The whole batch falls through to individual retries
+        return [None] * len(rule_texts)
+
+
+def _parse_single(rule_text, model=DEFAULT_MODEL):
+    try:
+        return _validated(parse_rule(rule_text, model=model))
+    except Exception:
+        return None
+
+
+def parse_rules_bulk(rule_texts, model=DEFAULT_MODEL, batch_size=BATCH_SIZE, workers=BATCH_WORKERS):
+    cache = get_cache()
+    # Repeated phrasings are parsed once, keeping the first wording so text values keep their case
+    unique = {}
+    for text in rule_texts:
+        unique.setdefault(normalize_rule_text(text), text)
+
+    rules = {}
+    pending = []
+    for key, text in unique.items():
+        rule = _validated(parse_rule_text(text) or cache.get_json("rules", rule_cache_key(text, model)))
+        if rule:
+            rules[key] = rule
+        else:
+            pending.append(key)
+    increment("rule_import_total", len(rules), outcome="parser_or_cache")
+
+    batches = [pending[start:start + batch_size] for start in range(0, len(pending), batch_size)]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        parsed_batches = pool.map(lambda batch: _parse_batch([unique[key] for key in batch], model), batches)
+        for batch, parsed in zip(batches, parsed_batches):
+            for key, rule in zip(batch, parsed):
+                if rule:
+                    rules[key] = rule
+                    cache.put_json("rules", rule_cache_key(unique[key], model), rule)
+                    increment("rule_import_total", outcome="batch")
+
+        # Anything a batch dropped or got wrong gets its own prompt
+        retry = [key for key in pending if key not in rules]
+        retried = pool.map(lambda key: _parse_single(unique[key], model), retry)
+        for key, rule in zip(retry, retried):
+            if rule:
+                rules[key] = rule
+            increment("rule_import_total", outcome="retry" if rule else "failed")
+
+    results = []
+    for text in rule_texts:
+        rule = rules.get(normalize_rule_text(text))
+        results.append({"source": text, "rule": rule, "error": None if rule else f"Could not parse rule: {text}"})
+    return results
+
+
+def import_rules(items, model=DEFAULT_MODEL, batch_size=BATCH_SIZE, workers=BATCH_WORKERS):
+    results = [None] * len(items)
+    texts = []
+    for index, item in enumerate(items):
+        if isinstance(item, dict):
+            try:
+                results[index] = {"source": item, "rule": compile_rule(item).to_dict(), "error": None}
+            except RuleCompileError as e:
+                results[index] = {"source": item, "rule": None, "error": str(e)}
+        else:
+            texts.append(index)
+    parsed = parse_rules_bulk([items[index] for index in texts], model=model, batch_size=batch_size, workers=workers)
+    for index, result in zip(texts, parsed):
+        results[index] = result
+    return results
+
+
+def export_rule_set(rules):
+    compiled = []
+    for number, rule in enumerate(rules, start=1):
+        try:
+            compiled.append(compile_rule(rule).to_dict())
+        except RuleCompileError as e:
+            raise RuleCompileError(f"Rule #{number}: {str(e)}")
+    return json.dumps({"format": RULE_SET_FORMAT, "version": RULE_SET_VERSION, "rules": compiled}, indent=2)
+
+
+def import_rule_set(content):
+    data = json.loads(content)
+    if not isinstance(data, dict) or data.get("format") != RULE_SET_FORMAT:
+        raise Exception("Not an exported rule set")
+    if data.get("version") != RULE_SET_VERSION:
+        raise Exception(f"Unsupported rule set version: {data.get('version')}")
+    # Exported sets were validated when written, compile again in case the file was edited by hand
+    return import_rules([rule for rule in data.get("rules", []) if isinstance(rule, dict)])
+
+
+def is_rule_set(content, filename=""):
+    if not filename.lower().endswith(".json"):
+        return False
+    try:
+        data = json.loads(content)
+    except ValueError:
+        return False
+    return isinstance(data, dict) and data.get("format") == RULE_SET_FORMAT
@@ -0,0 +1,212 @@
+from bisect import bisect_left, bisect_right
+from collections import deque
+from rule_engine import compile_rule, RuleCompileError, COERCERS
+from metrics import traced
+
+# Rules pass when the document value is above / below their threshold
+ABOVE_CONDITIONS = ("greater_than", "after_date")
+BELOW_CONDITIONS = ("less_than", "before_date")
+
+
+class AhoCorasick:
+    def __init__(self, patterns):
+        self._goto = [{}]
+        self._fail = [0]
+        self._output = [[]]
+        for key, pattern in patterns:
+            self._insert(pattern, key)
+        self._build()
+
+    def _insert(self, pattern, key):
+        state = 0
+        for char in pattern:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto[state][char] = next_state
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append([])
+            state = next_state
+        self._output[state].append(key)
+
+    def _build(self):
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for char, next_state in self._goto[state].items():
+                queue.append(next_state)
+                fallback = self._fail[state]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                self._fail[next_state] = self._goto[fallback].get(char, 0)
+                if self._fail[next_state] == next_state:
+                    self._fail[next_state] = 0
+                self._output[next_state] = self._output[next_state] + self._output[self._fail[next_state]]
+
+    def search(self, text):
+        found = set()
+        state = 0
+        for char in text:
+            while state and char not in self._goto[state]:
+                state = self._fail[state]
+            state = self._goto[state].get(char, 0)
+            found.update(self._output[state])
+        return found
+
+
+class _ThresholdGroup:
+    __slots__ = ("keys", "ids")
+
+    def __init__(self, entries):
+        entries.sort(key=lambda entry: entry[0])
+        self.keys = [key for key, _ in entries]
+        self.ids = [rule_id for _, rule_id in entries]
+
+
+class RuleIndex:
+    def __init__(self, rules):
+        self.rules = list(rules)
+        self.compiled = []
+        self.invalid = {}
+        self.by_category = {}
+        self._above = {}
+        self._below = {}
+        self._equals = {}
+        self._not_equals = {}
+        self._not_equals_ids = {}
+        self._contains = {}
+        self._not_contains = {}
+        self._not_contains_ids = {}
+        self._linear = {}
+
+        above, below, contains, not_contains = {}, {}, {}, {}
+        for rule_id, rule in enumerate(self.rules):
+            try:
+                compiled = compile_rule(rule)
+            except RuleCompileError as e:
+                self.compiled.append(None)
+                self.invalid[rule_id] = str(e)
+                continue
+            self.compiled.append(compiled)
+            category, condition, expected = compiled.category, compiled.condition, compiled.expected
+            self.by_category.setdefault(category, []).append(rule_id)
+
+            if getattr(expected, "tzinfo", None) is not None:
+                # Aware datetimes cannot share a sorted array with naive ones
+                self._linear.setdefault(category, []).append(rule_id)
+            elif condition in ABOVE_CONDITIONS:
+                above.setdefault(category, []).append((expected, rule_id))
+            elif condition in BELOW_CONDITIONS:
+                below.setdefault(category, []).append((expected, rule_id))
+            elif condition == "equals":
+                self._equals.setdefault(category, {}).setdefault(expected, []).append(rule_id)
+            elif condition == "not_equals":
+                self._not_equals.setdefault(category, {}).setdefault(expected, []).append(rule_id)
+                self._not_equals_ids.setdefault(category, set()).add(rule_id)
+            elif condition == "contains":
+                contains.setdefault(category, []).append((rule_id, expected))
+            elif condition == "not_contains":
+                not_contains.setdefault(category, []).append((rule_id, expected))
+                self._not_contains_ids.setdefault(category, set()).add(rule_id)
+            else:
+                self._linear.setdefault(category, []).append(rule_id)
+
+        self._above = {category: _ThresholdGroup(entries) for category, entries in above.items()}
+        self._below = {category: _ThresholdGroup(entries) for category, entries in below.items()}
+        self._contains = {category: AhoCorasick(patterns) for category, patterns in contains.items()}
+        self._not_contains = {category: AhoCorasick(patterns) for category, patterns in not_contains.items()}
+
+    def __len__(self):
+        return len(self.rules)
+
+    def _match_category(self, category, actual, errors):
+        passed = set()
+        above = self._above.get(category)
+        if above:
+            try:
+                passed.update(above.ids[:bisect_left(above.keys, actual)])
+            except TypeError as e:
+                errors.update((rule_id, str(e)) for rule_id in above.ids)
+        below = self._below.get(category)
+        if below:
+            try:
+                passed.update(below.ids[bisect_right(below.keys, actual):])
+            except TypeError as e:
+                errors.update((rule_id, str(e)) for rule_id in below.ids)
+        passed.update(self._equals.get(category, {}).get(actual, ()))
+        if category in self._not_equals_ids:
+            passed.update(self._not_equals_ids[category].difference(
+                self._not_equals[category].get(actual, ())))
+        if category in self._contains:
+            passed.update(self._contains[category].search(actual))
+        if category in self._not_contains_ids:
+            passed.update(self._not_contains_ids[category].difference(
+                self._not_contains[category].search(actual)))
+        for rule_id in self._linear.get(category, ()):
+            compiled = self.compiled[rule_id]
+            try:
+                if compiled.compare(actual, compiled.expected):
+                    passed.add(rule_id)
+            except TypeError as e:
+                errors[rule_id] = str(e)
+        return passed
+
+    def _match_rules(self, category, rule_ids, data, passed, errors):
+        raw = data.get(category)
+        if raw is None:
+            errors.update((rule_id, f"No {category} in document") for rule_id in rule_ids)
+            return
+        try:
+            actual = COERCERS[category](raw)
+        except Exception as e:
+            errors.update((rule_id, str(e)) for rule_id in rule_ids)
+            return
+        passed.update(self._match_category(category, actual, errors))
+
+    def match(self, data):
+        passed = set()
+        errors = dict(self.invalid)
+        if not data:
+            errors.update((rule_id, "Missing rule or data") for rule_id in range(len(self.rules)))
+            return passed, errors
+        for category, rule_ids in self.by_category.items():
+            self._match_rules(category, rule_ids, data, passed, errors)
+        return passed, errors
+
+    def _result(self, rule_id, data, passed, errors):
+        rule = self.rules[rule_id]
+        expected = rule.get("value") if isinstance(rule, dict) else None
+        category = rule.get("category") if isinstance(rule, dict) else None
+        actual = data.get(category) if data and isinstance(category, str) else None
+        if rule_id in errors:
+            return {
+                "rule": rule,
+                "status": "Error",
+                "message": errors[rule_id],
+                "expected_value": expected,
+                "actual_value": actual
+            }
+        return {
+            "rule": rule,
+            "status": "PASS" if rule_id in passed else "FAIL",
+            "expected_value": expected,
+            "actual_value": actual
+        }
+
+    @traced("validate_index")
+    def evaluate(self, data):
+        passed, errors = self.match(data)
+        return [self._result(rule_id, data, passed, errors) for rule_id in range(len(self.rules))]
+
+    @traced("validate_index")
+    def evaluate_category(self, category, data):
+        # Only the valid rules reading one field, for callers that know nothing else changed
+        rule_ids = self.by_category.get(category, ())
+        passed = set()
+        errors = {}
+        if not data:
+            errors.update((rule_id, "Missing rule or data") for rule_id in rule_ids)
+        else:
+            self._match_rules(category, rule_ids, data, passed, errors)
+        return {rule_id: self._result(rule_id, data, passed, errors) for rule_id in rule_ids}
@@ -0,0 +1,182 @@
+import re
+from datetime import datetime
+
+CATEGORIES = ["money", "date", "time", "text"]
+
+CONDITIONS = {
+    "money": ["equals", "not_equals", "greater_than", "less_than"],
+    "date": ["equals", "not_equals", "before_date", "after_date"],
+    "time": ["equals", "not_equals", "before_date", "after_date"],
+    "text": ["equals", "not_equals", "contains", "not_contains"]
+}
+
+# The earliest phrase in the rule wins; on ties the longer phrase, then the
+# earlier entry here. Copulas come last so "must be greater than" chains on.
+OPERATOR_PHRASES = [
+    ("not_contains", r"must not contain|should not contain|does not contain|doesn't contain|cannot contain|"
+                     r"must not include|should not include|does not include|doesn't include|excludes?"),
+    ("contains", r"must contain|should contain|contains?|must include|should include|includes?"),
+    ("not_equals", r"not equal to|not equals?|different from|other than|!=|≠|<>"),
+    ("greater_than", r"greater than|more than|higher than|larger than|bigger than|exceeds?|above|over|>"),
+    ("less_than", r"less than|lower than|smaller than|fewer than|below|under|<"),
+    ("before_date", r"earlier than|prior to|before"),
+    ("after_date", r"later than|after"),
+    ("not_equals", r"must not be|should not be|cannot be|can't be|is not|isn't"),
+    ("equals", r"equal to|equals?|must be|should be|is|==|="),
+]
+
+_OPERATORS = [
+    (condition, re.compile(rf"(?<![<>!=])(?!(?<=\w)[a-z])(?:{phrases})(?![<>=])(?!(?<=[a-z])\w)"))
+    for condition, phrases in OPERATOR_PHRASES
+]
+
+_NEGATION = re.compile(r"\b(?:not|never|cannot)\b|n't\b")
+
+TEXT_KEYWORDS = re.compile(
+    r"\b(?:invoice (?:number|no|#)|customer|vendor|supplier|client|name|reference|ref|id|text)\b"
+)
+DATE_KEYWORDS = re.compile(r"\b(?:date|day|due|dated|issued on)\b")
+TIME_KEYWORDS = re.compile(r"\b(?:time|hour|o'clock)\b")
+
+ISO_DATE = re.compile(r"^(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})$")
+MONTH_NAME_DATES = ["%B %d %Y", "%b %d %Y", "%d %B %Y", "%d %b %Y"]
+TIME_VALUE = re.compile(r"^(\d{1,2}):(\d{2})(?::(\d{2}))?\s*(am|pm)?$")
+MONEY_VALUE = re.compile(
+    r"^(?:[$€£]|usd|eur|gbp|egp)?\s*(-?\d{1,3}(?:,\d{3})+(?:\.\d+)?|-?\d+(?:\.\d+)?)\s*(?:[$€£]|usd|eur|gbp|egp|dollars?|euros?|pounds?)?$"
+)
+
+_COMPARISON_FOR_DATES = {"greater_than": "after_date", "less_than": "before_date"}
+_COMPARISON_FOR_NUMBERS = {"after_date": "greater_than", "before_date": "less_than"}
+
+
+def normalize_rule_text(rule_text):
+    text = rule_text.strip().lower()
+    text = re.sub(r"\s+", " ", text)
+    return text.rstrip(".!;")
+
+
+def parse_date_value(value):
+    match = ISO_DATE.match(value)
+    if match:
+        year, month, day = (int(part) for part in match.groups())
+        try:
+            return datetime(year, month, day).strftime("%Y-%m-%d")
+        except ValueError:
+            return None
+    cleaned = re.sub(r"(\d)(st|nd|rd|th)\b", r"\1", value).replace(",", " ")
+    cleaned = re.sub(r"\s+", " ", cleaned).strip()
+    for fmt in MONTH_NAME_DATES:
+        try:
+            return datetime.strptime(cleaned, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            continue
+    # Numeric day/month orders such as 01/02/2025 are ambiguous, leave them to the LLM
+    return None
+
+
+def parse_time_value(value):
+    match = TIME_VALUE.match(value)
+    if not match:
+        return None
+    hours, minutes, seconds, meridiem = match.groups()
+    hours, minutes, seconds = int(hours), int(minutes), int(seconds or 0)
+    if meridiem:
+        if not 1 <= hours <= 12:
+            return None
+        hours = hours % 12 + (12 if meridiem == "pm" else 0)
+    if hours > 23 or minutes > 59 or seconds > 59:
+        return None
+    return f"{hours:02d}:{minutes:02d}:{seconds:02d}"
+
+
+def parse_money_value(value):
+    match = MONEY_VALUE.match(value)
+    if not match:
+        return None
+    number = float(match.group(1).replace(",", ""))
+    return int(number) if number.is_integer() else number
+
+
+def _find_operator(text, anchored=False):
+    best = None
+    for priority, (condition, pattern) in enumerate(_OPERATORS):
+        match = pattern.match(text) if anchored else pattern.search(text)
+        if match:
+            key = (match.start(), -len(match.group(0)), priority)
+            if best is None or key < best[0]:
+                best = (key, condition, match)
+    return best[1:] if best else None
+
+
+def _split_rule(text):
+    found = _find_operator(text)
+    if not found:
+        return None
+    condition, match = found
+    subject, rest = text[:match.start()].strip(), text[match.end():].strip()
+    # Copulas such as "must be" / "is not" are usually followed by the real operator
+    if condition in ("equals", "not_equals"):
+        chained = _find_operator(rest, anchored=True)
+        if chained:
+            negated = condition == "not_equals"
+            condition, match = chained
+            rest = rest[match.end():].strip()
+            if negated:
+                if condition in ("equals", "not_equals"):
+                    condition = "not_equals"
+                elif condition == "contains":
+                    condition = "not_contains"
+                else:
+                    subject = f"{subject} not"
+    return subject, condition, rest
+
+
+def parse_rule_text(rule_text):
+    text = normalize_rule_text(rule_text)
+    parts = _split_rule(text)
+    if not parts:
+        return None
+    subject, condition, raw_value = parts
+    if not raw_value:
+        return None
+
+    quoted = re.fullmatch(r"[\"'](.*)[\"']", raw_value)
+    value_text = quoted.group(1) if quoted else raw_value
+
+    if condition in ("greater_than", "less_than", "before_date", "after_date") and _NEGATION.search(subject):
+        # "must not be greater than" means <=, which the rule schema cannot express
+        return None
+
+    if condition in ("contains", "not_contains") or quoted or TEXT_KEYWORDS.search(subject):
+        if condition not in CONDITIONS["text"]:
+            return None
+        # Keep the user's original casing for the expected text
+        original = re.search(re.escape(value_text), rule_text, re.IGNORECASE)
+        return {
+            "category": "text",
+            "condition": condition,
+            "value": original.group(0) if original else value_text
+        }
+
+    date_value = parse_date_value(value_text)
+    if date_value is not None:
+        category, value = "date", date_value
+    else:
+        time_value = parse_time_value(value_text)
+        if time_value is not None:
+            category, value = "time", time_value
+        else:
+            money_value = parse_money_value(value_text)
+            if money_value is None:
+                return None
+            if DATE_KEYWORDS.search(subject) or TIME_KEYWORDS.search(subject):
+                return None
+            category, value = "money", money_value
+
+    if category == "money":
+        condition = _COMPARISON_FOR_NUMBERS.get(condition, condition)
+    else:
+        condition = _COMPARISON_FOR_DATES.get(condition, condition)
+    if condition not in CONDITIONS[category]:
+        return None
+    return {"category": category, "condition": condition, "value": value}
@@ -0,0 +1,135 @@
+from contextlib import closing
+from fields import FIELD_CATEGORIES, FIELD_DISPLAY_NAMES
+from heuristics import FIELD_CATEGORY
+from rule_parser import parse_date_value, parse_time_value, parse_money_value
+from json_stream import StreamingJSONParser
+from chunking import select_relevant_text, PROMPT_TOKEN_BUDGET
+from cache import get_cache, content_digest
+from llm import stream_ollama_command, validate_rule, DEFAULT_MODEL
+
+STRUCTURED_PROMPT_VERSION = 1
+
+FIELD_FORMATS = {
+    "money": ({"type": ["number", "null"]}, "number without currency symbols"),
+    "date": ({"type": ["string", "null"], "pattern": r"^\d{4}-\d{2}-\d{2}$"}, "date as YYYY-MM-DD"),
+    "time": ({"type": ["string", "null"], "pattern": r"^\d{2}:\d{2}:\d{2}$"}, "time as HH:MM:SS"),
+    "text": ({"type": ["string", "null"]}, "text exactly as written"),
+}
+
+EXTRACTION_SCHEMA = {
+    "type": "object",
+    "properties": {field: FIELD_FORMATS[category][0] for field, category in FIELD_CATEGORY.items()},
+    "required": list(FIELD_CATEGORY),
+}
+
+
+def build_structured_prompt(document_text):
+    field_lines = "\n".join(
+        f"    - {field} ({FIELD_DISPLAY_NAMES[field]}): {FIELD_FORMATS[category][1]}"
+        for field, category in FIELD_CATEGORY.items()
+    )
+    relevant_text = select_relevant_text(document_text, token_budget=PROMPT_TOKEN_BUDGET * 2)
+    return f"""
+    Extract these fields from the document and return ONLY a JSON object with exactly these keys, in this order.
+    Use null for any field that is not in the document.
+
+{field_lines}
+
+    Document Text:
+    {relevant_text}
+    """
+
+
+def normalize_field(field, value):
+    if value is None or value == "":
+        return None
+    category = FIELD_CATEGORY[field]
+    if category == "money":
+        if isinstance(value, (int, float)) and not isinstance(value, bool):
+            return value
+        parsed = parse_money_value(str(value).strip().lower())
+        return parsed if parsed is not None else str(value)
+    if category == "date":
+        return parse_date_value(str(value).strip().lower()) or str(value)
+    if category == "time":
+        return parse_time_value(str(value).strip().lower()) or str(value)
+    return str(value).strip()
+
+
+def stream_fields(document_text, model=DEFAULT_MODEL):
+    parser = StreamingJSONParser()
+    # Stopping at the closing brace, or being closed early ourselves, has to hand back the connection
+    with closing(stream_ollama_command(build_structured_prompt(document_text), model=model,
+                                       format=EXTRACTION_SCHEMA)) as chunks:
+        for chunk in chunks:
+            for field, value in parser.feed(chunk):
+                if field in FIELD_CATEGORY:
+                    yield field, normalize_field(field, value)
+            if parser.done:
+                break
+
+
+def category_values(fields, final=True):
+    # Each category takes its first non-empty field in FIELD_CATEGORIES order,
+    # the same "first value per category" contract as extract_data_from_text
+    values = {}
+    for category, category_fields in FIELD_CATEGORIES.items():
+        for field in category_fields:
+            if field not in fields:
+                if final:
+                    continue
+                break
+            if fields[field] is not None:
+                values[category] = fields[field]
+                break
+        else:
+            values[category] = None
+    return values
+
+
+def extract_all_fields(document_text, model=DEFAULT_MODEL, on_field=None):
+    fields = {}
+    with closing(stream_fields(document_text, model=model)) as streamed:
+        for field, value in streamed:
+            fields[field] = value
+            if on_field:
+                on_field(field, value)
+    for field in FIELD_CATEGORY:
+        fields.setdefault(field, None)
+    return {**category_values(fields), **fields}
+
+
+def cached_extract_all_fields(document_text, model=DEFAULT_MODEL, on_field=None):
+    cache = get_cache()
+    key = f"{content_digest(document_text)}:{model}:v{STRUCTURED_PROMPT_VERSION}"
+    data = cache.get_json("fields", key)
+    if data is None:
+        data = extract_all_fields(document_text, model=model, on_field=on_field)
+        if any(value is not None for value in data.values()):
+            cache.put_json("fields", key, data)
+    return data
+
+
+def stream_validate(document_text, rules, model=DEFAULT_MODEL):
+    pending = {}
+    for index, rule in enumerate(rules):
+        category = rule.get("category") if isinstance(rule, dict) else None
+        pending.setdefault(category if category in FIELD_CATEGORIES else None, []).append(index)
+
+    fields = {}
+    # Callers may stop once the rules they care about are in, closing this closes the model stream too
+    with closing(stream_fields(document_text, model=model)) as streamed:
+        for field, value in streamed:
+            fields[field] = value
+            # A category is settled once its leading fields have all arrived
+            settled = category_values(fields, final=False)
+            data = {**settled, **fields}
+            for category in list(pending):
+                if category in settled:
+                    for index in pending.pop(category):
+                        yield index, validate_rule(rules[index], data)
+
+    data = {**category_values(fields), **fields}
+    for indexes in pending.values():
+        for index in indexes:
+            yield index, validate_rule(rules[index], data)
@@ -0,0 +1,16 @@
+import os
+import sys
+import pytest
+
+# The modules live at the project root, not in a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from near_duplicates import configure_layout_index
+
+
+@pytest.fixture(autouse=True)
+def no_layout_reuse():
+    # The layout index is process-wide, tests that want reuse configure their own
+    configure_layout_index(size=0)
+    yield
+    configure_layout_index(size=0)
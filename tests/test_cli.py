@@ -0,0 +1,32 @@
+import json
+import pytest
+import cli
+from cache import configure_cache, file_digest
+from ollama_client import configure_client
+from result_store import ResultStore
+from benchmarks.corpus import make_corpus
+from benchmarks.stub_ollama import StubOllamaServer
+
+RULES = [{"category": "money", "condition": "greater_than", "value": "10", "description": "Total over 10"}]
+
+
+@pytest.fixture
+def server():
+    configure_cache(path=":memory:")
+    with StubOllamaServer(latency=0.0) as stub:
+        configure_client(host=stub.host)
+        yield stub
+    configure_client()
+
+
+def test_batch_records_the_digest_hashed_by_the_worker(server, tmp_path):
+    paths = make_corpus(str(tmp_path), 2, pages=1)
+    output = tmp_path / "results.jsonl"
+    store = ResultStore(str(tmp_path / "results.db"))
+
+    cli.run_batch(paths, RULES, str(output), workers=1, result_store=store)
+
+    records = [json.loads(line) for line in output.read_text(encoding="utf-8").splitlines()]
+    assert [record.get("error") for record in records] == [None, None]
+    assert {record["digest"] for record in records} == {file_digest(path) for path in paths}
+    assert store.stats()["runs"] == 2
@@ -0,0 +1,22 @@
+from incremental import IncrementalValidator
+
+RULES = [{"category": "money", "condition": "greater_than", "value": str(limit), "description": f"Over {limit}"}
+         for limit in range(20)]
+
+
+def test_caches_stay_within_their_bounds():
+    validator = IncrementalValidator(result_cache_size=10, category_cache_size=2)
+    for amount in range(30):
+        validator.update(RULES, {"money": f"{amount}.00"})
+        assert len(validator._results) <= 10
+        assert len(validator._categories) <= 2
+    assert validator.summary() == {"total": 20, "PASS": 20, "FAIL": 0, "Error": 0}
+
+
+def test_results_match_a_fresh_validator_after_the_data_changes():
+    validator = IncrementalValidator(result_cache_size=10, category_cache_size=2)
+    validator.update(RULES, {"money": "5.00"})
+    validator.update(RULES, {"money": "15.00"})
+    fresh = IncrementalValidator()
+    fresh.update(RULES, {"money": "15.00"})
+    assert validator.results == fresh.results
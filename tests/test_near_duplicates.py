@@ -0,0 +1,69 @@
+import re
+import pytest
+import llm
+from cache import configure_cache
+from near_duplicates import LayoutDocument, configure_layout_index
+from benchmarks.corpus import make_invoice, invoice_text
+
+
+def _invoices():
+    # Unlabelled, so the heuristics leave the total to the model, and next month's copy with other amounts
+    page_lines, expected = make_invoice(0, pages=1, labeled=False)
+    first = invoice_text(page_lines)
+    second = re.sub(r"\d+\.\d{2}", lambda match: f"{float(match.group()) + 1:.2f}", first)
+    return (first, expected["money"]), (second, f"{float(expected['money']) + 1:.2f}")
+
+
+class FakeModel:
+    # Answers with the total it was given for each text and remembers what it was asked
+    def __init__(self):
+        self.totals = {}
+        self.calls = []
+
+    def __call__(self, document_text, model=None, categories=()):
+        self.calls.append(document_text)
+        return {"money": self.totals[document_text]}
+
+
+@pytest.fixture
+def model(monkeypatch):
+    fake = FakeModel()
+    monkeypatch.setattr(llm, "_extract_data_with_llm", fake)
+    return fake
+
+
+def test_near_duplicate_reuses_the_learned_line(model):
+    configure_layout_index(size=100)
+    (first, first_total), (second, second_total) = _invoices()
+    model.totals.update({first: first_total, second: "0.00"})
+
+    assert llm.extract_data_from_text(first)["money"] == first_total
+    assert llm.extract_data_from_text(second)["money"] == second_total
+    assert model.calls == [first]
+
+
+def test_value_on_two_lines_is_not_learned():
+    text = "Acme Corp\n$120.00\nHardware   $120.00\n\n$120.00\n$16.80\n$136.80"
+    assert LayoutDocument(text).locate("money", "120.00") is None
+    assert LayoutDocument(text).locate("money", "136.80")["line"] == "$#"
+
+
+def test_layout_reads_are_not_cached(model):
+    configure_layout_index(size=100)
+    cache = configure_cache(path=":memory:")
+    (first, first_total), (second, _) = _invoices()
+    model.totals[first] = first_total
+
+    llm.cached_extract_data_from_text(first)
+    llm.cached_extract_data_from_text(second)
+    key = f"{llm.content_digest(second)}:{llm.DEFAULT_MODEL}:v{llm.EXTRACTION_PROMPT_VERSION}"
+    assert cache.get_json("data", key) is None
+    assert cache.get_json("data", key.replace(llm.content_digest(second), llm.content_digest(first))) is not None
+
+
+def test_reuse_is_off_unless_configured(model):
+    (first, first_total), (second, second_total) = _invoices()
+    model.totals.update({first: first_total, second: second_total})
+    llm.extract_data_from_text(first)
+    llm.extract_data_from_text(second)
+    assert model.calls == [first, second]
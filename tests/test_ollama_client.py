@@ -0,0 +1,114 @@
+import json
+import socket
+from contextlib import closing
+import pytest
+import llm
+from structured import stream_validate
+from ollama_client import OllamaClient, OllamaTimeout, OllamaUnavailable, configure_client
+from benchmarks.stub_ollama import StubOllamaServer, answer
+
+PROMPT = "Extract the data. Document Text: Total Amount: $120.50 Invoice Date: 2025-03-01 Issue Time: 10:15"
+
+
+@pytest.fixture
+def server():
+    with StubOllamaServer(latency=0.0) as stub:
+        yield stub
+
+
+@pytest.fixture
+def silent_port():
+    # Accepts connections and never answers, a reachable but stuck server
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen()
+    yield listener.getsockname()[1]
+    listener.close()
+
+
+@pytest.fixture
+def closed_port():
+    probe = socket.socket()
+    probe.bind(("127.0.0.1", 0))
+    port = probe.getsockname()[1]
+    probe.close()
+    return port
+
+
+@pytest.fixture
+def cli_calls(monkeypatch):
+    calls = []
+    monkeypatch.setattr(llm, "_run_ollama_cli", lambda prompt, model=None: calls.append(prompt) or "from cli")
+    yield calls
+    configure_client()
+
+
+def test_generate_reuses_pooled_connection(server):
+    client = OllamaClient(host=server.host, pool_size=2)
+    opened = []
+    new_connection = client._new_connection
+    client._new_connection = lambda: opened.append(1) or new_connection()
+
+    first = client.generate(PROMPT, model="stub")
+    second = client.generate(PROMPT, model="stub")
+
+    assert json.loads(first) == json.loads(answer(PROMPT))
+    assert second == first
+    assert len(opened) == 1
+    assert server.calls == 2
+    client.close()
+
+
+def test_stream_yields_the_whole_response_and_returns_the_connection(server):
+    client = OllamaClient(host=server.host, pool_size=1)
+    assert "".join(client.stream(PROMPT, model="stub")) == answer(PROMPT)
+    assert client._pool.qsize() == 1
+    assert client.generate(PROMPT, model="stub") == answer(PROMPT)
+    client.close()
+
+
+def test_closed_stream_releases_its_slot(server):
+    client = OllamaClient(host=server.host, pool_size=1, max_concurrency=1)
+    with closing(client.stream(PROMPT, model="stub")) as chunks:
+        next(chunks)
+    # A leaked slot would block here forever with max_concurrency=1
+    assert client._slots.acquire(timeout=1)
+    client._slots.release()
+    client.close()
+
+
+def test_validation_stopped_early_releases_its_slot(server):
+    client = configure_client(host=server.host, pool_size=1, max_concurrency=1)
+    rules = [{"category": "money", "condition": "greater_than", "value": "100", "description": "Over 100"},
+             {"category": "time", "condition": "after_time", "value": "09:00", "description": "After 9"}]
+    validations = stream_validate("Total Amount: $120.50 Invoice Date: 2025-03-01 Issue Time: 10:15", rules,
+                                  model="stub")
+    _, result = next(validations)
+    assert result["status"] == "PASS"
+    validations.close()
+    assert client._slots.acquire(timeout=1)
+    client._slots.release()
+    configure_client()
+
+
+def test_timeout_is_not_unavailable(silent_port):
+    client = OllamaClient(host=f"http://127.0.0.1:{silent_port}", timeout=0.5)
+    with pytest.raises(OllamaTimeout):
+        client.generate(PROMPT, model="stub")
+    with pytest.raises(OllamaTimeout):
+        list(client.stream(PROMPT, model="stub"))
+
+
+def test_slow_server_does_not_fall_back_to_cli(silent_port, cli_calls):
+    configure_client(host=f"http://127.0.0.1:{silent_port}", timeout=0.5)
+    with pytest.raises(Exception, match="Ollama error"):
+        llm.run_ollama_command(PROMPT, model="stub")
+    assert cli_calls == []
+
+
+def test_refused_connection_falls_back_to_cli(closed_port, cli_calls):
+    with pytest.raises(OllamaUnavailable):
+        OllamaClient(host=f"http://127.0.0.1:{closed_port}").generate(PROMPT, model="stub")
+    configure_client(host=f"http://127.0.0.1:{closed_port}")
+    assert llm.run_ollama_command(PROMPT, model="stub") == "from cli"
+    assert cli_calls == [PROMPT]
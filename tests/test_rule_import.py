@@ -0,0 +1,50 @@
+import json
+import os
+import pytest
+from rule_import import export_rule_set, import_rule_set, import_rules, read_rules
+from rule_parser import CONDITIONS
+
+APP = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "app.py")
+# What the edit form saves, aliases included
+FORM_RULES = [
+    {"category": "money", "condition": "greater_than", "value": "1000"},
+    {"category": "date", "condition": "before_date", "value": "2025-06-30"},
+    {"category": "time", "condition": "greater_than", "value": "09:00"},
+    {"category": "time", "condition": "less_than", "value": "17:30"},
+    {"category": "text", "condition": "contains", "value": "Acme"},
+]
+
+
+def _rules(results):
+    assert [result["error"] for result in results] == [None] * len(results)
+    return [result["rule"] for result in results]
+
+
+def test_exported_rule_set_imports_unchanged():
+    exported = export_rule_set(FORM_RULES)
+    imported = _rules(import_rule_set(exported))
+    assert imported == _rules(import_rules(FORM_RULES))
+    assert json.loads(export_rule_set(imported)) == json.loads(exported)
+
+
+def test_imported_conditions_are_editable():
+    # The edit form lists CONDITIONS per category, anything else could not be selected
+    for rule in _rules(import_rule_set(export_rule_set(FORM_RULES))):
+        assert rule["condition"] in CONDITIONS[rule["category"]]
+
+
+def test_csv_time_rules_use_form_conditions():
+    content = "category,condition,value\ntime,greater_than,09:00\ntime,before_date,17:00\n"
+    rules = _rules(import_rules(read_rules(content, "rules.csv")))
+    assert [rule["condition"] for rule in rules] == ["after_date", "before_date"]
+
+
+def test_rule_management_renders_imported_rules():
+    testing = pytest.importorskip("streamlit.testing.v1")
+    imported = _rules(import_rule_set(export_rule_set(FORM_RULES)))
+    app = testing.AppTest.from_file(APP, default_timeout=60).run()
+    app.session_state.rules = imported
+    app.sidebar.radio[0].set_value("⚙️ Rule Management").run()
+    assert not app.exception
+    assert [select.value for select in app.selectbox if select.label == "Condition"] == \
+        [rule["condition"] for rule in imported]